@@ -0,0 +1,229 @@
+"""
+Download de PDFs com hedge para o Wayback Machine e circuit breaker por host.
+
+O download direto começa na hora. Se ele ainda não tiver terminado após
+PDF_HEDGE_DELAY segundos (ou falhar antes disso), a cópia do Wayback Machine
+passa a ser buscada em paralelo, e vence a primeira fonte que entregar um PDF
+válido (bytes começando com "%PDF"). A fonte perdedora é interrompida no
+próximo bloco baixado.
+
+Hosts cujo download direto falhou (ou perdeu a corrida para o Arquivo)
+PDF_BREAKER_FAILURES vezes seguidas ficam com o circuito aberto por
+PDF_BREAKER_COOLDOWN segundos: nesse período os PDFs deles vão direto para o
+Wayback Machine. Passado o prazo, uma nova tentativa
+direta decide se o host volta ao normal. O estado fica no cache persistente,
+então vale para todos os workers.
+"""
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from researchflow import http_client
+from researchflow.cache import SQLiteCache
+
+PDF_HEDGE_DELAY = float(os.getenv("PDF_HEDGE_DELAY", 4))
+PDF_DIRECT_TIMEOUT = float(os.getenv("PDF_DIRECT_TIMEOUT", 20))
+PDF_WAYBACK_TIMEOUT = float(os.getenv("PDF_WAYBACK_TIMEOUT", 30))
+PDF_BREAKER_FAILURES = int(os.getenv("PDF_BREAKER_FAILURES", 3))
+PDF_BREAKER_COOLDOWN = int(os.getenv("PDF_BREAKER_COOLDOWN", 10 * 60))
+
+PDF_HOST_HEALTH = SQLiteCache(
+    "pdf_host_health",
+    ttl=int(os.getenv("PDF_HOST_HEALTH_TTL", 24 * 3600)),
+    max_entries=int(os.getenv("PDF_HOST_HEALTH_MAX_ENTRIES", 5000)),
+)
+
+_ACQUISITION_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PDF_ACQUISITION_WORKERS", 16)),
+    thread_name_prefix="pdf-acquisition"
+)
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Referer': 'https://www.google.com/',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+
+class DownloadCancelled(Exception):
+    """Outra fonte já entregou o PDF."""
+
+
+def is_valid_pdf(data: Optional[bytes]) -> bool:
+    # A especificação tolera lixo antes do cabeçalho nos primeiros 1024 bytes
+    return bool(data) and b'%PDF' in data[:1024]
+
+
+def get_wayback_machine_url(target_url: str) -> Optional[str]:
+    print(f"Tentando resgatar via Wayback Machine: {target_url}")
+    try:
+        api_url = f"http://archive.org/wayback/available?url={target_url}"
+        resp = http_client.get(api_url, timeout=10)
+        data = resp.json()
+        if 'archived_snapshots' in data and 'closest' in data['archived_snapshots']:
+            snapshot_url = data['archived_snapshots']['closest']['url']
+            print(f"Cópia encontrada no Wayback Machine: {snapshot_url}")
+            # "id_" pede o arquivo original, sem a barra de navegação do Arquivo
+            return re.sub(r'/web/(\d+)/', r'/web/\1id_/', snapshot_url, count=1)
+        else:
+            print("Nenhuma cópia encontrada no Wayback Machine.")
+            return None
+    except Exception as e:
+        print(f"Erro ao consultar Wayback Machine: {e}")
+        return None
+
+
+def _find_pdf_link(html: str) -> Optional[str]:
+    m_meta = re.search(r'<meta\s+name=["\']citation_pdf_url["\']\s+content=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
+    if m_meta:
+        return m_meta.group(1)
+
+    m_href = re.search(r'href=["\']([^"\']+\.pdf)["\']', html, flags=re.IGNORECASE)
+    if m_href:
+        return m_href.group(1)
+    m_view = re.search(r'href=["\']([^"\']+/article/view/[^"\']+/[\d]+)["\']', html, flags=re.IGNORECASE)
+    if not m_view:
+        m_view = re.search(r'href=["\']([^"\']+/pdf/[^"\']+)["\']', html, flags=re.IGNORECASE)
+    return m_view.group(1) if m_view else None
+
+
+def _read_body(resp, cancelled: threading.Event) -> bytes:
+    chunks = []
+    for chunk in resp.iter_content(chunk_size=65536):
+        if cancelled.is_set():
+            resp.close()
+            raise DownloadCancelled()
+        if chunk:
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def download_pdf(url: str, timeout: float, cancelled: threading.Event) -> Optional[bytes]:
+    """
+    Baixa o PDF de `url`, seguindo o link do PDF quando a resposta é uma página
+    HTML. Retorna os bytes de um PDF válido ou None; erros de rede propagam.
+    Toda resposta é fechada ao sair, inclusive em erro: conexão que não volta
+    ao pool esgota o pool do host.
+    """
+    pdf_link = None
+    with http_client.get(url, headers=BROWSER_HEADERS, stream=True, timeout=timeout, retries=1) as resp:
+        resp.raise_for_status()
+        content_type = resp.headers.get('content-type', '').lower()
+        if 'application/pdf' in content_type:
+            data = _read_body(resp, cancelled)
+        else:
+            print(f"Conteúdo é HTML ({content_type}). Procurando link do PDF na página...")
+            pdf_link = _find_pdf_link(resp.text)
+            if not pdf_link:
+                print("Não foi possível encontrar um link de PDF nesta página HTML.")
+                return None
+            pdf_link = urllib.parse.urljoin(resp.url, pdf_link)
+
+    if pdf_link:
+        print(f"Redirecionando para o PDF real: {pdf_link}")
+        with http_client.get(pdf_link, headers=BROWSER_HEADERS, stream=True, timeout=timeout, retries=1) as resp:
+            resp.raise_for_status()
+            data = _read_body(resp, cancelled)
+
+    if not is_valid_pdf(data):
+        print(f"Resposta de {url} não é um PDF válido.")
+        return None
+    return data
+
+
+# --- Circuit breaker por host ---
+
+def _host(url: str) -> str:
+    return (urllib.parse.urlsplit(url).hostname or '').lower()
+
+
+def is_circuit_open(host: str) -> bool:
+    health = PDF_HOST_HEALTH.get(host)
+    return bool(health) and health.get('open_until', 0) > time.time()
+
+
+def record_host_result(host: str, ok: bool) -> None:
+    if ok:
+        if PDF_HOST_HEALTH.get(host):
+            PDF_HOST_HEALTH.delete(host)
+        return
+    health = PDF_HOST_HEALTH.get(host) or {'failures': 0, 'open_until': 0}
+    health['failures'] += 1
+    if health['failures'] >= PDF_BREAKER_FAILURES:
+        # Também reabre o circuito quando a tentativa após o prazo falha
+        health['open_until'] = time.time() + PDF_BREAKER_COOLDOWN
+        print(f"Circuito aberto para {host} por {PDF_BREAKER_COOLDOWN}s ({health['failures']} falhas seguidas).")
+    PDF_HOST_HEALTH.set(host, health)
+
+
+def _direct_source(url: str, cancelled: threading.Event) -> Optional[bytes]:
+    host = _host(url)
+    print(f"Baixando (direto): {url}")
+    try:
+        data = download_pdf(url, PDF_DIRECT_TIMEOUT, cancelled)
+    except DownloadCancelled:
+        # Perdeu para o Wayback Machine: host lento conta como falha
+        record_host_result(host, False)
+        return None
+    except Exception as e:
+        print(f"Falha no download direto: {e}")
+        record_host_result(host, False)
+        return None
+    record_host_result(host, data is not None)
+    return data
+
+
+def _wayback_source(url: str, cancelled: threading.Event) -> Optional[bytes]:
+    wayback_url = get_wayback_machine_url(url)
+    if not wayback_url or cancelled.is_set():
+        return None
+    print(f"Baixando do Arquivo: {wayback_url}")
+    try:
+        return download_pdf(wayback_url, PDF_WAYBACK_TIMEOUT, cancelled)
+    except DownloadCancelled:
+        return None
+    except Exception as e:
+        print(f"Falha no Wayback Machine: {e}")
+        return None
+
+
+def acquire_pdf(url: str, hedge_delay: Optional[float] = None) -> Optional[bytes]:
+    """
+    Retorna os bytes do PDF de `url` vindos da fonte mais rápida (direta ou
+    Wayback Machine), ou None se nenhuma entregar um PDF válido.
+    """
+    hedge_delay = PDF_HEDGE_DELAY if hedge_delay is None else hedge_delay
+    cancelled = threading.Event()
+    pending = set()
+    if is_circuit_open(_host(url)):
+        print(f"Circuito aberto para {_host(url)}. Indo direto para o Wayback Machine...")
+        pending.add(_ACQUISITION_POOL.submit(_wayback_source, url, cancelled))
+        hedged = True
+    else:
+        pending.add(_ACQUISITION_POOL.submit(_direct_source, url, cancelled))
+        hedged = False
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else hedge_delay, return_when=FIRST_COMPLETED)
+            for future in done:
+                data = future.result()
+                if data is not None:
+                    return data
+            if not hedged:
+                # Download direto lento (ou já falhou): dispara a busca no Arquivo
+                if pending:
+                    print(f"Download direto passou de {hedge_delay:g}s. Buscando também no Wayback Machine...")
+                else:
+                    print("Ativando protocolo de resgate (Wayback Machine)...")
+                pending.add(_ACQUISITION_POOL.submit(_wayback_source, url, cancelled))
+                hedged = True
+        print("Nenhuma fonte entregou o PDF.")
+        return None
+    finally:
+        cancelled.set()
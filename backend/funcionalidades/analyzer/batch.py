@@ -0,0 +1,119 @@
+"""
+Resumo em lote de artigos (URLs ou ids do Semantic Scholar).
+
+Cada item passa por resolução -> download -> leitura do PDF -> resumo, e os
+itens avançam em paralelo, então as etapas se sobrepõem (enquanto um artigo
+está no Gemini, outros estão baixando ou sendo lidos):
+
+- resolução: os ids do lote inteiro vão em uma só chamada ao /paper/batch;
+- download: threads, no máximo SUMMARY_BATCH_DOWNLOAD_WORKERS;
+- leitura do PDF: um documento por processo no pool de `researchflow.pdf_text`;
+- Gemini: no máximo SUMMARY_BATCH_LLM_CONCURRENCY chamadas simultâneas,
+  somando todos os lotes do processo e contando cada bloco dos resumos em
+  map-reduce (resumos em cache não ocupam vaga); o ritmo por minuto fica a cargo do
+  limitador de taxa compartilhado (`researchflow.rate_limit`).
+
+Os eventos de progresso e os resultados são gerados à medida que acontecem.
+"""
+import os
+import queue
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from analyzer.services import (
+    fetch_pdf_bytes_from_url, resolve_paper_pdf_urls, summarize_article_chunked, summarize_article_with_gemini
+)
+from researchflow.pdf_text import extract_pdf_pages_pooled
+
+SUMMARY_BATCH_MAX_ITEMS = int(os.getenv("SUMMARY_BATCH_MAX_ITEMS", 20))
+SUMMARY_BATCH_LLM_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_LLM_CONCURRENCY", 4))
+
+_ITEM_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SUMMARY_BATCH_DOWNLOAD_WORKERS", 8)),
+    thread_name_prefix="summary-batch"
+)
+_llm_slots = threading.BoundedSemaphore(max(1, SUMMARY_BATCH_LLM_CONCURRENCY))
+
+PAPER_ID_RE = re.compile(r'^(?:[a-fA-F0-9]{40}|[A-Za-z]+:\S+)$')
+
+
+def is_paper_id(item: str) -> bool:
+    return not item.lower().startswith(('http://', 'https://')) and bool(PAPER_ID_RE.match(item))
+
+
+def _summarize_item(index: int, item: str, natural_language_query: Optional[str], chunked: bool,
+                    resolved: Optional[Future], events: "queue.Queue[dict]") -> dict:
+    def progress(stage: str) -> None:
+        events.put({"event": "progress", "index": index, "item": item, "stage": stage})
+
+    if is_paper_id(item):
+        progress("resolve")
+        url = resolved.result().get(item)
+        if not url:
+            return {"error": "Artigo sem PDF em acesso aberto no Semantic Scholar."}
+    else:
+        url = item
+
+    progress("download")
+    data = fetch_pdf_bytes_from_url(url)
+    if not data:
+        return {"error": "Falha ao baixar o PDF."}
+
+    progress("parse")
+    try:
+        pages = extract_pdf_pages_pooled(data)
+    except Exception as e:
+        print(f"Erro ao ler o PDF de {item}: {e}")
+        return {"error": "Falha ao ler o PDF."}
+    text = '\n\n'.join(page for page in pages if page).strip()
+    if not text:
+        return {"error": "Não foi possível extrair texto do PDF."}
+
+    progress("summarize")
+    # A vaga é ocupada por chamada ao Gemini, não pelo item inteiro
+    if chunked:
+        return summarize_article_chunked(text, natural_language_query=natural_language_query, llm_slots=_llm_slots)
+    return summarize_article_with_gemini(text, natural_language_query=natural_language_query, llm_slots=_llm_slots)
+
+
+def _run_item(index: int, item: str, natural_language_query: Optional[str], chunked: bool,
+              resolved: Optional[Future], events: "queue.Queue[dict]") -> None:
+    try:
+        result = _summarize_item(index, item, natural_language_query, chunked, resolved, events)
+    except Exception as e:
+        print(f"Erro ao resumir {item}: {e}")
+        result = {"error": str(e)}
+    if "error" in result:
+        events.put({"event": "error", "index": index, "item": item, "error": result["error"]})
+    else:
+        events.put({"event": "result", "index": index, "item": item, "summary": result})
+
+
+def summarize_batch_events(items: List[str], natural_language_query: Optional[str] = None,
+                           chunked: bool = False) -> Iterator[dict]:
+    """
+    Resume os itens em paralelo e gera os eventos conforme acontecem:
+    {"event": "progress", "index", "item", "stage"} a cada etapa,
+    {"event": "result", "index", "item", "summary"} ou {"event": "error", ...}
+    quando um item termina (na ordem de conclusão), e por fim
+    {"event": "done", "total", "succeeded", "failed"}.
+    """
+    events = queue.Queue()
+    # Enviada antes dos itens, a resolução em lote sai da fila do pool primeiro
+    paper_ids = [item for item in items if is_paper_id(item)]
+    resolved = _ITEM_POOL.submit(resolve_paper_pdf_urls, paper_ids) if paper_ids else None
+    for index, item in enumerate(items):
+        _ITEM_POOL.submit(_run_item, index, item, natural_language_query, chunked, resolved, events)
+
+    yield {"event": "start", "total": len(items)}
+    finished = succeeded = 0
+    while finished < len(items):
+        event = events.get()
+        if event["event"] in ("result", "error"):
+            finished += 1
+            succeeded += event["event"] == "result"
+            event["completed"] = finished
+        yield event
+    yield {"event": "done", "total": len(items), "succeeded": succeeded, "failed": len(items) - succeeded}
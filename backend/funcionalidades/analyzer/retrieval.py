@@ -0,0 +1,133 @@
+"""
+Recuperação lexical local para o chat com artigos.
+
+O artigo é dividido em trechos uma única vez e indexado com BM25 (pontuação
+vetorizada com NumPy). O índice fica em um cache LRU em memória por documento,
+então cada mensagem do chat envia ao Gemini apenas os trechos mais relevantes
+para a pergunta, em vez do artigo inteiro. Não depende de serviços externos.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+from researchflow.text import tokenize
+
+CHAT_CHUNK_CHARS = int(os.getenv("CHAT_CHUNK_CHARS", 1500))
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", 8))
+# Artigos até este tamanho continuam indo inteiros no prompt
+CHAT_FULL_CONTEXT_CHARS = int(os.getenv("CHAT_FULL_CONTEXT_CHARS", 30000))
+CHAT_INDEX_CACHE_SIZE = int(os.getenv("CHAT_INDEX_CACHE_SIZE", 32))
+
+
+def split_text_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    Divide o texto em blocos de até `max_chars` caracteres, quebrando de
+    preferência em fim de parágrafo e, só em último caso, no meio do texto.
+    """
+    chunks = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ''
+            current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+class BM25Index:
+    """Índice BM25 sobre os trechos de um documento."""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        postings = {}
+        lengths = []
+        for doc, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            lengths.append(len(tokens))
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(doc)
+                postings[token][1].append(tf)
+
+        n_docs = len(chunks)
+        doc_len = np.asarray(lengths, dtype=np.float32)
+        avg_len = float(doc_len.mean()) if n_docs and doc_len.mean() > 0 else 1.0
+        # Parte do denominador do BM25 que só depende do tamanho do trecho
+        self.norm = k1 * (1 - b + b * doc_len / avg_len)
+        self.postings = {}
+        for token, (docs, tfs) in postings.items():
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            self.postings[token] = (np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32), idf)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            docs, tfs, idf = posting
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self.norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Índices dos `k` trechos mais relevantes (só os com pontuação > 0)."""
+        scores = self.scores(query)
+        best = np.argsort(-scores, kind='stable')[:k]
+        return [int(i) for i in best if scores[i] > 0]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(text: str, chunk_chars: int = None) -> BM25Index:
+    """Retorna o índice do documento, construindo-o só na primeira vez."""
+    chunk_chars = chunk_chars or CHAT_CHUNK_CHARS
+    key = (hashlib.sha256(text.encode('utf-8')).hexdigest(), chunk_chars)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+
+    index = BM25Index(split_text_chunks(text, chunk_chars))
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > CHAT_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieve_context(text: str, query: str, top_k: int = None, chunk_chars: int = None) -> str:
+    """
+    Retorna o trecho do artigo a ser colocado no prompt: o artigo inteiro se ele
+    for curto, ou os `top_k` trechos mais relevantes para `query`, na ordem em
+    que aparecem no documento.
+    """
+    if len(text) <= CHAT_FULL_CONTEXT_CHARS:
+        return text
+    top_k = top_k or CHAT_TOP_K
+
+    index = get_index(text, chunk_chars)
+    selected = set(index.top_k(query, top_k))
+    if not selected:
+        # Pergunta genérica: o começo do artigo (resumo, introdução) é o melhor palpite
+        selected = set(range(min(top_k, len(index.chunks))))
+    # O primeiro trecho (título e resumo) sempre ajuda a situar a resposta
+    selected.add(0)
+    return '\n\n[...]\n\n'.join(index.chunks[i] for i in sorted(selected))
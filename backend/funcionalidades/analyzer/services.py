@@ -1,14 +1,21 @@
 import os
 import json
+import asyncio
+import hashlib
 import google.generativeai as genai
 from dotenv import load_dotenv
-import requests
-import tempfile
 import re
-from typing import Optional, List, Dict
-from PyPDF2 import PdfReader
-import urllib.parse
+from typing import Optional, List, Dict, Iterator, AsyncIterator
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from researchflow import http_client, rate_limit
+from researchflow.rate_limit import RateLimitExceeded, overloaded_error
+from researchflow.cache import SQLiteCache
+from analyzer.acquisition import acquire_pdf
+from analyzer.retrieval import retrieve_context, split_text_chunks
+from researchflow.pdf_text import extract_pdf_pages, iter_pdf_pages, read_pdf_bytes
 
 env_path = Path(__file__).resolve().parent.parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -51,6 +58,7 @@ def extract_first_json(text: str) -> Optional[str]:
     return None
 
 def call_model(model, prompt_text: str, max_tokens: int = 4096) -> str:
+    rate_limit.acquire("gemini")
     try:
         return model.generate_content(prompt_text, generation_config={"max_output_tokens": max_tokens, "temperature": 0.2}).text
     except TypeError:
@@ -58,35 +66,82 @@ def call_model(model, prompt_text: str, max_tokens: int = 4096) -> str:
 
 def extract_pdf_text_from_file(file_input) -> Optional[str]:
     try:
-        reader = PdfReader(file_input)
-        parts = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                parts.append(text)
-        full_text = '\n\n'.join(parts).strip()
+        pages = extract_pdf_pages(read_pdf_bytes(file_input))
+        full_text = '\n\n'.join(text for text in pages if text).strip()
         return full_text or None
     except Exception as e:
         print(f"Erro ao ler/extrair PDF do arquivo: {e}")
         return None
 
-def get_wayback_machine_url(target_url: str) -> Optional[str]:
-    print(f"Tentando resgatar via Wayback Machine: {target_url}")
+SEMANTIC_PAPER_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
+SEMANTIC_PAPER_BATCH_MAX_IDS = 500  # limite de ids por chamada do /paper/batch
+PAPER_RESOLVE_MAX_IDS = int(os.getenv("PAPER_RESOLVE_MAX_IDS", 1000))
+
+# URL do PDF em acesso aberto por paper id. Artigos sem PDF também ficam
+# guardados (como None), por menos tempo, para não serem consultados de novo.
+PDF_URL_CACHE = SQLiteCache(
+    "paper_pdf_urls",
+    ttl=int(os.getenv("PDF_URL_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("PDF_URL_CACHE_MAX_ENTRIES", 50000)),
+)
+PDF_URL_NEGATIVE_TTL = int(os.getenv("PDF_URL_NEGATIVE_TTL", 24 * 3600))
+
+def _fetch_pdf_urls_batch(paper_ids: List[str]) -> Optional[Dict[str, Optional[str]]]:
+    """Uma chamada ao /paper/batch. Retorna None se a API falhar (nada vai para o cache)."""
+    api_key = os.getenv("SEMANTIC_API_KEY")
+    headers = {'x-api-key': api_key} if api_key else {}
     try:
-        api_url = f"http://archive.org/wayback/available?url={target_url}"
-        resp = requests.get(api_url, timeout=10)
-        data = resp.json()
-        if 'archived_snapshots' in data and 'closest' in data['archived_snapshots']:
-            snapshot_url = data['archived_snapshots']['closest']['url']
-            print(f"Cópia encontrada no Wayback Machine: {snapshot_url}")
-            return snapshot_url
-        else:
-            print("Nenhuma cópia encontrada no Wayback Machine.")
-            return None
+        resp = http_client.post(SEMANTIC_PAPER_BATCH_URL, params={'fields': 'openAccessPdf,url'},
+                                json={'ids': paper_ids}, headers=headers, timeout=20)
+        resp.raise_for_status()
+        papers = resp.json()
     except Exception as e:
-        print(f"Erro ao consultar Wayback Machine: {e}")
+        print(f"Erro ao resolver artigos em lote no Semantic Scholar: {e}")
         return None
 
+    # A resposta vem na mesma ordem dos ids, com null para ids desconhecidos
+    resolved = {}
+    for paper_id, paper in zip(paper_ids, papers):
+        open_access = (paper or {}).get('openAccessPdf') or {}
+        resolved[paper_id] = open_access.get('url') or None
+    return resolved
+
+def resolve_paper_pdf_urls(paper_ids: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Resolve vários artigos do Semantic Scholar de uma vez: consulta o cache e
+    busca os que faltam via POST /paper/batch, em blocos de até
+    SEMANTIC_PAPER_BATCH_MAX_IDS ids. Retorna {paper_id: url do PDF ou None}.
+    Aceita o id de 40 caracteres ou os prefixos da API (ex: "DOI:...", "ARXIV:...").
+    """
+    resolved = {}
+    missing = []
+    for paper_id in dict.fromkeys(paper_ids):
+        cached = PDF_URL_CACHE.get(paper_id)
+        if cached is not None:
+            resolved[paper_id] = cached['pdf_url']
+        else:
+            missing.append(paper_id)
+
+    if missing:
+        print(f"Resolvendo {len(missing)} artigo(s) via /paper/batch ({len(resolved)} do cache)...")
+    for i in range(0, len(missing), SEMANTIC_PAPER_BATCH_MAX_IDS):
+        chunk = missing[i:i + SEMANTIC_PAPER_BATCH_MAX_IDS]
+        fetched = _fetch_pdf_urls_batch(chunk)
+        if fetched is None:
+            resolved.update((paper_id, None) for paper_id in chunk)
+            continue
+        for paper_id, pdf_url in fetched.items():
+            PDF_URL_CACHE.set(paper_id, {'pdf_url': pdf_url}, ttl=None if pdf_url else PDF_URL_NEGATIVE_TTL)
+        resolved.update(fetched)
+    return resolved
+
+def resolve_paper_pdf_url(paper_id: str) -> Optional[str]:
+    """URL do PDF em acesso aberto de um artigo do Semantic Scholar (ou None)."""
+    pdf_url = resolve_paper_pdf_urls([paper_id]).get(paper_id)
+    if pdf_url:
+        print(f"PDF encontrado via API: {pdf_url}")
+    return pdf_url
+
 def resolve_semantic_scholar_url(url: str) -> Optional[str]:
     match = re.search(r"semanticscholar\.org/paper/.*?([a-fA-F0-9]{40})", url)
     if not match:
@@ -95,119 +150,28 @@ def resolve_semantic_scholar_url(url: str) -> Optional[str]:
     if match:
         paper_id = match.group(1)
         print(f"Detecado Semantic Scholar ID: {paper_id}. Buscando PDF via API...")
-        api_key = os.getenv("SEMANTIC_API_KEY")
-        headers = {'x-api-key': api_key} if api_key else {}
-        try:
-            api_url = f"https://api.semanticscholar.org/graph/v1/paper/{paper_id}?fields=openAccessPdf,url"
-            resp = requests.get(api_url, headers=headers, timeout=10)
-            if resp.status_code == 200:
-                data = resp.json()
-                open_access = data.get('openAccessPdf')
-                if open_access and open_access.get('url'):
-                    pdf_url = open_access.get('url')
-                    print(f"PDF encontrado via API: {pdf_url}")
-                    return pdf_url
-        except Exception as e:
-            print(f"Erro ao resolver Semantic Scholar URL: {e}")
+        return resolve_paper_pdf_url(paper_id)
     return None
 
-def fetch_pdf_text_from_url(url: str) -> Optional[str]:
-    tmp_path = None
+def fetch_pdf_bytes_from_url(url: str) -> Optional[bytes]:
+    """Baixa o PDF do artigo (seguindo páginas HTML e o Wayback Machine) e retorna seus bytes."""
     target_url = url
     resolved_url = resolve_semantic_scholar_url(url)
     if resolved_url:
         target_url = resolved_url
+    return acquire_pdf(target_url)
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-        'Referer': 'https://www.google.com/',
-        'Upgrade-Insecure-Requests': '1'
-    }
-
-    try:
-        print(f"Baixando (Tentativa 1): {target_url}")
-        resp = requests.get(target_url, headers=headers, stream=True, timeout=20)
-        resp.raise_for_status()
-    except Exception as e:
-        print(f"Falha no download direto: {e}")
-        print("Ativando protocolo de resgate (Wayback Machine)...")
-        wayback_url = get_wayback_machine_url(target_url)
-        if wayback_url:
-            try:
-                print(f"Baixando do Arquivo: {wayback_url}")
-                resp = requests.get(wayback_url, headers=headers, stream=True, timeout=30)
-                resp.raise_for_status()
-            except Exception as wb_e:
-                print(f"Falha também no Wayback Machine: {wb_e}")
-                return None
-        else:
-            print("Sem backup disponível.")
-            return None
-
+def fetch_pdf_text_from_url(url: str) -> Optional[str]:
+    data = fetch_pdf_bytes_from_url(url)
+    if not data:
+        return None
     try:
-        content_type = resp.headers.get('content-type', '').lower()
-        final_url = resp.url
-
-        if 'application/pdf' not in content_type:
-            print(f"Conteúdo é HTML ({content_type}). Procurando link do PDF na página...")
-            html = resp.text
-            
-            m_meta = re.search(r'<meta\s+name=["\']citation_pdf_url["\']\s+content=["\']([^"\']+)["\']', html, flags=re.IGNORECASE)
-            pdf_link = None
-            if m_meta:
-                pdf_link = m_meta.group(1)
-            
-            if not pdf_link:
-                m_href = re.search(r'href=["\']([^"\']+\.pdf)["\']', html, flags=re.IGNORECASE)
-                if m_href:
-                    pdf_link = m_href.group(1)
-                else:
-                    m_view = re.search(r'href=["\']([^"\']+/article/view/[^"\']+/[\d]+)["\']', html, flags=re.IGNORECASE) 
-                    if not m_view:
-                        m_view = re.search(r'href=["\']([^"\']+/pdf/[^"\']+)["\']', html, flags=re.IGNORECASE)
-                    if m_view:
-                        pdf_link = m_view.group(1)
-
-            if pdf_link:
-                pdf_link = urllib.parse.urljoin(final_url, pdf_link)
-                print(f"Redirecionando para o PDF real: {pdf_link}")
-                resp = requests.get(pdf_link, headers=headers, stream=True, timeout=20)
-                resp.raise_for_status()
-            else:
-                print("Não foi possível encontrar um link de PDF nesta página HTML.")
-                return None
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            for chunk in resp.iter_content(chunk_size=8192):
-                if chunk:
-                    tmp.write(chunk)
-            tmp_path = tmp.name
-
-        try:
-            reader = PdfReader(tmp_path)
-            parts = []
-            for p in reader.pages:
-                text = p.extract_text()
-                if text:
-                    parts.append(text)
-            
-            full_text = '\n\n'.join(parts).strip()
-            if not full_text:
-                return None
-            return full_text
-            
-        except Exception as e:
-            print(f"Erro ao ler o arquivo PDF baixado: {e}")
-            return None
-
+        pages = extract_pdf_pages(data)
     except Exception as e:
-        print(f"Erro ao obter/extrair PDF: {e}")
+        print(f"Erro ao ler o arquivo PDF baixado: {e}")
         return None
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            try: os.remove(tmp_path)
-            except Exception: pass
+    full_text = '\n\n'.join(text for text in pages if text).strip()
+    return full_text or None
 
 def extract_text_content(input_value: str, is_url: bool = False) -> dict:
     text = ""
@@ -224,8 +188,7 @@ def extract_text_content(input_value: str, is_url: bool = False) -> dict:
 
 def extract_text_from_file_obj(file_obj) -> dict:
     try:
-        reader = PdfReader(file_obj)
-        parts = [p.extract_text() or '' for p in reader.pages]
+        parts = extract_pdf_pages(read_pdf_bytes(file_obj))
         text = '\n\n'.join(parts).strip()
         if not text:
              return {"error": "Não foi possível extrair texto do arquivo PDF."}
@@ -233,15 +196,184 @@ def extract_text_from_file_obj(file_obj) -> dict:
     except Exception as e:
         return {"error": f"Erro ao ler arquivo: {str(e)}"}
 
-def chat_with_context(context_text: str, messages: List[Dict[str, str]]) -> dict:
-    limit_chars = 100000
-    
+def stream_text_events(input_value: str = None, is_url: bool = False, file_obj=None) -> Iterator[dict]:
+    """
+    Versão em streaming da extração: gera um evento por página assim que ela é
+    extraída ({"event": "page", "page", "total_pages", "text", "chars"}),
+    seguido de {"event": "done"} ou de {"event": "error"} em caso de falha.
+    Aceita texto puro, URL (is_url=True) ou um arquivo PDF enviado (file_obj).
+    """
+    if file_obj is None and not is_url:
+        text = (input_value or '').strip()
+        if not text:
+            yield {"event": "error", "error": "Texto vazio."}
+            return
+        yield {"event": "page", "page": 1, "total_pages": 1, "text": text, "chars": len(text)}
+        yield {"event": "done", "pages": 1, "chars": len(text)}
+        return
+
+    try:
+        data = read_pdf_bytes(file_obj) if file_obj is not None else fetch_pdf_bytes_from_url(input_value)
+    except Exception as e:
+        yield {"event": "error", "error": f"Erro ao ler arquivo: {str(e)}"}
+        return
+    if not data:
+        yield {"event": "error", "error": "Falha ao baixar/ler o PDF."}
+        return
+
+    chars = 0
+    pages = 0
+    try:
+        for number, total_pages, text in iter_pdf_pages(data):
+            pages = number
+            chars += len(text)
+            yield {"event": "page", "page": number, "total_pages": total_pages, "text": text, "chars": chars}
+    except Exception as e:
+        yield {"event": "error", "error": f"Erro ao ler arquivo: {str(e)}"}
+        return
+
+    if not chars:
+        yield {"event": "error", "error": "Não foi possível extrair texto do arquivo PDF."}
+        return
+    yield {"event": "done", "pages": pages, "chars": chars}
+
+# --- Sessões de documento para o chat ---
+
+# O texto do artigo é registrado uma vez e as mensagens do chat passam a
+# referenciar apenas o doc_id. Os textos ficam comprimidos, expiram por TTL e
+# o total armazenado é limitado por DOCUMENT_STORE_MAX_BYTES (despejo LRU).
+DOCUMENT_STORE = SQLiteCache(
+    "documents",
+    ttl=int(os.getenv("DOCUMENT_TTL", 24 * 3600)),
+    max_bytes=int(os.getenv("DOCUMENT_STORE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+
+def register_document(text: str) -> dict:
+    """Guarda o texto e retorna seu doc_id (o mesmo texto sempre gera o mesmo id)."""
+    text = (text or '').strip()
+    if not text:
+        return {"error": "Texto vazio."}
+    doc_id = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+    DOCUMENT_STORE.set(doc_id, text)
+    return {"doc_id": doc_id, "chars": len(text)}
+
+def get_document(doc_id: str) -> Optional[str]:
+    return DOCUMENT_STORE.get(doc_id)
+
+# --- Compactação do histórico do chat ---
+
+# Conversas longas não reenviam todas as mensagens a cada turno: quando o
+# histórico passa de CHAT_HISTORY_MAX_CHARS, as mensagens antigas são
+# resumidas e só as CHAT_HISTORY_KEEP_MESSAGES mais recentes vão na íntegra.
+# O resumo é guardado pelo hash do prefixo da conversa que ele cobre e é
+# estendido de forma incremental, CHAT_HISTORY_COMPACT_STEP mensagens por vez.
+CHAT_HISTORY_MAX_CHARS = int(os.getenv("CHAT_HISTORY_MAX_CHARS", 8000))
+CHAT_HISTORY_KEEP_MESSAGES = int(os.getenv("CHAT_HISTORY_KEEP_MESSAGES", 6))
+CHAT_HISTORY_COMPACT_STEP = int(os.getenv("CHAT_HISTORY_COMPACT_STEP", 6))
+
+HISTORY_SUMMARY_PROMPT_TEMPLATE = """
+    Você mantém a memória de uma conversa entre um usuário e um assistente sobre um artigo científico.
+    Atualize o resumo da conversa incorporando as novas mensagens abaixo.
+    Preserve as perguntas feitas, as respostas dadas, números, nomes e conclusões
+    que possam ser retomados depois. Seja conciso e escreva em português.
+    Retorne apenas o texto do resumo atualizado.
+
+Resumo até agora:
+{summary}
+
+Novas mensagens:
+{messages}
+
+Resumo atualizado:"""
+HISTORY_SUMMARY_PROMPT_VERSION = hashlib.sha256(HISTORY_SUMMARY_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+
+HISTORY_CACHE = SQLiteCache(
+    "chat_history",
+    ttl=int(os.getenv("CHAT_HISTORY_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("CHAT_HISTORY_CACHE_MAX_ENTRIES", 20000)),
+)
+
+def _format_chat_messages(messages: List[Dict[str, str]]) -> str:
+    lines = []
+    for msg in messages:
+        # Acessa com get() para evitar erros
+        role = "Usuário" if msg.get('role') == 'user' else "Assistente"
+        lines.append(f"{role}: {msg.get('content')}")
+    return '\n'.join(lines)
+
+def _history_prefix_keys(messages: List[Dict[str, str]]) -> List[str]:
+    """keys[i] identifica a conversa formada pelas i primeiras mensagens."""
+    keys = [f"{MODEL_NAME}:{HISTORY_SUMMARY_PROMPT_VERSION}:"]
+    digest = hashlib.sha256()
+    for msg in messages:
+        digest.update(json.dumps([msg.get('role'), msg.get('content')], ensure_ascii=False).encode('utf-8'))
+        keys.append(f"{keys[0]}{digest.copy().hexdigest()}")
+    return keys
+
+def compact_history(messages: List[Dict[str, str]]) -> tuple:
+    """
+    Retorna (resumo_das_mensagens_antigas, mensagens_recentes).
+    O resumo é vazio enquanto o histórico couber em CHAT_HISTORY_MAX_CHARS.
+    """
+    total_chars = sum(len(msg.get('content') or '') for msg in messages)
+    if total_chars <= CHAT_HISTORY_MAX_CHARS or len(messages) <= CHAT_HISTORY_KEEP_MESSAGES:
+        return "", messages
+
+    # A fronteira anda em degraus para o resumo não ser refeito a cada turno
+    step = max(1, CHAT_HISTORY_COMPACT_STEP)
+    boundary = (len(messages) - CHAT_HISTORY_KEEP_MESSAGES) // step * step
+    if boundary <= 0:
+        return "", messages
+
+    keys = _history_prefix_keys(messages[:boundary])
+    # Reaproveita o maior prefixo já resumido e resume só o que veio depois
+    summary, start = "", 0
+    for i in range(boundary, 0, -step):
+        cached = HISTORY_CACHE.get(keys[i])
+        if cached is not None:
+            summary, start = cached, i
+            break
+    if start == boundary:
+        return summary, messages[boundary:]
+
+    prompt = HISTORY_SUMMARY_PROMPT_TEMPLATE.replace('{summary}', summary or "(vazio)")
+    prompt = prompt.replace('{messages}', _format_chat_messages(messages[start:boundary]))
+    try:
+        model = genai.GenerativeModel(MODEL_NAME)
+        summary = (call_model(model, prompt, max_tokens=1024) or '').strip()
+    except Exception as e:
+        # Sem o resumo, a conversa segue só com as mensagens recentes
+        print(f"Erro ao compactar o histórico do chat: {e}")
+        return summary, messages[start:]
+    if summary:
+        HISTORY_CACHE.set(keys[boundary], summary)
+    return summary, messages[boundary:]
+
+CHAT_MODEL_NAME = "gemini-2.0-flash" # Usando um modelo estável
+
+def build_chat_prompt(context_text: str, messages: List[Dict[str, str]]) -> str:
+    """Monta o prompt do chat (trechos do artigo + histórico compactado + pergunta)."""
+    # Pega a última pergunta do usuário de forma segura
+    last_user_msg = messages[-1].get('content') if messages and messages[-1].get('role') == 'user' else "Qual é o principal tema deste documento?"
+    # A última pergunta vai separada no fim do prompt, fora do histórico
+    history = messages[:-1] if messages and messages[-1].get('role') == 'user' else messages
+
+    # Artigos longos: só os trechos mais relevantes para a pergunta vão no prompt.
+    # A pergunta anterior do usuário entra na busca para cobrir perguntas de seguimento.
+    user_questions = [m.get('content') or '' for m in messages if m.get('role') == 'user'][-2:]
+    retrieval_query = ' '.join(user_questions) or last_user_msg
+    article_context = retrieve_context(context_text, retrieval_query)
+    excerpt_note = ""
+    if len(article_context) < len(context_text):
+        excerpt_note = "Os trechos abaixo foram selecionados do artigo por relevância para a pergunta; '[...]' indica partes omitidas."
+
     prompt_system = f"""
     Você é um assistente acadêmico especialista.
     Use o seguinte texto extraído de um artigo científico como sua única fonte de verdade para responder à pergunta do usuário.
+    {excerpt_note}
     
     --- INÍCIO DO ARTIGO ---
-    {context_text[:limit_chars]}
+    {article_context}
     --- FIM DO ARTIGO ---
 
     Instruções:
@@ -249,29 +381,60 @@ def chat_with_context(context_text: str, messages: List[Dict[str, str]]) -> dict
     2. Se a resposta não estiver no contexto, diga que o artigo não menciona isso.
     3. Use formatação Markdown para deixar a resposta clara.
     """
+
+    # Constrói o histórico da conversa para dar memória à IA
+    history_summary, recent = compact_history(history)
+    chat_history_str = _format_chat_messages(recent)
+    if history_summary:
+        chat_history_str = f"Resumo das mensagens anteriores:\n{history_summary}\n\nMensagens recentes:\n{chat_history_str}"
+
+    return f"{prompt_system}\n\nHistórico da Conversa:\n{chat_history_str}\n\nUsuário: {last_user_msg}\nResposta:"
+
+def chat_with_context(context_text: str, messages: List[Dict[str, str]]) -> dict:
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash") # Usando um modelo estável
-        
-        # 1. Constrói o histórico da conversa para dar memória à IA
-        chat_history_str = ""
-        for msg in messages:
-             # Acessa com get() para evitar erros
-             role = "Usuário" if msg.get('role') == 'user' else "Assistente"
-             chat_history_str += f"{role}: {msg.get('content')}\n"
-        
-        # 2. Pega a última pergunta do usuário de forma segura
-        last_user_msg = messages[-1].get('content') if messages and messages[-1].get('role') == 'user' else "Qual é o principal tema deste documento?"
-        
-        full_prompt = f"{prompt_system}\n\nHistórico da Conversa:\n{chat_history_str}\n\nUsuário: {last_user_msg}\nResposta:"
-        
+        full_prompt = build_chat_prompt(context_text, messages)
+        rate_limit.acquire("gemini")
+        model = genai.GenerativeModel(CHAT_MODEL_NAME)
         response = model.generate_content(full_prompt)
         return {"response": response.text}
+    except RateLimitExceeded as e:
+        print(f"Chat recusado pelo limitador de taxa: {e}")
+        return overloaded_error(e)
     except Exception as e:
         # Retorna o erro exato para debugging
         return {"error": str(e)}
 
-def summarize_article_with_gemini(article_text: str, natural_language_query: Optional[str] = None) -> dict:
-    prompt = """
+async def stream_chat_with_context(context_text: str, messages: List[Dict[str, str]]) -> AsyncIterator[dict]:
+    """
+    Versão em streaming de `chat_with_context`. Gera {"event": "token", "text"}
+    à medida que o Gemini produz a resposta e, no fim, {"event": "done", "response"}
+    com a resposta completa (ou {"event": "error", "error"}).
+    """
+    try:
+        # Recuperação e compactação do histórico são síncronas (SQLite, NumPy, Gemini)
+        full_prompt = await asyncio.to_thread(build_chat_prompt, context_text, messages)
+        await rate_limit.acquire_async("gemini")
+        model = genai.GenerativeModel(CHAT_MODEL_NAME)
+        response = await model.generate_content_async(full_prompt, stream=True)
+        parts = []
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Trecho sem texto (ex: só metadados de segurança)
+                continue
+            if text:
+                parts.append(text)
+                yield {"event": "token", "text": text}
+    except RateLimitExceeded as e:
+        yield {"event": "error", **overloaded_error(e)}
+        return
+    except Exception as e:
+        yield {"event": "error", "error": str(e)}
+        return
+    yield {"event": "done", "response": ''.join(parts)}
+
+SUMMARY_PROMPT_TEMPLATE = """
     Você é um assistente que resume artigos acadêmicos. Sua tarefa é produzir
     um objeto JSON com as seguintes chaves obrigatórias: "problem", "methodology",
     "results", "conclusion". Cada chave deve conter um resumo detalhado sobre o artigo fornecido.
@@ -280,10 +443,34 @@ def summarize_article_with_gemini(article_text: str, natural_language_query: Opt
     - Retorne APENAS um objeto JSON válido.
     - Mantenha a linguagem em português e seja objetivo.
     - Faça uma explicação completa e clara para cada seção.
-    """
-    full_prompt = f"{prompt}\n\nTexto do Artigo:\n{article_text[:50000]}\n\nSua saída JSON:"
-    model = genai.GenerativeModel(MODEL_NAME)
-    raw = call_model(model, full_prompt)
+    
+
+Texto do Artigo:
+{article_text}
+
+Sua saída JSON:"""
+# A versão do prompt é derivada do próprio template: qualquer mudança no texto
+# invalida automaticamente os resumos guardados no cache.
+SUMMARY_PROMPT_VERSION = hashlib.sha256(SUMMARY_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+SUMMARY_MAX_CHARS = 50000
+
+SUMMARY_CACHE = SQLiteCache(
+    "summaries",
+    ttl=int(os.getenv("SUMMARY_CACHE_TTL", 30 * 24 * 3600)),
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 10000)),
+)
+
+def _normalize_summary_field(v):
+    if v is None:
+        return ''
+    if isinstance(v, (dict, list)):
+        try:
+            return json.dumps(v, ensure_ascii=False)
+        except Exception:
+            return str(v)
+    return str(v).strip()
+
+def _parse_summary_response(raw: Optional[str]) -> dict:
     cleaned = (raw or '').replace('```json', '').replace('```', '').strip()
     try:
         data = json.loads(cleaned)
@@ -296,24 +483,131 @@ def summarize_article_with_gemini(article_text: str, natural_language_query: Opt
         except Exception:
             return {"error": "Resposta inválida do modelo de IA.", "raw": (raw or '')[:1000]}
 
-    def _normalize_field(v):
-        if v is None:
-            return ''
-        if isinstance(v, (dict, list)):
-            try:
-                return json.dumps(v, ensure_ascii=False)
-            except Exception:
-                return str(v)
-        return str(v).strip()
-
     return {
-        'problem': _normalize_field(data.get('problem')),
-        'methodology': _normalize_field(data.get('methodology')),
-        'results': _normalize_field(data.get('results')),
-        'conclusion': _normalize_field(data.get('conclusion')),
+        'problem': _normalize_summary_field(data.get('problem')),
+        'methodology': _normalize_summary_field(data.get('methodology')),
+        'results': _normalize_summary_field(data.get('results')),
+        'conclusion': _normalize_summary_field(data.get('conclusion')),
     }
 
-def summarize_article(input_value: str, is_url: bool = False) -> dict:
+def summary_cache_key(text_sent: str, prompt_version: str = SUMMARY_PROMPT_VERSION) -> str:
+    """Chave do cache: (modelo, versão do prompt, hash do texto realmente enviado)."""
+    text_hash = hashlib.sha256(text_sent.encode('utf-8')).hexdigest()
+    return f"{MODEL_NAME}:{prompt_version}:{text_hash}"
+
+def _generate_summary(full_prompt: str, cache_key: str, llm_slots=None) -> dict:
+    """
+    Resumo do cache ou do Gemini. `llm_slots` (um semáforo), se informado, é
+    ocupado só durante a chamada ao modelo: acertos no cache não esperam vaga.
+    """
+    cached = SUMMARY_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"Resumo obtido do cache ({cache_key[-12:]}).")
+        return cached
+
+    model = genai.GenerativeModel(MODEL_NAME)
+    try:
+        with llm_slots or nullcontext():
+            raw = call_model(model, full_prompt)
+    except RateLimitExceeded as e:
+        print(f"Resumo recusado pelo limitador de taxa: {e}")
+        return overloaded_error(e)
+    result = _parse_summary_response(raw)
+    if "error" not in result:
+        SUMMARY_CACHE.set(cache_key, result)
+    return result
+
+def summarize_article_with_gemini(article_text: str, natural_language_query: Optional[str] = None,
+                                  llm_slots=None) -> dict:
+    text_sent = article_text[:SUMMARY_MAX_CHARS]
+    full_prompt = SUMMARY_PROMPT_TEMPLATE.replace('{article_text}', text_sent)
+    return _generate_summary(full_prompt, summary_cache_key(text_sent), llm_slots)
+
+# --- Resumo em map-reduce para artigos longos ---
+
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", 20000))
+SUMMARY_MAX_PARALLEL = int(os.getenv("SUMMARY_MAX_PARALLEL", 4))
+
+SUMMARY_MAP_PROMPT_TEMPLATE = """
+    Você é um assistente que resume artigos acadêmicos. Você recebeu apenas UM TRECHO
+    de um artigo maior. Produza um objeto JSON com as chaves obrigatórias "problem",
+    "methodology", "results", "conclusion", resumindo somente o que aparece neste trecho.
+
+    Regras estritas:
+    - Retorne APENAS um objeto JSON válido.
+    - Mantenha a linguagem em português e seja objetivo.
+    - Preserve detalhes específicos: nomes de métodos, métricas e resultados numéricos.
+    - Se o trecho não tiver informação para uma chave, use uma string vazia.
+    
+
+Trecho do Artigo:
+{article_text}
+
+Sua saída JSON:"""
+SUMMARY_MAP_PROMPT_VERSION = hashlib.sha256(SUMMARY_MAP_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+
+SUMMARY_REDUCE_PROMPT_TEMPLATE = """
+    Você é um assistente que resume artigos acadêmicos. Abaixo estão resumos parciais,
+    em ordem, de trechos consecutivos do MESMO artigo. Combine-os em um único objeto JSON
+    com as chaves obrigatórias "problem", "methodology", "results", "conclusion".
+    Cada chave deve conter um resumo detalhado do artigo inteiro.
+
+    Regras estritas:
+    - Retorne APENAS um objeto JSON válido.
+    - Mantenha a linguagem em português e seja objetivo.
+    - Faça uma explicação completa e clara para cada seção, sem repetir informações.
+    
+
+Resumos Parciais:
+{article_text}
+
+Sua saída JSON:"""
+SUMMARY_REDUCE_PROMPT_VERSION = hashlib.sha256(SUMMARY_REDUCE_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+
+def _summarize_chunk(chunk: str, llm_slots=None) -> dict:
+    full_prompt = SUMMARY_MAP_PROMPT_TEMPLATE.replace('{article_text}', chunk)
+    try:
+        return _generate_summary(full_prompt, summary_cache_key(chunk, SUMMARY_MAP_PROMPT_VERSION), llm_slots)
+    except Exception as e:
+        # Um bloco com erro não pode derrubar os outros: o reduce usa os que deram certo
+        print(f"Erro ao resumir bloco do artigo: {e}")
+        return {"error": str(e)}
+
+def summarize_article_chunked(article_text: str, natural_language_query: Optional[str] = None,
+                              chunk_chars: int = None, max_parallel: int = None, llm_slots=None) -> dict:
+    """
+    Resumo em map-reduce: divide o artigo inteiro em blocos, resume os blocos em
+    paralelo (no máximo `max_parallel` chamadas simultâneas ao Gemini) e junta
+    os resumos parciais em uma chamada final que devolve o mesmo JSON de
+    summarize_article_with_gemini. Nada do texto é descartado. Com `llm_slots`,
+    cada chamada ao Gemini (de bloco ou final) também ocupa uma vaga do semáforo.
+    """
+    chunk_chars = chunk_chars or SUMMARY_CHUNK_CHARS
+    max_parallel = max_parallel or SUMMARY_MAX_PARALLEL
+
+    chunks = split_text_chunks(article_text, chunk_chars)
+    if len(chunks) <= 1:
+        return summarize_article_with_gemini(article_text, natural_language_query=natural_language_query,
+                                             llm_slots=llm_slots)
+
+    print(f"Resumo em map-reduce: {len(chunks)} blocos, até {max_parallel} em paralelo.")
+    with ThreadPoolExecutor(max_workers=min(max_parallel, len(chunks))) as pool:
+        partials = list(pool.map(partial(_summarize_chunk, llm_slots=llm_slots), chunks))
+
+    valid = [p for p in partials if "error" not in p]
+    if not valid:
+        return partials[0]
+    if len(valid) < len(partials):
+        print(f"{len(partials) - len(valid)} blocos falharam; combinando os {len(valid)} restantes.")
+
+    partials_text = '\n\n'.join(
+        f"Parte {i}: {json.dumps(p, ensure_ascii=False)}" for i, p in enumerate(valid, start=1)
+    )
+    full_prompt = SUMMARY_REDUCE_PROMPT_TEMPLATE.replace('{article_text}', partials_text)
+    return _generate_summary(full_prompt, summary_cache_key(partials_text, SUMMARY_REDUCE_PROMPT_VERSION), llm_slots)
+
+def summarize_article(input_value: str, is_url: bool = False, natural_language_query: Optional[str] = None,
+                      chunked: bool = False) -> dict:
     if is_url:
         text = fetch_pdf_text_from_url(input_value)
         if not text:
@@ -322,4 +616,6 @@ def summarize_article(input_value: str, is_url: bool = False) -> dict:
         text = input_value or ''
     if not text.strip():
         return {"error": "Texto vazio para resumir."}
-    return summarize_article_with_gemini(text)
\ No newline at end of file
+    if chunked:
+        return summarize_article_chunked(text, natural_language_query=natural_language_query)
+    return summarize_article_with_gemini(text, natural_language_query=natural_language_query)
\ No newline at end of file
@@ -1,3 +1,415 @@
-from django.test import TestCase
+import io
+import json
+import queue
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase
+
+from analyzer import acquisition, batch, retrieval, services
+
+PDF = b'%PDF-1.4 conteudo'
+
+
+def use_temp_cache(testcase, cache):
+    """Aponta um SQLiteCache para um arquivo temporário durante o teste."""
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    for patcher in (mock.patch.object(cache, 'path', Path(tmp.name) / f"{cache.name}.sqlite3"),
+                    mock.patch.object(cache, '_ready', False)):
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+
+
+def fake_response(status_code=200, content_type='application/pdf', body=PDF, url='https://exemplo.org/a'):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.headers['content-type'] = content_type
+    resp.raw = io.BytesIO(body)
+    resp.url = url
+    resp.close = mock.Mock(wraps=resp.close)
+    return resp
+
+
+class DownloadPdfTests(SimpleTestCase):
+    """Toda resposta em streaming é fechada, senão a conexão não volta ao pool do host."""
+
+    def download(self, *responses):
+        with mock.patch.object(acquisition.http_client, 'get', side_effect=list(responses)):
+            return acquisition.download_pdf('https://exemplo.org/a', 5, threading.Event())
+
+    def test_pdf_is_returned_and_response_closed(self):
+        resp = fake_response()
+        self.assertEqual(self.download(resp), PDF)
+        resp.close.assert_called()
+
+    def test_http_error_closes_response(self):
+        resp = fake_response(status_code=403, content_type='text/html', body=b'proibido')
+        with self.assertRaises(requests.HTTPError):
+            self.download(resp)
+        resp.close.assert_called()
+
+    def test_html_without_pdf_link_closes_response(self):
+        resp = fake_response(content_type='text/html', body=b'<html>sem link</html>')
+        self.assertIsNone(self.download(resp))
+        resp.close.assert_called()
+
+    def test_followed_link_closes_both_responses(self):
+        page = fake_response(content_type='text/html', body=b'<a href="/files/a.pdf">PDF</a>')
+        pdf = fake_response(status_code=404, content_type='text/html', body=b'')
+        with self.assertRaises(requests.HTTPError):
+            self.download(page, pdf)
+        page.close.assert_called()
+        pdf.close.assert_called()
+
+    def test_cancelled_download_closes_response(self):
+        resp = fake_response()
+        cancelled = threading.Event()
+        cancelled.set()
+        with mock.patch.object(acquisition.http_client, 'get', return_value=resp):
+            with self.assertRaises(acquisition.DownloadCancelled):
+                acquisition.download_pdf('https://exemplo.org/a', 5, cancelled)
+        resp.close.assert_called()
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        use_temp_cache(self, acquisition.PDF_HOST_HEALTH)
+
+    def test_opens_after_consecutive_failures_and_closes_after_cooldown(self):
+        host = 'lento.org'
+        for _ in range(acquisition.PDF_BREAKER_FAILURES - 1):
+            acquisition.record_host_result(host, False)
+        self.assertFalse(acquisition.is_circuit_open(host))
+        acquisition.record_host_result(host, False)
+        self.assertTrue(acquisition.is_circuit_open(host))
+
+        later = time.time() + acquisition.PDF_BREAKER_COOLDOWN + 1
+        with mock.patch('analyzer.acquisition.time.time', return_value=later):
+            self.assertFalse(acquisition.is_circuit_open(host))
+
+    def test_success_resets_the_failure_count(self):
+        host = 'instavel.org'
+        for _ in range(acquisition.PDF_BREAKER_FAILURES - 1):
+            acquisition.record_host_result(host, False)
+        acquisition.record_host_result(host, True)
+        acquisition.record_host_result(host, False)
+        self.assertFalse(acquisition.is_circuit_open(host))
+
+    def test_open_circuit_skips_the_direct_download(self):
+        for _ in range(acquisition.PDF_BREAKER_FAILURES):
+            acquisition.record_host_result('exemplo.org', False)
+        with mock.patch.object(acquisition, '_direct_source') as direct, \
+                mock.patch.object(acquisition, '_wayback_source', return_value=PDF):
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a'), PDF)
+        direct.assert_not_called()
+
+
+class HedgeTests(SimpleTestCase):
+    def setUp(self):
+        use_temp_cache(self, acquisition.PDF_HOST_HEALTH)
+
+    def test_wayback_wins_when_direct_is_slow_and_direct_is_cancelled(self):
+        direct_cancelled = threading.Event()
+
+        def slow_direct(url, cancelled):
+            if cancelled.wait(5):
+                direct_cancelled.set()
+            return None
+
+        with mock.patch.object(acquisition, '_direct_source', side_effect=slow_direct), \
+                mock.patch.object(acquisition, '_wayback_source', return_value=PDF) as wayback:
+            start = time.monotonic()
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=0.05), PDF)
+            self.assertLess(time.monotonic() - start, 2)
+        wayback.assert_called_once()
+        self.assertTrue(direct_cancelled.wait(2))
+
+    def test_fast_direct_download_never_hedges(self):
+        with mock.patch.object(acquisition, '_direct_source', return_value=PDF), \
+                mock.patch.object(acquisition, '_wayback_source') as wayback:
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=5), PDF)
+        wayback.assert_not_called()
+
+    def test_failed_direct_download_falls_back_to_wayback(self):
+        with mock.patch.object(acquisition, '_direct_source', return_value=None), \
+                mock.patch.object(acquisition, '_wayback_source', return_value=PDF):
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=5), PDF)
+
+    def test_hedge_fires_only_after_the_delay(self):
+        start = time.monotonic()
+        fired_at = []
+
+        def wayback(url, cancelled):
+            fired_at.append(time.monotonic() - start)
+            return PDF
+
+        with mock.patch.object(acquisition, '_direct_source', side_effect=lambda url, cancelled: cancelled.wait(5) and None), \
+                mock.patch.object(acquisition, '_wayback_source', side_effect=wayback):
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=0.2), PDF)
+        self.assertEqual(len(fired_at), 1)
+        self.assertGreaterEqual(fired_at[0], 0.2)
+
+    def test_first_success_wins(self):
+        def direct(url, cancelled):
+            time.sleep(0.1)
+            return b'%PDF-1.4 direto'
+
+        def wayback(url, cancelled):
+            time.sleep(1)
+            return b'%PDF-1.4 arquivo'
+
+        with mock.patch.object(acquisition, '_direct_source', side_effect=direct), \
+                mock.patch.object(acquisition, '_wayback_source', side_effect=wayback) as wayback_source:
+            start = time.monotonic()
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=0.02), b'%PDF-1.4 direto')
+            self.assertLess(time.monotonic() - start, 0.9)
+        wayback_source.assert_called_once()
+
+    def test_losing_download_is_closed(self):
+        class SlowBody(io.RawIOBase):
+            def read(self, size=-1):
+                time.sleep(0.05)
+                return b'%PDF-1.4 '
+
+        slow = fake_response()
+        slow.raw = SlowBody()
+        archived = fake_response(url='https://web.archive.org/web/2020/https://exemplo.org/a')
+        responses = {'https://exemplo.org/a': slow, archived.url: archived}
+
+        with mock.patch.object(acquisition.http_client, 'get', side_effect=lambda url, **kwargs: responses[url]), \
+                mock.patch.object(acquisition, 'get_wayback_machine_url', return_value=archived.url):
+            self.assertEqual(acquisition.acquire_pdf('https://exemplo.org/a', hedge_delay=0.1), PDF)
+            # O download direto percebe o cancelamento no próximo bloco, devolve a conexão
+            # e conta a derrota no circuit breaker
+            deadline = time.monotonic() + 2
+            while not acquisition.PDF_HOST_HEALTH.get('exemplo.org') and time.monotonic() < deadline:
+                time.sleep(0.01)
+        slow.close.assert_called()
+        archived.close.assert_called()
+        self.assertEqual(acquisition.PDF_HOST_HEALTH.get('exemplo.org')['failures'], 1)
+
+
+class CompactHistoryTests(SimpleTestCase):
+    """Fronteira em degraus e reaproveitamento incremental do resumo do histórico."""
+
+    def setUp(self):
+        use_temp_cache(self, services.HISTORY_CACHE)
+        for patcher in (
+            mock.patch.object(services, 'CHAT_HISTORY_MAX_CHARS', 10),
+            mock.patch.object(services, 'CHAT_HISTORY_KEEP_MESSAGES', 2),
+            mock.patch.object(services, 'CHAT_HISTORY_COMPACT_STEP', 3),
+            mock.patch.object(services.genai, 'GenerativeModel'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(services, 'call_model', side_effect=['resumo A', 'resumo B'])
+        self.call_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def conversation(self, size):
+        return [{'role': 'user' if i % 2 == 0 else 'model', 'content': f'mensagem {i}'} for i in range(size)]
+
+    def prompt(self, call_index):
+        return self.call_model.call_args_list[call_index].args[1]
+
+    def test_short_history_is_not_compacted(self):
+        messages = self.conversation(1)
+        self.assertEqual(services.compact_history(messages), ("", messages))
+        self.call_model.assert_not_called()
+
+    def test_boundary_moves_in_steps_and_reuses_the_cached_prefix(self):
+        messages = self.conversation(9)
+
+        # (7 - 2) // 3 * 3 = 3: resume as mensagens 0..2
+        summary, recent = services.compact_history(messages[:7])
+        self.assertEqual((summary, recent), ('resumo A', messages[3:7]))
+        self.assertIn('mensagem 0', self.prompt(0))
+
+        # Fronteira em 6: resume só 3..5, partindo do resumo já guardado
+        summary, recent = services.compact_history(messages[:8])
+        self.assertEqual((summary, recent), ('resumo B', messages[6:8]))
+        self.assertIn('resumo A', self.prompt(1))
+        self.assertIn('mensagem 3', self.prompt(1))
+        self.assertNotIn('mensagem 0', self.prompt(1))
+
+        # Mesma fronteira: nenhuma chamada nova ao modelo
+        self.assertEqual(services.compact_history(messages), ('resumo B', messages[6:]))
+        self.assertEqual(self.call_model.call_count, 2)
+
+    def test_edited_history_does_not_reuse_the_old_summary(self):
+        messages = self.conversation(7)
+        services.compact_history(messages)
+        edited = [{'role': 'user', 'content': 'outra pergunta'}] + messages[1:]
+
+        services.compact_history(edited)
+        self.assertIn('outra pergunta', self.prompt(1))
+        self.assertNotIn('resumo A', self.prompt(1))
+
+    def test_model_failure_keeps_the_uncompacted_messages(self):
+        self.call_model.side_effect = RuntimeError("falhou")
+        messages = self.conversation(7)
+        self.assertEqual(services.compact_history(messages), ("", messages))
+
+
+SUMMARY = {'problem': 'p', 'methodology': 'm', 'results': 'r', 'conclusion': 'c'}
+
+
+class BatchLlmSlotsTests(SimpleTestCase):
+    """SUMMARY_BATCH_LLM_CONCURRENCY limita cada chamada ao Gemini, inclusive os blocos do map-reduce."""
+
+    def setUp(self):
+        use_temp_cache(self, services.SUMMARY_CACHE)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        for patcher in (
+            mock.patch.object(services.genai, 'GenerativeModel'),
+            mock.patch.object(services, 'call_model', side_effect=self.slow_model),
+            mock.patch.object(batch, 'fetch_pdf_bytes_from_url', return_value=PDF),
+            mock.patch.object(batch, 'extract_pdf_pages_pooled',
+                              return_value=[f'Parágrafo {i} ' + 'x' * 50 for i in range(6)]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def slow_model(self, model, prompt, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return json.dumps(SUMMARY)
+
+    def summarize_item(self, chunked):
+        return batch._summarize_item(0, 'https://exemplo.org/a.pdf', None, chunked, None, queue.Queue())
+
+    def test_chunked_items_respect_the_batch_cap(self):
+        with mock.patch.object(batch, '_llm_slots', threading.BoundedSemaphore(2)), \
+                mock.patch.object(services, 'SUMMARY_CHUNK_CHARS', 70), \
+                mock.patch.object(services, 'SUMMARY_MAX_PARALLEL', 6):
+            self.assertEqual(self.summarize_item(chunked=True), SUMMARY)
+        # 6 blocos + a chamada final, nunca mais de 2 ao mesmo tempo
+        self.assertEqual(services.call_model.call_count, 7)
+        self.assertEqual(self.max_active, 2)
+
+    def test_cached_summary_does_not_wait_for_a_slot(self):
+        self.assertEqual(self.summarize_item(chunked=False), SUMMARY)
+        busy = threading.BoundedSemaphore(1)
+        busy.acquire()
+        with mock.patch.object(batch, '_llm_slots', busy):
+            self.assertEqual(self.summarize_item(chunked=False), SUMMARY)
+        self.assertEqual(services.call_model.call_count, 1)
+
+
+class ResolvePaperPdfUrlsTests(SimpleTestCase):
+    """Resolução em lote via /paper/batch, com cache positivo e negativo."""
+
+    def setUp(self):
+        use_temp_cache(self, services.PDF_URL_CACHE)
+        self.failing = set()
+        patcher = mock.patch.object(services.http_client, 'post', side_effect=self.paper_batch)
+        self.post = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def paper_batch(self, url, json=None, **kwargs):
+        ids = json['ids']
+        if self.failing & set(ids):
+            raise requests.ConnectionError("falhou")
+        resp = mock.Mock()
+        # Ids terminados em "x" não têm PDF em acesso aberto; "?" é desconhecido (null)
+        resp.json.return_value = [
+            None if paper_id.endswith('?') else
+            {'openAccessPdf': None if paper_id.endswith('x') else {'url': f'https://pdf/{paper_id}'}}
+            for paper_id in ids
+        ]
+        return resp
+
+    def batch_sizes(self):
+        return [len(call.kwargs['json']['ids']) for call in self.post.call_args_list]
+
+    def test_ids_are_split_in_blocks_of_500(self):
+        ids = [f'p{i}' for i in range(1001)]
+        resolved = services.resolve_paper_pdf_urls(ids + ['p0'])
+        self.assertEqual(self.batch_sizes(), [500, 500, 1])
+        self.assertEqual(len(resolved), 1001)
+        self.assertEqual(resolved['p1000'], 'https://pdf/p1000')
+
+    def test_cached_hits_and_misses_skip_the_api(self):
+        first = services.resolve_paper_pdf_urls(['p1', 'p2x', 'p3?'])
+        self.assertEqual(first, {'p1': 'https://pdf/p1', 'p2x': None, 'p3?': None})
+
+        second = services.resolve_paper_pdf_urls(['p1', 'p2x', 'p3?', 'p4'])
+        self.assertEqual(second['p2x'], None)
+        self.assertEqual(self.batch_sizes(), [3, 1])
+
+    def test_failed_block_is_reported_as_none_and_not_cached(self):
+        with mock.patch.object(services, 'SEMANTIC_PAPER_BATCH_MAX_IDS', 2):
+            self.failing = {'p3'}
+            resolved = services.resolve_paper_pdf_urls(['p1', 'p2', 'p3', 'p4'])
+            self.assertEqual(resolved, {'p1': 'https://pdf/p1', 'p2': 'https://pdf/p2', 'p3': None, 'p4': None})
+
+            self.failing = set()
+            retried = services.resolve_paper_pdf_urls(['p1', 'p2', 'p3', 'p4'])
+        self.assertEqual(retried['p3'], 'https://pdf/p3')
+        self.assertEqual(self.batch_sizes(), [2, 2, 2])
+
+
+class RetrievalTests(SimpleTestCase):
+    """Ranking BM25, cache LRU de índices e montagem do contexto do chat."""
+
+    def setUp(self):
+        patcher = mock.patch.object(retrieval, '_indexes', retrieval.OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ranking_favours_rare_and_repeated_terms(self):
+        index = retrieval.BM25Index([
+            'Introdução sobre redes e modelos.',
+            'Transformers transformers atenção em modelos.',
+            'Modelos convolucionais para imagens.',
+            'Resultados em benchmarks.',
+        ])
+        self.assertEqual(index.top_k('transformers modelos', 4)[0], 1)
+        # "modelos" aparece em três trechos; trechos sem nenhum termo ficam de fora
+        self.assertEqual(set(index.top_k('transformers modelos', 4)), {0, 1, 2})
+        self.assertEqual(index.top_k('Atenção', 1), [1])
+
+    def test_query_without_known_terms_returns_nothing(self):
+        index = retrieval.BM25Index(['Primeiro trecho.', 'Segundo trecho.'])
+        self.assertEqual(index.top_k('de o a', 2), [])
+        self.assertEqual(index.top_k('inexistente', 2), [])
+
+    def test_index_cache_reuses_and_evicts_least_recently_used(self):
+        with mock.patch.object(retrieval, 'CHAT_INDEX_CACHE_SIZE', 2):
+            first = retrieval.get_index('documento um')
+            retrieval.get_index('documento dois')
+            self.assertIs(retrieval.get_index('documento um'), first)  # agora o mais recente
+            retrieval.get_index('documento tres')
+
+            self.assertEqual(len(retrieval._indexes), 2)
+            self.assertIs(retrieval.get_index('documento um'), first)
+            with mock.patch.object(retrieval, 'BM25Index', wraps=retrieval.BM25Index) as build:
+                retrieval.get_index('documento dois')
+            build.assert_called_once()
+
+    def test_long_article_sends_first_and_relevant_chunks_in_document_order(self):
+        paragraphs = [f'Seção {i}: ' + ('texto genérico ' * 8) for i in range(10)]
+        paragraphs[7] = 'Seção 7: a acurácia obtida foi de 93 por cento.'
+        text = '\n\n'.join(paragraphs)
+        with mock.patch.object(retrieval, 'CHAT_FULL_CONTEXT_CHARS', 100):
+            context = retrieval.retrieve_context(text, 'Qual a acurácia?', top_k=1, chunk_chars=150)
+        self.assertEqual(context.split('\n\n[...]\n\n'), [paragraphs[0], paragraphs[7]])
+
+    def test_short_article_goes_whole_and_generic_question_gets_the_beginning(self):
+        self.assertEqual(retrieval.retrieve_context('curto', 'pergunta'), 'curto')
+        text = '\n\n'.join(f'Parte {i} ' + 'x' * 100 for i in range(5))
+        with mock.patch.object(retrieval, 'CHAT_FULL_CONTEXT_CHARS', 100):
+            context = retrieval.retrieve_context(text, 'o que?', top_k=2, chunk_chars=150)
+        self.assertEqual(context.count('[...]'), 1)
+        self.assertTrue(context.startswith('Parte 0') and 'Parte 1' in context)
@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from explorer.services import SEARCH_BATCH_MAX_QUERIES
+from analyzer.batch import SUMMARY_BATCH_MAX_ITEMS
+from analyzer.services import PAPER_RESOLVE_MAX_IDS
 
 # --- Serializers da Busca ---
 
@@ -9,8 +12,8 @@ class SearchQuerySerializer(serializers.Serializer):
     Define o formato esperado para a query de busca.
     """
     query = serializers.CharField(
-        required=True,
-        help_text="A pergunta ou termos de busca em linguagem natural."
+        required=False,
+        help_text="A pergunta ou termos de busca em linguagem natural (dispensável quando 'cursor' é enviado)."
     )
     sort_by = serializers.CharField(
         required=False, 
@@ -39,10 +42,38 @@ class SearchQuerySerializer(serializers.Serializer):
         default=True,
         help_text="Filtrar apenas por artigos com PDF gratuito."
     )
+    buffered = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Paginação com buffer no servidor: páginas de tamanho fixo e 'next_cursor' na resposta (ignora 'offset')."
+    )
+    speculative = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Busca em paralelo com a query bruta e a expandida pela IA, mesclando os resultados (respeita um prazo para a IA)."
+    )
+    local_first = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Responde do índice local de artigos já vistos e só consulta o Semantic Scholar se houver poucos resultados."
+    )
+    cursor = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Cursor opaco retornado em 'next_cursor' para buscar a próxima página (dispensa reprocessar a query)."
+    )
+
+    def validate(self, attrs):
+        # Com cursor, a query (já processada pelo Gemini) vem dentro dele
+        if not attrs.get('cursor') and not attrs.get('query'):
+            raise serializers.ValidationError({"query": "Este campo é obrigatório."})
+        return attrs
+
 class ArticleSerializer(serializers.Serializer):
     """
     Define a estrutura de um único artigo na lista de resultados.
     """
+    paperId = serializers.CharField(required=False, allow_null=True, help_text="Id do artigo no Semantic Scholar.")
     title = serializers.CharField()
     authors = serializers.ListField(child=serializers.CharField())
     year = serializers.IntegerField(allow_null=True)
@@ -50,6 +81,7 @@ class ArticleSerializer(serializers.Serializer):
     abstract = serializers.CharField(allow_null=True)
     citationCount = serializers.IntegerField()
     journal = serializers.CharField(allow_null=True)
+    isOpenAccess = serializers.BooleanField(required=False)
 
 
 class ApiResponseSerializer(serializers.Serializer):
@@ -59,7 +91,49 @@ class ApiResponseSerializer(serializers.Serializer):
     success = serializers.BooleanField(help_text="Indica se a operação foi bem-sucedida.")
     message = serializers.CharField(help_text="Uma mensagem amigável para o usuário.")
     articles = ArticleSerializer(many=True, help_text="A lista de artigos encontrados.")
+    next_cursor = serializers.CharField(
+        required=False,
+        allow_null=True,
+        help_text="(Modo com buffer) Cursor da próxima página, ou null quando não há mais resultados."
+    )
+
+
+class SearchBatchSerializer(serializers.Serializer):
+    """
+    Lote de buscas: cada item tem o mesmo formato de /search/.
+    """
+    queries = SearchQuerySerializer(many=True, allow_empty=False, help_text="Lista de consultas de busca.")
+
+    def validate_queries(self, value):
+        if len(value) > SEARCH_BATCH_MAX_QUERIES:
+            raise serializers.ValidationError(f"No máximo {SEARCH_BATCH_MAX_QUERIES} consultas por lote.")
+        return value
 
+class SearchBatchResultSerializer(ApiResponseSerializer):
+    """
+    Resultado de uma consulta do lote (mesmo formato de /search/, mais a posição e o status).
+    """
+    index = serializers.IntegerField(help_text="Posição da consulta na lista enviada.")
+    query = serializers.CharField()
+    status = serializers.IntegerField(help_text="Status HTTP que a consulta teria isoladamente.")
+
+class SearchBatchResponseSerializer(serializers.Serializer):
+    success = serializers.BooleanField(help_text="True se todas as consultas tiveram sucesso.")
+    results = SearchBatchResultSerializer(many=True)
+
+class PaperResolveInputSerializer(serializers.Serializer):
+    paper_ids = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=PAPER_RESOLVE_MAX_IDS,
+        help_text="Ids do Semantic Scholar (ex: 'paperId' da busca, 'DOI:...', 'ARXIV:...')."
+    )
+
+class PaperResolveOutputSerializer(serializers.Serializer):
+    pdf_urls = serializers.DictField(
+        child=serializers.CharField(allow_null=True),
+        help_text="URL do PDF em acesso aberto de cada id, ou null se não houver."
+    )
 
 # --- Serializers do Resumo ---
 
@@ -70,6 +144,11 @@ class SummarizeBaseInputSerializer(serializers.Serializer):
         required=False,
         allow_blank=True
     )
+    chunked = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Resumo em map-reduce: considera o artigo inteiro em vez de cortar em 50.000 caracteres."
+    )
 
 class SummarizeJsonInputSerializer(SummarizeBaseInputSerializer):
     """ 
@@ -94,6 +173,17 @@ class SummarizeFormInputSerializer(SummarizeBaseInputSerializer):
     )
     # Nota: Os outros campos (como 'query') também virão como FormData.
 
+class SummarizeBatchInputSerializer(SummarizeBaseInputSerializer):
+    """
+    Define a entrada para o resumo em lote.
+    """
+    items = serializers.ListField(
+        child=serializers.CharField(),
+        allow_empty=False,
+        max_length=SUMMARY_BATCH_MAX_ITEMS,
+        help_text="URLs dos PDFs/páginas dos artigos ou ids do Semantic Scholar (ex: 'DOI:10.1000/xyz')."
+    )
+
 class SummarizeOutputSerializer(serializers.Serializer):
     problem = serializers.CharField(allow_blank=True, help_text="O problema abordado pelo artigo.")
     methodology = serializers.CharField(allow_blank=True, help_text="A metodologia utilizada.")
@@ -109,10 +199,15 @@ class FormatTextSerializer(serializers.Serializer):
     - file: o arquivo enviado (pdf ou txt)
     - style: (opcional) nome do estilo a ser aplicado
     - filename: (opcional) sugestão de nome base para os arquivos gerados
+    - sectioned: (opcional) conversão por seções em paralelo para documentos longos
     """
     file = serializers.FileField(required=True, help_text="Upload do arquivo (.pdf ou .txt).")
     style = serializers.CharField(required=False, allow_blank=True, help_text="Nome do estilo (ex: 'AAAI').")
     filename = serializers.CharField(required=False, allow_blank=True, help_text="Nome base para salvar arquivos (sem extensão).")
+    sectioned = serializers.BooleanField(
+        default=False,
+        help_text="Converte documentos longos por seções, em paralelo, sem cortar o texto em 25 mil caracteres."
+    )
 
 
 class FewshotInputSerializer(serializers.Serializer):
@@ -133,6 +228,19 @@ class FormatTextOutputSerializer(serializers.Serializer):
                                      help_text="Caminho do arquivo .pdf gerado (no servidor).")
     error = serializers.CharField(allow_blank=True, required=False)
 
+class FormatJobSerializer(serializers.Serializer):
+    """
+    Estado de um job de formatação em segundo plano.
+    """
+    job_id = serializers.CharField()
+    status = serializers.ChoiceField(choices=['queued', 'running', 'done', 'error'])
+    stage = serializers.CharField(allow_null=True, help_text="Etapa atual: 'extract', 'llm' ou 'compile'.")
+    error = serializers.CharField(allow_null=True, required=False)
+    download_url = serializers.CharField(allow_null=True, required=False,
+                                         help_text="Disponível quando status = 'done'.")
+    created_at = serializers.FloatField()
+    updated_at = serializers.FloatField()
+
 class ExtractTextOutputSerializer(serializers.Serializer):
     text = serializers.CharField()
     error = serializers.CharField(required=False)
@@ -142,9 +250,20 @@ class ChatMessageSerializer(serializers.Serializer):
     content = serializers.CharField()
 
 class ChatInputSerializer(serializers.Serializer):
-    context = serializers.CharField(help_text="O texto completo do artigo.")
+    context = serializers.CharField(required=False, help_text="O texto completo do artigo (ou use 'doc_id').")
+    doc_id = serializers.CharField(required=False, help_text="Id de um documento registrado em /documents/.")
     messages = ChatMessageSerializer(many=True)
 
+    def validate(self, attrs):
+        if not attrs.get('context') and not attrs.get('doc_id'):
+            raise serializers.ValidationError("Forneça 'context' ou 'doc_id'.")
+        return attrs
+
+class DocumentOutputSerializer(serializers.Serializer):
+    doc_id = serializers.CharField(help_text="Id do documento, para usar nas mensagens do chat.")
+    chars = serializers.IntegerField(help_text="Tamanho do texto registrado.")
+    error = serializers.CharField(required=False)
+
 class ChatOutputSerializer(serializers.Serializer):
     response = serializers.CharField()
     error = serializers.CharField(required=False)
@@ -1,3 +1,83 @@
-from django.test import TestCase
+import os
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from api.serializers import SearchQuerySerializer
+from explorer.services import SEARCH_OVERLOADED_MESSAGE
+from researchflow.rate_limit import RateLimitExceeded, overloaded_error
+
+
+class GeminiOverloadTests(SimpleTestCase):
+    """Chamadas recusadas pelo limitador de taxa do Gemini viram 503 com Retry-After."""
+
+    def test_chat_returns_503(self):
+        result = overloaded_error(RateLimitExceeded("recusada", retry_after=4.2))
+        with mock.patch('api.views.chat_with_context', return_value=result):
+            response = self.client.post('/api/chat/', {
+                'context': 'texto do artigo',
+                'messages': [{'role': 'user', 'content': 'Qual o tema?'}],
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(response.json()['retry_after'], 5)
+
+    def test_summarize_returns_503(self):
+        result = overloaded_error(RateLimitExceeded("recusada", retry_after=1))
+        with mock.patch('api.views.summarize_article', return_value=result):
+            response = self.client.post('/api/summarize/json/', {'input_value': 'texto do artigo'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class SemanticScholarOverloadTests(SimpleTestCase):
+    """A busca recusada pelo orçamento do Semantic Scholar também responde 503 com Retry-After."""
+
+    def setUp(self):
+        patcher = mock.patch('api.views.extract_keywords_with_gemini', side_effect=lambda query: query)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def rejected_get(self, *args, **kwargs):
+        raise RateLimitExceeded("Orçamento do semantic_scholar esgotado.", retry_after=2.5)
+
+    def test_search_returns_503_with_retry_after(self):
+        with mock.patch.dict(os.environ, {'SEMANTIC_API_KEY': 'chave'}), \
+                mock.patch('explorer.services.http_client.get', side_effect=self.rejected_get):
+            response = self.client.post('/api/search/', {'query': 'grafos'}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(response.json()['message'], SEARCH_OVERLOADED_MESSAGE)
+
+    def test_buffered_search_returns_503_with_retry_after(self):
+        with mock.patch.dict(os.environ, {'SEMANTIC_API_KEY': 'chave'}), \
+                mock.patch('explorer.services.http_client.get', side_effect=self.rejected_get), \
+                mock.patch('explorer.services.SEARCH_BUFFERS.get', return_value=None):
+            response = self.client.post('/api/search/', {'query': 'grafos', 'buffered': True},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertIsNone(response.json()['next_cursor'])
+
+
+class SearchQuerySerializerTests(SimpleTestCase):
+    """A query só é obrigatória quando a requisição não traz um cursor."""
+
+    def test_cursor_without_query_is_valid(self):
+        serializer = SearchQuerySerializer(data={'cursor': 'abc'})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_query_is_required_without_cursor(self):
+        serializer = SearchQuerySerializer(data={'buffered': True})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('query', serializer.errors)
+
+    def test_next_page_request_needs_only_the_cursor(self):
+        result = {"articles": [], "next_cursor": None}
+        with mock.patch('api.views.search_articles_buffered', return_value=result) as buffered, \
+                mock.patch('api.views.extract_keywords_with_gemini') as keywords:
+            response = self.client.post('/api/search/', {'cursor': 'abc'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(buffered.call_args.kwargs['cursor'], 'abc')
+        keywords.assert_not_called()
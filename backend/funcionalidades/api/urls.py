@@ -1,13 +1,26 @@
 from django.urls import path
-from .views import get_status, search_articles_view, summarize_article_json_view, summarize_article_file_view, extract_text_json_view,extract_text_file_view, chat_document_view,format_text_view
+from .views import get_status, metrics_view, search_articles_view, search_articles_async_view, search_batch_view, resolve_papers_view, summarize_article_json_view, summarize_article_file_view, summarize_batch_view, extract_text_json_view,extract_text_file_view, extract_text_stream_json_view, extract_text_stream_file_view, register_document_json_view, register_document_file_view, chat_document_view, chat_stream_view, format_text_view, format_job_create_view, format_job_status_view, format_job_download_view
 
 urlpatterns = [
     path('status/', get_status, name='get_status'),
+    path('metrics/', metrics_view, name='metrics'),
     path('search/', search_articles_view, name='search_articles'),
+    path('search/async/', search_articles_async_view, name='search_articles_async'),
+    path('search/batch/', search_batch_view, name='search_batch'),
+    path('papers/resolve/', resolve_papers_view, name='resolve_papers'),
     path('summarize/json/', summarize_article_json_view, name='summarize_json'),
     path('summarize/file/', summarize_article_file_view, name='summarize_file'),
+    path('summarize/batch/', summarize_batch_view, name='summarize_batch'),
     path('extract/json/', extract_text_json_view, name='extract_text_json'),
     path('extract/file/', extract_text_file_view, name='extract_text_file'),
+    path('extract/stream/json/', extract_text_stream_json_view, name='extract_text_stream_json'),
+    path('extract/stream/file/', extract_text_stream_file_view, name='extract_text_stream_file'),
+    path('documents/json/', register_document_json_view, name='register_document_json'),
+    path('documents/file/', register_document_file_view, name='register_document_file'),
     path('chat/', chat_document_view, name='chat_document'),
+    path('chat/stream/', chat_stream_view, name='chat_stream'),
     path('format/', format_text_view, name='format_text'),
+    path('format/jobs/', format_job_create_view, name='format_job_create'),
+    path('format/jobs/<str:job_id>/', format_job_status_view, name='format_job_status'),
+    path('format/jobs/<str:job_id>/download/', format_job_download_view, name='format_job_download'),
 ]
\ No newline at end of file
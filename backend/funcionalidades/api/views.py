@@ -4,28 +4,52 @@ from rest_framework import status
 from drf_spectacular.utils import extend_schema
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from pathlib import Path
-import os
-from django.http import FileResponse
+import io
+import json
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 # Importa TODOS os serializers
 from .serializers import (
     SearchQuerySerializer, 
     ApiResponseSerializer,
+    SearchBatchSerializer,
+    SearchBatchResponseSerializer,
+    PaperResolveInputSerializer,
+    PaperResolveOutputSerializer,
     SummarizeInputSerializer, # Mantido para compatibilidade se necessário
     SummarizeJsonInputSerializer, 
     SummarizeFormInputSerializer,
     SummarizeOutputSerializer,
+    SummarizeBatchInputSerializer,
     ExtractTextOutputSerializer,
     ChatInputSerializer,
     ChatOutputSerializer,
+    DocumentOutputSerializer,
     FormatTextSerializer,
-    FormatTextOutputSerializer
+    FormatTextOutputSerializer,
+    FormatJobSerializer
 )
 
 # Importa a lógica de CADA app separado
-from explorer.services import extract_keywords_with_gemini, search_articles_from_api
-from analyzer.services import summarize_article, extract_text_content, extract_text_from_file_obj, chat_with_context
+from explorer.services import (
+    extract_keywords_with_gemini, search_articles_from_api, search_articles_buffered,
+    extract_keywords_with_gemini_async, search_articles_from_api_async,
+    speculative_search, speculative_search_async, run_search_batch,
+    search_local_first, search_local_first_async
+)
+from analyzer.services import (
+    summarize_article, extract_text_content, extract_text_from_file_obj, chat_with_context, stream_text_events,
+    register_document, get_document, stream_chat_with_context, resolve_paper_pdf_urls
+)
+from analyzer.batch import summarize_batch_events
 from writer.services import format_text_with_gemini, extract_text_from_file
+from writer.jobs import submit_job, get_job, get_job_pdf
+from researchflow.cache import all_cache_stats
+from researchflow.rate_limit import RateLimitExceeded, overloaded_error, rate_limit_stats
 
 @extend_schema(exclude=True)
 @api_view(['GET'])
@@ -33,6 +57,17 @@ def get_status(request):
     """ Um endpoint simples para verificar se a API está online. """
     return Response({"status": "ok", "message": "Backend is running!"})
 
+@extend_schema(
+    summary="Métricas dos Caches",
+    description=(
+        "Contadores de acertos/erros de cada cache persistente (ex: tempo de Gemini economizado) e, "
+        "para cada API externa, a fila de espera do limitador de taxa e os tempos de espera."
+    ),
+)
+@api_view(['GET'])
+def metrics_view(request):
+    return Response({"caches": all_cache_stats(), "rate_limits": rate_limit_stats()})
+
 @extend_schema(
     summary="Busca Artigos com IA",
     description="Recebe uma query de busca, usa IA para otimizá-la e retorna os artigos mais relevantes com filtros.",
@@ -48,7 +83,37 @@ def search_articles_view(request):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    validated_data = serializer.validated_data
+    payload, status_code = _search_result(serializer.validated_data)
+    return Response(payload, status=status_code, headers=_retry_after_headers(payload))
+
+
+def _search_result(validated_data):
+    """Executa uma busca já validada e retorna (payload, status)."""
+    if validated_data['buffered'] or validated_data.get('cursor'):
+        return _buffered_search_result(validated_data)
+    
+    if validated_data['speculative']:
+        # Query bruta e query expandida pela IA em paralelo
+        articles = speculative_search(
+            validated_data['query'],
+            sort_by=validated_data['sort_by'],
+            year_from=validated_data.get('year_from'),
+            year_to=validated_data.get('year_to'),
+            offset=validated_data['offset'],
+            is_open_access=validated_data['is_open_access']
+        )
+        return _search_payload(articles)
+
+    if validated_data['local_first']:
+        articles = search_local_first(
+            validated_data['query'],
+            sort_by=validated_data['sort_by'],
+            year_from=validated_data.get('year_from'),
+            year_to=validated_data.get('year_to'),
+            offset=validated_data['offset'],
+            is_open_access=validated_data['is_open_access']
+        )
+        return _search_payload(articles)
     
     # 1. Processa a query com IA
     keywords = extract_keywords_with_gemini(validated_data['query'])
@@ -63,32 +128,220 @@ def search_articles_view(request):
         is_open_access=validated_data['is_open_access']
     )
 
+    return _search_payload(articles)
+
+
+# Helpers compartilhados pelas views de busca (síncrona e assíncrona)
+def _search_error_payload(result):
+    payload = {
+        "success": False,
+        "message": "Puxa, tive um problema para me conectar à base de dados. Tente novamente.",
+        "articles": []
+    }
+    if "retry_after" in result:
+        # Recusada pelo limitador de taxa: mesma mensagem e Retry-After do caminho do Gemini
+        payload["message"] = result["error"]
+        payload["retry_after"] = result["retry_after"]
+    return payload
+
+def _retry_after_headers(payload):
+    if "retry_after" in payload:
+        return {'Retry-After': str(payload['retry_after'])}
+    return None
+
+def _search_payload(articles):
     if "error" in articles:
-        return Response({
-            "success": False,
-            "message": "Puxa, tive um problema para me conectar à base de dados. Tente novamente.",
-            "articles": []
-        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return _search_error_payload(articles), status.HTTP_503_SERVICE_UNAVAILABLE
     
     if len(articles) > 0:
-        return Response({
+        return {
             "success": True,
             "message": f"Encontrei {len(articles)} artigos excelentes para você!",
             "articles": articles
-        }, status=status.HTTP_200_OK)
+        }, status.HTTP_200_OK
     else:
-        return Response({
+        return {
             "success": True,
             "message": "Puxa, não encontrei artigos com esses filtros.",
             "articles": []
-        }, status=status.HTTP_200_OK)
+        }, status.HTTP_200_OK
+
+def _buffered_search_payload(result, cursor=None):
+    if "error" in result:
+        if cursor and "Cursor" in result["error"]:
+            return {"success": False, "message": result["error"], "articles": []}, status.HTTP_400_BAD_REQUEST
+        return {**_search_error_payload(result), "next_cursor": None}, status.HTTP_503_SERVICE_UNAVAILABLE
+
+    payload, status_code = _search_payload(result['articles'])
+    payload["next_cursor"] = result['next_cursor']
+    return payload, status_code
+
+def _buffered_search_result(validated_data):
+    cursor = validated_data.get('cursor')
+    # Com cursor, a query já processada pelo Gemini vem dentro dele
+    keywords = None if cursor else extract_keywords_with_gemini(validated_data['query'])
+
+    result = search_articles_buffered(
+        query=keywords,
+        sort_by=validated_data['sort_by'],
+        year_from=validated_data.get('year_from'),
+        year_to=validated_data.get('year_to'),
+        is_open_access=validated_data['is_open_access'],
+        cursor=cursor
+    )
+    return _buffered_search_payload(result, cursor)
+
+
+# --- BUSCA EM LOTE ---
+
+@extend_schema(
+    summary="Busca Artigos em Lote",
+    description=(
+        "Recebe uma lista de consultas no formato de /search/ e as executa em paralelo "
+        "(consultas idênticas rodam uma única vez). Cada item de 'results' corresponde à "
+        "consulta de mesma posição e traz seus próprios artigos ou erro."
+    ),
+    request=SearchBatchSerializer,
+    responses={200: SearchBatchResponseSerializer}
+)
+@api_view(['POST'])
+def search_batch_view(request):
+    serializer = SearchBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    queries = [dict(query) for query in serializer.validated_data['queries']]
+    outcomes = run_search_batch(queries, _search_result)
+
+    results = []
+    for index, (query, outcome) in enumerate(zip(queries, outcomes)):
+        if "error" in outcome:
+            results.append({
+                "index": index,
+                "query": query.get('query'),
+                "status": status.HTTP_504_GATEWAY_TIMEOUT if outcome['timeout'] else status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "success": False,
+                "message": outcome['error'],
+                "articles": []
+            })
+            continue
+        payload, status_code = outcome['result']
+        results.append({"index": index, "query": query.get('query'), "status": status_code, **payload})
+
+    return Response({
+        "success": all(result['success'] for result in results),
+        "results": results
+    })
+
+
+# --- RESOLUÇÃO DE PDFs EM LOTE ---
+
+@extend_schema(
+    summary="Resolve PDFs de Artigos em Lote",
+    description=(
+        "Recebe ids do Semantic Scholar (ex: o 'paperId' de cada resultado da busca) e retorna a URL do "
+        "PDF em acesso aberto de cada um, em uma única chamada ao /paper/batch. Os resultados, inclusive "
+        "os artigos sem PDF, ficam em cache."
+    ),
+    request=PaperResolveInputSerializer,
+    responses={200: PaperResolveOutputSerializer, 400: {"description": "Erro de requisição."}}
+)
+@api_view(['POST'])
+def resolve_papers_view(request):
+    serializer = PaperResolveInputSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"pdf_urls": resolve_paper_pdf_urls(serializer.validated_data['paper_ids'])})
+
+
+# --- BUSCA ASSÍNCRONA (ASGI) ---
+
+@csrf_exempt
+@require_POST
+async def search_articles_async_view(request):
+    """
+    Mesmo contrato de POST /api/search/, mas sem bloquear o worker: o Gemini e o
+    Semantic Scholar são chamados de forma assíncrona. Feita para rodar sob
+    ASGI (ex: `uvicorn researchflow.asgi:application`).
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "JSON inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = SearchQuerySerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    validated_data = serializer.validated_data
+
+    cursor = validated_data.get('cursor')
+    if validated_data['buffered'] or cursor:
+        keywords = None if cursor else await extract_keywords_with_gemini_async(validated_data['query'])
+        result = await sync_to_async(search_articles_buffered, thread_sensitive=False)(
+            query=keywords,
+            sort_by=validated_data['sort_by'],
+            year_from=validated_data.get('year_from'),
+            year_to=validated_data.get('year_to'),
+            is_open_access=validated_data['is_open_access'],
+            cursor=cursor
+        )
+        payload, status_code = _buffered_search_payload(result, cursor)
+        return JsonResponse(payload, status=status_code, headers=_retry_after_headers(payload))
+
+    if validated_data['speculative']:
+        articles = await speculative_search_async(
+            validated_data['query'],
+            sort_by=validated_data['sort_by'],
+            year_from=validated_data.get('year_from'),
+            year_to=validated_data.get('year_to'),
+            offset=validated_data['offset'],
+            is_open_access=validated_data['is_open_access']
+        )
+        payload, status_code = _search_payload(articles)
+        return JsonResponse(payload, status=status_code, headers=_retry_after_headers(payload))
+
+    if validated_data['local_first']:
+        articles = await search_local_first_async(
+            validated_data['query'],
+            sort_by=validated_data['sort_by'],
+            year_from=validated_data.get('year_from'),
+            year_to=validated_data.get('year_to'),
+            offset=validated_data['offset'],
+            is_open_access=validated_data['is_open_access']
+        )
+        payload, status_code = _search_payload(articles)
+        return JsonResponse(payload, status=status_code, headers=_retry_after_headers(payload))
+
+    keywords = await extract_keywords_with_gemini_async(validated_data['query'])
+    articles = await search_articles_from_api_async(
+        query=keywords,
+        sort_by=validated_data['sort_by'],
+        year_from=validated_data.get('year_from'),
+        year_to=validated_data.get('year_to'),
+        offset=validated_data['offset'],
+        is_open_access=validated_data['is_open_access']
+    )
+    payload, status_code = _search_payload(articles)
+    return JsonResponse(payload, status=status_code, headers=_retry_after_headers(payload))
 
 
 # --- NOVAS ROTAS DE RESUMO E CHAT ---
 
+def _form_bool(value) -> bool:
+    """Interpreta booleanos vindos de FormData ('true', '1', 'on'...)."""
+    return str(value).strip().lower() in ('true', '1', 'on', 'yes')
+
+def _overloaded_response(result):
+    """503 com Retry-After para chamadas recusadas pelo limitador de taxa do Gemini."""
+    return Response(result, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(result['retry_after'])})
+
 # Helper para resposta de resumo
 def _handle_summarize_response(result):
     if "error" in result:
+        if "retry_after" in result:
+            return _overloaded_response(result)
         if "Falha ao ler" in result.get("error", "") or "Falha ao baixar" in result.get("error", ""):
              return Response(result, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
         return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -109,8 +362,9 @@ def summarize_article_json_view(request):
     input_val = serializer.validated_data['input_value']
     is_url_val = serializer.validated_data['is_url']
     query = serializer.validated_data.get('query')
+    chunked = serializer.validated_data['chunked']
     
-    result = summarize_article(input_val, input_type='url' if is_url_val else 'text', natural_language_query=query)
+    result = summarize_article(input_val, is_url=is_url_val, natural_language_query=query, chunked=chunked)
     
     return _handle_summarize_response(result)
 
@@ -119,7 +373,11 @@ def summarize_article_json_view(request):
     request={
         'multipart/form-data': {
             'type': 'object',
-            'properties': {'file': {'type': 'string', 'format': 'binary'}, 'query': {'type': 'string'}},
+            'properties': {
+                'file': {'type': 'string', 'format': 'binary'},
+                'query': {'type': 'string'},
+                'chunked': {'type': 'boolean'}
+            },
             'required': ['file']
         }
     },
@@ -141,8 +399,11 @@ def summarize_article_file_view(request):
          return Response(text_result, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
          
     # Agora chamamos a sumarização com o TEXTO extraído
-    from analyzer.services import summarize_article_with_gemini
-    result = summarize_article_with_gemini(text_result['text'], natural_language_query=query)
+    from analyzer.services import summarize_article_with_gemini, summarize_article_chunked
+    if _form_bool(request.data.get('chunked')):
+        result = summarize_article_chunked(text_result['text'], natural_language_query=query)
+    else:
+        result = summarize_article_with_gemini(text_result['text'], natural_language_query=query)
     
     return _handle_summarize_response(result)
 
@@ -192,9 +453,139 @@ def extract_text_file_view(request):
     return Response(result)
 
 
+# --- EXTRAÇÃO EM STREAMING (NDJSON) ---
+
+def _ndjson_response(events):
+    """Envia cada evento como uma linha JSON assim que ele é gerado."""
+    lines = (json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+    response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # evita buffer em proxies (nginx)
+    return response
+
+@extend_schema(
+    summary="[JSON] Extrair Texto em Streaming",
+    description=(
+        "Igual a /extract/json/, mas responde em NDJSON: uma linha por página "
+        "({'event': 'page', 'page', 'total_pages', 'text', 'chars'}) assim que ela é extraída, "
+        "e uma linha final {'event': 'done'} ou {'event': 'error'}."
+    ),
+    request=SummarizeJsonInputSerializer,
+    responses={200: {"description": "Stream application/x-ndjson."}}
+)
+@api_view(['POST'])
+def extract_text_stream_json_view(request):
+    serializer = SummarizeJsonInputSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return _ndjson_response(stream_text_events(
+        serializer.validated_data['input_value'],
+        is_url=serializer.validated_data['is_url']
+    ))
+
+@extend_schema(
+    summary="[UPLOAD] Extrair Texto de PDF em Streaming",
+    description="Igual a /extract/file/, mas responde em NDJSON com um evento por página.",
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {'file': {'type': 'string', 'format': 'binary'}},
+            'required': ['file']
+        }
+    },
+    responses={200: {"description": "Stream application/x-ndjson."}}
+)
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def extract_text_stream_file_view(request):
+    if 'file' not in request.data:
+        return Response({"error": "Arquivo não fornecido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return _ndjson_response(stream_text_events(file_obj=request.data['file']))
+
+
+# --- RESUMO EM LOTE (NDJSON) ---
+
+@extend_schema(
+    summary="[JSON] Resume Artigos em Lote",
+    description=(
+        "Resume vários artigos (URLs ou ids do Semantic Scholar) em paralelo e responde em NDJSON: "
+        "{'event': 'start'}, eventos {'event': 'progress', 'index', 'stage'} a cada etapa "
+        "('resolve', 'download', 'parse', 'summarize'), um {'event': 'result', 'index', 'summary'} ou "
+        "{'event': 'error', 'index', 'error'} assim que cada artigo termina, e {'event': 'done'} no fim."
+    ),
+    request=SummarizeBatchInputSerializer,
+    responses={200: {"description": "Stream application/x-ndjson."}}
+)
+@api_view(['POST'])
+@parser_classes([JSONParser])
+def summarize_batch_view(request):
+    serializer = SummarizeBatchInputSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return _ndjson_response(summarize_batch_events(
+        serializer.validated_data['items'],
+        natural_language_query=serializer.validated_data.get('query'),
+        chunked=serializer.validated_data['chunked']
+    ))
+
+
+# --- SESSÕES DE DOCUMENTO ---
+
+def _register_document_response(text_result):
+    if "error" in text_result:
+        return Response(text_result, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    result = register_document(text_result['text'])
+    if "error" in result:
+        return Response(result, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(result, status=status.HTTP_201_CREATED)
+
+@extend_schema(
+    summary="[JSON] Registrar Documento",
+    description="Registra o texto do artigo (texto puro ou URL do PDF) uma única vez e retorna um 'doc_id' para usar no chat.",
+    request=SummarizeJsonInputSerializer,
+    responses={201: DocumentOutputSerializer}
+)
+@api_view(['POST'])
+def register_document_json_view(request):
+    serializer = SummarizeJsonInputSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return _register_document_response(extract_text_content(
+        serializer.validated_data['input_value'],
+        is_url=serializer.validated_data['is_url']
+    ))
+
+@extend_schema(
+    summary="[UPLOAD] Registrar Documento PDF",
+    description="Registra o texto de um PDF enviado e retorna um 'doc_id' para usar no chat.",
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {'file': {'type': 'string', 'format': 'binary'}},
+            'required': ['file']
+        }
+    },
+    responses={201: DocumentOutputSerializer}
+)
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def register_document_file_view(request):
+    if 'file' not in request.data:
+        return Response({"error": "Arquivo não fornecido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return _register_document_response(extract_text_from_file_obj(request.data['file']))
+
+
 @extend_schema(
     summary="Chat com Contexto do Artigo",
-    description="Recebe o texto do artigo (contexto) e o histórico de mensagens, e retorna a resposta da IA.",
+    description=(
+        "Recebe o texto do artigo (contexto) ou o 'doc_id' de um documento registrado, "
+        "e o histórico de mensagens, e retorna a resposta da IA."
+    ),
     request=ChatInputSerializer,
     responses={200: ChatOutputSerializer}
 )
@@ -206,8 +597,14 @@ def chat_document_view(request):
     
     validated_data = serializer.validated_data
     
-    context = validated_data['context']
     messages = validated_data['messages']
+    if validated_data.get('doc_id'):
+        context = get_document(validated_data['doc_id'])
+        if context is None:
+            return Response({"error": "Documento não encontrado ou expirado. Registre-o novamente."},
+                            status=status.HTTP_404_NOT_FOUND)
+    else:
+        context = validated_data['context']
     
     # CORREÇÃO À PROVA DE FALHAS: Converte cada item para um dicionário Python nativo
     messages_list = [
@@ -217,16 +614,68 @@ def chat_document_view(request):
     
     result = chat_with_context(context, messages_list)
     
+    if "retry_after" in result:
+        return _overloaded_response(result)
     if "error" in result:
         return Response(result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     return Response(result)
+
+
+# --- CHAT EM STREAMING (SSE) ---
+
+async def _sse_events(events):
+    """Formata cada evento como Server-Sent Event (`event:` + `data:` JSON)."""
+    async for event in events:
+        yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@csrf_exempt
+@require_POST
+async def chat_stream_view(request):
+    """
+    Mesmo contrato de POST /api/chat/, mas a resposta chega em Server-Sent Events:
+    um evento 'token' por trecho gerado pelo Gemini e um evento final 'done' com
+    a resposta completa (ou 'error'). Feita para rodar sob ASGI, sem ocupar um
+    worker síncrono durante a geração.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "JSON inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ChatInputSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    validated_data = serializer.validated_data
+
+    if validated_data.get('doc_id'):
+        context = await sync_to_async(get_document, thread_sensitive=False)(validated_data['doc_id'])
+        if context is None:
+            return JsonResponse({"error": "Documento não encontrado ou expirado. Registre-o novamente."},
+                                status=status.HTTP_404_NOT_FOUND)
+    else:
+        context = validated_data['context']
+
+    messages_list = [
+        {"role": str(m['role']), "content": str(m['content'])}
+        for m in validated_data['messages']
+    ]
+    events = stream_chat_with_context(context, messages_list)
+    response = StreamingHttpResponse(_sse_events(events), content_type="text/event-stream")
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # evita buffer em proxies (nginx)
+    return response
+
 # --- ROTA DO FORMATADOR ---
 @extend_schema(
     summary="Formata Texto",
     request={
         'multipart/form-data': {
             'type': 'object',
-            'properties': {'file': {'type': 'string', 'format': 'binary'}, 'style': {'type': 'string'}},
+            'properties': {
+                'file': {'type': 'string', 'format': 'binary'},
+                'style': {'type': 'string'},
+                'sectioned': {'type': 'boolean'}
+            },
             'required': ['file']
         }
     },
@@ -243,16 +692,91 @@ def format_text_view(request):
     style = request.data.get('style')
     extracted_text = extract_text_from_file(uploaded_file)
     
-    # Agora esperamos o caminho do arquivo, não True/False
-    pdf_path = format_text_with_gemini(extracted_text, style, filename)
+    # O PDF é compilado em um sandbox temporário e volta em memória
+    try:
+        pdf_bytes = format_text_with_gemini(extracted_text, style, filename,
+                                            sectioned=serializer.validated_data['sectioned'])
+    except RateLimitExceeded as e:
+        return _overloaded_response(overloaded_error(e))
 
-    if pdf_path and os.path.exists(pdf_path):
-        pdf_file = open(pdf_path, 'rb')
-        
+    if pdf_bytes:
         # Retorna o arquivo para download
-        response = FileResponse(pdf_file, as_attachment=True, filename=f"{filename}_formatado.pdf")
+        response = FileResponse(io.BytesIO(pdf_bytes), as_attachment=True, filename=f"{filename}_formatado.pdf")
         return response
     else:
         return Response({"error": "Falha ao gerar o arquivo PDF."}, status=500)
-    
-    
\ No newline at end of file
+
+
+# --- JOBS DO FORMATADOR (EM SEGUNDO PLANO) ---
+
+def _format_job_payload(request, job):
+    download_url = None
+    if job['status'] == 'done':
+        download_url = request.build_absolute_uri(reverse('format_job_download', args=[job['job_id']]))
+    return {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "stage": job['stage'],
+        "error": job['error'],
+        "download_url": download_url,
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    }
+
+@extend_schema(
+    summary="Formata Texto em Segundo Plano",
+    description=(
+        "Igual a /format/, mas apenas enfileira a formatação e retorna um 'job_id' na hora. "
+        "Acompanhe em /format/jobs/{job_id}/ e baixe o PDF em /format/jobs/{job_id}/download/."
+    ),
+    request={
+        'multipart/form-data': {
+            'type': 'object',
+            'properties': {
+                'file': {'type': 'string', 'format': 'binary'},
+                'style': {'type': 'string'},
+                'sectioned': {'type': 'boolean'}
+            },
+            'required': ['file']
+        }
+    },
+    responses={202: FormatJobSerializer}
+)
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def format_job_create_view(request):
+    serializer = FormatTextSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    job = submit_job(request.data['file'], request.data.get('style'),
+                     sectioned=serializer.validated_data['sectioned'])
+    return Response(_format_job_payload(request, job), status=status.HTTP_202_ACCEPTED)
+
+@extend_schema(
+    summary="Status do Job de Formatação",
+    description="Retorna o status ('queued', 'running', 'done', 'error') e a etapa atual ('extract', 'llm', 'compile').",
+    responses={200: FormatJobSerializer}
+)
+@api_view(['GET'])
+def format_job_status_view(request, job_id):
+    job = get_job(job_id)
+    if job is None:
+        return Response({"error": "Job não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_format_job_payload(request, job))
+
+@extend_schema(
+    summary="Download do PDF do Job de Formatação",
+    responses={200: {"description": "Arquivo PDF."}}
+)
+@api_view(['GET'])
+def format_job_download_view(request, job_id):
+    job = get_job(job_id)
+    if job is None:
+        return Response({"error": "Job não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+    pdf_bytes = get_job_pdf(job_id) if job['status'] == 'done' else None
+    if pdf_bytes is None:
+        return Response({"error": "O PDF ainda não está pronto.", "status": job['status']},
+                        status=status.HTTP_409_CONFLICT)
+
+    filename = Path(job['upload_name']).stem
+    return FileResponse(io.BytesIO(pdf_bytes), as_attachment=True, filename=f"{filename}_formatado.pdf")
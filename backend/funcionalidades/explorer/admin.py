@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from explorer.models import Article
+
+
+@admin.register(Article)
+class ArticleAdmin(admin.ModelAdmin):
+    list_display = ('title', 'year', 'journal', 'citation_count', 'is_open_access')
+    list_filter = ('is_open_access',)
+    search_fields = ('title', 'paper_id')
@@ -0,0 +1,128 @@
+"""
+Índice local de artigos.
+
+Todo resultado que chega do Semantic Scholar é gravado no modelo `Article`
+(upsert pelo paperId), e a tabela FTS5 criada na migração indexa título,
+resumo, autores e periódico. A busca local responde direto do SQLite, com os
+mesmos filtros de ano e open access e no mesmo formato de artigo da API.
+
+O FTS5 só existe no SQLite: com outro banco, ou antes de rodar as migrações,
+a busca local devolve None e quem chamou segue para o Semantic Scholar.
+"""
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from django.db import DatabaseError, connection
+
+from explorer.models import Article
+from researchflow.text import tokenize
+
+# Mínimo de resultados locais para dispensar a chamada ao Semantic Scholar
+LOCAL_SEARCH_MIN_RESULTS = int(os.getenv("LOCAL_SEARCH_MIN_RESULTS", 10))
+
+UPDATE_FIELDS = ['title', 'abstract', 'authors', 'year', 'url', 'journal',
+                 'citation_count', 'is_open_access', 'updated_at']
+
+
+def upsert_articles(articles: List[dict]) -> int:
+    """Grava (ou atualiza) os artigos recebidos da API. Retorna quantos foram gravados."""
+    rows = {}
+    for article in articles or []:
+        paper_id = article.get('paperId')
+        if not paper_id or not article.get('title'):
+            continue
+        journal = article.get('journal')
+        rows[paper_id] = Article(
+            paper_id=paper_id,
+            title=article['title'],
+            abstract=article.get('abstract') or '',
+            authors=article.get('authors') or [],
+            year=article.get('year'),
+            url=article.get('url') or '',
+            journal='' if journal in (None, 'N/A') else journal,
+            citation_count=article.get('citationCount') or 0,
+            is_open_access=bool(article.get('isOpenAccess')),
+        )
+    if not rows:
+        return 0
+    try:
+        Article.objects.bulk_create(
+            rows.values(), update_conflicts=True, unique_fields=['paper_id'], update_fields=UPDATE_FIELDS
+        )
+    except DatabaseError as e:
+        # O índice local é um extra: falhar aqui nunca derruba a busca
+        print(f"Erro ao gravar artigos no índice local: {e}")
+        return 0
+    return len(rows)
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """Consulta FTS5 com todos os termos relevantes da query (entre aspas, sem operadores)."""
+    terms = list(dict.fromkeys(tokenize(query or '')))
+    if not terms:
+        return None
+    return ' AND '.join(f'"{term}"' for term in terms)
+
+
+def search_local(query: str, sort_by: str = 'default', year_from: int = None, year_to: int = None,
+                 is_open_access: bool = False, offset: int = 0, limit: int = 20) -> Optional[list]:
+    """
+    Busca no índice local. Retorna os artigos no formato de `_parse_search_results`
+    (só os que têm resumo), ou None se o índice local não estiver disponível.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    match = _match_expression(query)
+    if match is None:
+        return []
+
+    conditions = ["explorer_article_fts MATCH %s", "a.abstract != ''"]
+    params = [match]
+    # Mesmos limites de ano que _build_search_params aplica na API
+    if year_from and year_from > 1900:
+        conditions.append("a.year >= %s")
+        params.append(year_from)
+    if year_to and year_to <= datetime.now().year:
+        conditions.append("a.year <= %s")
+        params.append(year_to)
+    if is_open_access:
+        conditions.append("a.is_open_access")
+
+    if sort_by == 'recency':
+        order = "a.year DESC, a.citation_count DESC"
+    elif sort_by == 'relevance':
+        order = "a.citation_count DESC"
+    else:
+        # Título pesa mais que resumo, autores e periódico
+        order = "bm25(explorer_article_fts, 10.0, 1.0, 2.0, 1.0)"
+
+    sql = (
+        "SELECT a.paper_id, a.title, a.authors, a.year, a.url, a.abstract, a.citation_count,"
+        " a.journal, a.is_open_access"
+        " FROM explorer_article_fts JOIN explorer_article a ON a.id = explorer_article_fts.rowid"
+        f" WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT %s OFFSET %s"
+    )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit, offset])
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        print(f"Erro na busca local: {e}")
+        return None
+
+    return [
+        {
+            'paperId': paper_id,
+            'title': title,
+            'authors': json.loads(authors) if isinstance(authors, str) else authors,
+            'year': year,
+            'url': url,
+            'abstract': abstract,
+            'citationCount': citation_count,
+            'journal': journal or 'N/A',
+            'isOpenAccess': bool(open_access),
+        }
+        for paper_id, title, authors, year, url, abstract, citation_count, journal, open_access in rows
+    ]
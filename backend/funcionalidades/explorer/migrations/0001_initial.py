@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+# Índice FTS5 "external content": o texto fica só em explorer_article e os
+# triggers mantêm o índice em dia a cada insert/update/delete (inclusive upserts).
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE explorer_article_fts USING fts5(
+        title, abstract, authors, journal,
+        content='explorer_article', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER explorer_article_ai AFTER INSERT ON explorer_article BEGIN
+        INSERT INTO explorer_article_fts (rowid, title, abstract, authors, journal)
+        VALUES (new.id, new.title, new.abstract, new.authors, new.journal);
+    END
+    """,
+    """
+    CREATE TRIGGER explorer_article_ad AFTER DELETE ON explorer_article BEGIN
+        INSERT INTO explorer_article_fts (explorer_article_fts, rowid, title, abstract, authors, journal)
+        VALUES ('delete', old.id, old.title, old.abstract, old.authors, old.journal);
+    END
+    """,
+    """
+    CREATE TRIGGER explorer_article_au AFTER UPDATE ON explorer_article BEGIN
+        INSERT INTO explorer_article_fts (explorer_article_fts, rowid, title, abstract, authors, journal)
+        VALUES ('delete', old.id, old.title, old.abstract, old.authors, old.journal);
+        INSERT INTO explorer_article_fts (rowid, title, abstract, authors, journal)
+        VALUES (new.id, new.title, new.abstract, new.authors, new.journal);
+    END
+    """,
+]
+
+FTS_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS explorer_article_au",
+    "DROP TRIGGER IF EXISTS explorer_article_ad",
+    "DROP TRIGGER IF EXISTS explorer_article_ai",
+    "DROP TABLE IF EXISTS explorer_article_fts",
+]
+
+
+def create_fts_index(apps, schema_editor):
+    # FTS5 só existe no SQLite; em outros bancos a busca local fica desativada
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in FTS_DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Article',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_id', models.CharField(help_text='Id do artigo no Semantic Scholar.', max_length=64, unique=True)),
+                ('title', models.TextField()),
+                ('abstract', models.TextField(blank=True, default='')),
+                ('authors', models.JSONField(blank=True, default=list)),
+                ('year', models.IntegerField(blank=True, db_index=True, null=True)),
+                ('url', models.URLField(blank=True, default='', max_length=500)),
+                ('journal', models.CharField(blank=True, default='', max_length=500)),
+                ('citation_count', models.IntegerField(default=0)),
+                ('is_open_access', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -1,3 +1,22 @@
 from django.db import models
 
-# Create your models here.
+
+class Article(models.Model):
+    """
+    Artigo já recebido do Semantic Scholar. Cada resultado de busca é gravado
+    (ou atualizado) aqui, e a tabela FTS5 `explorer_article_fts`, mantida por
+    triggers, indexa título, resumo, autores e periódico para a busca local.
+    """
+    paper_id = models.CharField(max_length=64, unique=True, help_text="Id do artigo no Semantic Scholar.")
+    title = models.TextField()
+    abstract = models.TextField(blank=True, default='')
+    authors = models.JSONField(default=list, blank=True)
+    year = models.IntegerField(null=True, blank=True, db_index=True)
+    url = models.URLField(max_length=500, blank=True, default='')
+    journal = models.CharField(max_length=500, blank=True, default='')
+    citation_count = models.IntegerField(default=0)
+    is_open_access = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
@@ -1,10 +1,24 @@
 import os
 import json
+import asyncio
+import time
+import threading
+import hashlib
+import unicodedata
 import requests
+import httpx
 import google.generativeai as genai
 from dotenv import load_dotenv
 from pathlib import Path # Importe a biblioteca Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
+from typing import Any, Callable, List, Optional
+from asgiref.sync import sync_to_async
+from django.core import signing
+from researchflow.cache import SQLiteCache
+from researchflow import http_client, rate_limit
+from researchflow.rate_limit import RateLimitExceeded, overloaded_error
+from explorer.local_index import LOCAL_SEARCH_MIN_RESULTS, search_local, upsert_articles
 
 env_path = Path(__file__).resolve().parent.parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -13,8 +27,34 @@ load_dotenv(dotenv_path=env_path)
 # Configura a API do Google com a chave que está no .env
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def extract_keywords_with_gemini(natural_language_query: str) -> str:
-    prompt = f"""
+# Cache das super-queries do Gemini, compartilhado entre os workers.
+# Evita repetir a chamada ao LLM a cada troca de página ou busca repetida.
+KEYWORDS_CACHE = SQLiteCache(
+    "gemini_keywords",
+    ttl=int(os.getenv("KEYWORDS_CACHE_TTL", 7 * 24 * 3600)),
+    max_entries=int(os.getenv("KEYWORDS_CACHE_MAX_ENTRIES", 5000)),
+)
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza a consulta para uso como chave de cache: remove acentos,
+    ignora maiúsculas/minúsculas e colapsa espaços em branco.
+    """
+    folded = unicodedata.normalize('NFKD', query or '')
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return ' '.join(folded.casefold().split())
+
+def _cached_keywords(cache_key: str) -> Optional[str]:
+    cached = KEYWORDS_CACHE.get(cache_key)
+    if not cached:
+        return None
+    # Contabiliza quanto tempo de Gemini o cache economizou
+    KEYWORDS_CACHE.incr('saved_seconds', cached.get('latency', 0))
+    print(f"Termos de busca obtidos do cache: '{cached['keywords']}'")
+    return cached['keywords']
+
+def _build_keywords_prompt(natural_language_query: str) -> str:
+    return f"""
     Você é um assistente de pesquisa especialista em otimizar buscas para o Semantic Scholar. Sua única tarefa é converter a consulta do usuário nos melhores e mais eficazes termos de busca.
 
     Siga estas regras estritamente:
@@ -40,37 +80,94 @@ def extract_keywords_with_gemini(natural_language_query: str) -> str:
     **Consulta do Usuário:** "{natural_language_query}"
     **Sua Saída:**
     """
+
+def _parse_keywords_response(response_text: str) -> str:
+    cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
+    data = json.loads(cleaned_text)
+    return data['keywords']
+
+def extract_keywords_with_gemini(natural_language_query: str) -> str:
+    cache_key = normalize_query(natural_language_query)
+    cached = _cached_keywords(cache_key)
+    if cached:
+        return cached
+
+    prompt = _build_keywords_prompt(natural_language_query)
     try:
+        started = time.monotonic()
+        rate_limit.acquire("gemini")
         model = genai.GenerativeModel('gemini-2.5-flash') 
         response = model.generate_content(prompt)
-        cleaned_text = response.text.strip().replace('```json', '').replace('```', '')
-        data = json.loads(cleaned_text)
-        keywords = data['keywords']
+        keywords = _parse_keywords_response(response.text)
+        # Só guarda respostas válidas; o fallback nunca entra no cache
+        KEYWORDS_CACHE.set(cache_key, {'keywords': keywords, 'latency': time.monotonic() - started})
         print(f"Termos de busca AVANÇADOS (PT+EN+Filtros) otimizados pelo Gemini: '{keywords}'")
         return keywords
     except (json.JSONDecodeError, KeyError, Exception) as e:
         print(f"Erro ao processar resposta do Gemini: {e}. Usando fallback.")
         return natural_language_query # Fallback para a query original
 
-def search_articles_from_api(query: str, sort_by: str, year_from: int = None, year_to: int = None, offset: int = 0, is_open_access: bool = False):
-    """
-    Busca artigos com filtros avançados de ordenação, ano, open access e paginação.
-    """
-    print(f"--- INICIANDO BUSCA AVANÇADA ---")
-    print(f"Query: '{query}', Sort: '{sort_by}', Ano: {year_from}-{year_to}, Offset: {offset}, OpenAccess: {is_open_access}")
-    
-    base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
-    api_key = os.getenv("SEMANTIC_API_KEY")
-    if not api_key:
-        return {"error": "Chave da API do Semantic Scholar não configurada."}
+async def extract_keywords_with_gemini_async(natural_language_query: str) -> str:
+    """Versão assíncrona de extract_keywords_with_gemini (mesmo cache e fallback)."""
+    cache_key = normalize_query(natural_language_query)
+    cached = await asyncio.to_thread(_cached_keywords, cache_key)
+    if cached:
+        return cached
 
-    headers = { 'x-api-key': api_key }
-    
+    prompt = _build_keywords_prompt(natural_language_query)
+    try:
+        started = time.monotonic()
+        await rate_limit.acquire_async("gemini")
+        model = genai.GenerativeModel('gemini-2.5-flash')
+        response = await model.generate_content_async(prompt)
+        keywords = _parse_keywords_response(response.text)
+        await asyncio.to_thread(
+            KEYWORDS_CACHE.set, cache_key, {'keywords': keywords, 'latency': time.monotonic() - started}
+        )
+        print(f"Termos de busca AVANÇADOS (PT+EN+Filtros) otimizados pelo Gemini: '{keywords}'")
+        return keywords
+    except (json.JSONDecodeError, KeyError, Exception) as e:
+        print(f"Erro ao processar resposta do Gemini: {e}. Usando fallback.")
+        return natural_language_query
+
+SEMANTIC_SEARCH_URL = "https://api.semanticscholar.org/graph/v1/paper/search"
+# Busca recusada pelo limitador de taxa do Semantic Scholar (vira 503 com Retry-After)
+SEARCH_OVERLOADED_MESSAGE = "Base de dados de artigos sobrecarregada. Tente novamente em instantes."
+SEMANTIC_SEARCH_FIELDS = 'paperId,title,authors,year,url,abstract,citationCount,journal,isOpenAccess'
+
+# Paginação com buffer: um bloco grande por chamada ao Semantic Scholar,
+# servido em páginas de tamanho fixo a partir do servidor.
+SEARCH_PAGE_SIZE = 20
+SEARCH_BUFFER_SIZE = 100  # limite máximo de itens por chamada da API
+SEMANTIC_MAX_WINDOW = 1000  # a API não pagina além de offset + limit = 1000
+SEARCH_BUFFERS = SQLiteCache(
+    "search_buffers",
+    ttl=int(os.getenv("SEARCH_BUFFER_TTL", 15 * 60)),
+    max_entries=int(os.getenv("SEARCH_BUFFER_MAX_ENTRIES", 2000)),
+)
+CURSOR_SALT = "explorer.search_cursor"
+
+# Busca especulativa: prazo (segundos) para a busca expandida pelo Gemini
+SPECULATIVE_SEARCH_DEADLINE = float(os.getenv("SPECULATIVE_SEARCH_DEADLINE", 6))
+# Pool só das buscas expandidas (a bruta roda na thread da requisição). Uma
+# expansão que passou do prazo continua ocupando sua vaga até terminar, então,
+# com todas as vagas ocupadas, novas expansões são descartadas em vez de
+# enfileiradas: a busca especulativa nunca fica mais lenta que a simples.
+SPECULATIVE_SEARCH_WORKERS = int(os.getenv("SPECULATIVE_SEARCH_WORKERS", 16))
+_EXPANSION_POOL = ThreadPoolExecutor(
+    max_workers=SPECULATIVE_SEARCH_WORKERS,
+    thread_name_prefix="speculative-expansion"
+)
+_expansion_slots = threading.BoundedSemaphore(SPECULATIVE_SEARCH_WORKERS)
+_background_tasks = set()
+
+def _build_search_params(query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                         offset: int = 0, is_open_access: bool = False, limit: int = 20) -> dict:
     params = {
         'query': query,
-        'limit': 20, # O limite de resultados por página
+        'limit': limit, # O limite de resultados por página
         'offset': offset, # O ponto de início da paginação
-        'fields': 'title,authors,year,url,abstract,citationCount,journal'
+        'fields': SEMANTIC_SEARCH_FIELDS
     }
 
     # --- LÓGICA DE FILTROS DINÂMICOS ---
@@ -101,38 +198,382 @@ def search_articles_from_api(query: str, sort_by: str, year_from: int = None, ye
         params['openAccessPdf'] = 'true'
         print("Filtro aplicado: Apenas Open Access")
 
+    return params
+
+def _parse_search_results(data: dict) -> list:
+    results = []
+    articles_data = data.get('data', [])
+    print(f"Total de artigos brutos recebidos da API: {len(articles_data)}")
+
+    for item in articles_data:
+        if not item.get('abstract'):
+            continue
+        
+        journal_info = item.get('journal')
+        journal_name = journal_info.get('name', 'N/A') if journal_info else 'N/A'
+        results.append({
+            'paperId': item.get('paperId'),
+            'title': item.get('title'),
+            'authors': [author['name'] for author in item.get('authors', [])],
+            'year': item.get('year'),
+            'url': item.get('url'),
+            'abstract': item.get('abstract'),
+            'citationCount': item.get('citationCount', 0),
+            'journal': journal_name,
+            'isOpenAccess': bool(item.get('isOpenAccess'))
+        })
+    return results
+
+def search_articles_from_api(query: str, sort_by: str, year_from: int = None, year_to: int = None, offset: int = 0, is_open_access: bool = False):
+    """
+    Busca artigos com filtros avançados de ordenação, ano, open access e paginação.
+    """
+    print(f"--- INICIANDO BUSCA AVANÇADA ---")
+    print(f"Query: '{query}', Sort: '{sort_by}', Ano: {year_from}-{year_to}, Offset: {offset}, OpenAccess: {is_open_access}")
+    
+    api_key = os.getenv("SEMANTIC_API_KEY")
+    if not api_key:
+        return {"error": "Chave da API do Semantic Scholar não configurada."}
+
+    headers = { 'x-api-key': api_key }
+    params = _build_search_params(query, sort_by, year_from, year_to, offset, is_open_access)
+
     try:
-        response = requests.get(base_url, params=params, headers=headers, timeout=15)
+        response = http_client.get(SEMANTIC_SEARCH_URL, params=params, headers=headers, timeout=15)
         response.raise_for_status()
         
-        data = response.json()
-        
-        results = []
-        articles_data = data.get('data', [])
-        print(f"Total de artigos brutos recebidos da API: {len(articles_data)}")
-
-        if articles_data:
-            for item in articles_data:
-                if not item.get('abstract'):
-                    continue
-                
-                journal_info = item.get('journal')
-                journal_name = journal_info.get('name', 'N/A') if journal_info else 'N/A'
-                results.append({
-                    'title': item.get('title'),
-                    'authors': [author['name'] for author in item.get('authors', [])],
-                    'year': item.get('year'),
-                    'url': item.get('url'),
-                    'abstract': item.get('abstract'),
-                    'citationCount': item.get('citationCount', 0),
-                    'journal': journal_name
-                })
-        
+        results = _parse_search_results(response.json())
         print(f"Total de artigos com resumo: {len(results)}. Retornando TODOS.")
+        upsert_articles(results)
         
         # Retorna todos os resultados encontrados (até o limite de 25)
         return results
 
     except requests.exceptions.RequestException as e:
         print(f"Erro ao chamar a API do Semantic Scholar: {e}")
-        return {"error": "Falha ao se comunicar com a base de dados de artigos."}
\ No newline at end of file
+        return {"error": "Falha ao se comunicar com a base de dados de artigos."}
+    except RateLimitExceeded as e:
+        print(f"Busca recusada pelo limitador de taxa: {e}")
+        return overloaded_error(e, SEARCH_OVERLOADED_MESSAGE)
+
+async def search_articles_from_api_async(query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                                        offset: int = 0, is_open_access: bool = False):
+    """
+    Versão assíncrona de search_articles_from_api: mesmos filtros e mesmo
+    formato de retorno, sem bloquear o worker durante a chamada à API.
+    """
+    print(f"--- INICIANDO BUSCA AVANÇADA (ASYNC) ---")
+    print(f"Query: '{query}', Sort: '{sort_by}', Ano: {year_from}-{year_to}, Offset: {offset}, OpenAccess: {is_open_access}")
+
+    api_key = os.getenv("SEMANTIC_API_KEY")
+    if not api_key:
+        return {"error": "Chave da API do Semantic Scholar não configurada."}
+
+    params = _build_search_params(query, sort_by, year_from, year_to, offset, is_open_access)
+    try:
+        response = await http_client.async_get(SEMANTIC_SEARCH_URL, params=params,
+                                               headers={'x-api-key': api_key}, timeout=15)
+        response.raise_for_status()
+        results = _parse_search_results(response.json())
+        print(f"Total de artigos com resumo: {len(results)}. Retornando TODOS.")
+        await sync_to_async(upsert_articles, thread_sensitive=False)(results)
+        return results
+    except (httpx.HTTPError, ValueError) as e:  # ValueError: corpo que não é JSON
+        print(f"Erro ao chamar a API do Semantic Scholar: {e}")
+        return {"error": "Falha ao se comunicar com a base de dados de artigos."}
+    except RateLimitExceeded as e:
+        print(f"Busca recusada pelo limitador de taxa: {e}")
+        return overloaded_error(e, SEARCH_OVERLOADED_MESSAGE)
+
+def _enough_local_results(articles) -> bool:
+    return articles is not None and len(articles) >= LOCAL_SEARCH_MIN_RESULTS
+
+# Fonte escolhida (índice local ou Semantic Scholar) por query + filtros. A
+# escolha é feita na primeira página e vale para todas as seguintes: o índice e
+# a API (consultada com a query expandida pelo Gemini) ordenam os artigos de
+# formas diferentes, e misturar as duas na paginação repetiria ou pularia artigos.
+LOCAL_SEARCH_SOURCES = SQLiteCache(
+    "local_search_sources",
+    ttl=int(os.getenv("LOCAL_SEARCH_SOURCE_TTL", 60 * 60)),
+    max_entries=int(os.getenv("LOCAL_SEARCH_SOURCE_MAX_ENTRIES", 10000)),
+)
+
+def _local_first_page(natural_query: str, filters: dict) -> Optional[list]:
+    """
+    Artigos do índice local para a página pedida, ou None se esta busca é
+    respondida pelo Semantic Scholar.
+    """
+    source_key = hashlib.sha256(json.dumps([
+        normalize_query(natural_query), filters['sort_by'], filters['year_from'],
+        filters['year_to'], filters['is_open_access']
+    ]).encode('utf-8')).hexdigest()
+    source = LOCAL_SEARCH_SOURCES.get(source_key)
+    if source is None:
+        first_page = search_local(natural_query, **{**filters, 'offset': 0})
+        source = 'local' if _enough_local_results(first_page) else 'api'
+        LOCAL_SEARCH_SOURCES.set(source_key, source)
+        if source == 'api':
+            print(f"Busca local insuficiente ({len(first_page or [])} artigos). Consultando o Semantic Scholar...")
+        elif filters['offset'] == 0:
+            print(f"Busca local: {len(first_page)} artigos encontrados no índice. Dispensando o Semantic Scholar.")
+            return first_page
+    if source == 'api':
+        return None
+    # Páginas seguintes de uma busca local continuam no índice, mesmo que venham vazias
+    return search_local(natural_query, **filters) or []
+
+def search_local_first(natural_query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                       offset: int = 0, is_open_access: bool = False):
+    """
+    Responde do índice local quando ele tem ao menos LOCAL_SEARCH_MIN_RESULTS
+    artigos para a query (sem chamar o Gemini nem o Semantic Scholar); senão,
+    faz a busca normal, cujos resultados também alimentam o índice. A fonte
+    decidida na primeira página vale para toda a paginação da mesma busca.
+    """
+    filters = dict(sort_by=sort_by, year_from=year_from, year_to=year_to,
+                   offset=offset, is_open_access=is_open_access)
+    local = _local_first_page(natural_query, filters)
+    if local is not None:
+        return local
+    return search_articles_from_api(query=extract_keywords_with_gemini(natural_query), **filters)
+
+async def search_local_first_async(natural_query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                                   offset: int = 0, is_open_access: bool = False):
+    """Versão assíncrona de search_local_first."""
+    filters = dict(sort_by=sort_by, year_from=year_from, year_to=year_to,
+                   offset=offset, is_open_access=is_open_access)
+    local = await sync_to_async(_local_first_page, thread_sensitive=False)(natural_query, filters)
+    if local is not None:
+        return local
+    keywords = await extract_keywords_with_gemini_async(natural_query)
+    return await search_articles_from_api_async(query=keywords, **filters)
+
+def merge_article_lists(*article_lists) -> list:
+    """
+    Junta listas de artigos mantendo a ordem de chegada e removendo
+    duplicados (pela URL do Semantic Scholar ou, na falta dela, pelo título).
+    """
+    merged = []
+    seen = set()
+    for articles in article_lists:
+        for article in articles or []:
+            key = article.get('url') or normalize_query(article.get('title') or '')
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(article)
+    return merged
+
+def _pick_speculative_results(raw, expanded):
+    raw_ok = raw is not None and "error" not in raw
+    expanded_ok = expanded is not None and "error" not in expanded
+    if expanded_ok and raw_ok:
+        # Resultados da query expandida primeiro: são os mais precisos
+        return merge_article_lists(expanded, raw)
+    if expanded_ok:
+        return expanded
+    return raw
+
+def _expanded_search(natural_query: str, filters: dict):
+    keywords = extract_keywords_with_gemini(natural_query)
+    if normalize_query(keywords) == normalize_query(natural_query):
+        return None  # Fallback do Gemini: a busca bruta já cobre essa query
+    return search_articles_from_api(query=keywords, **filters)
+
+def _run_expansion(natural_query: str, filters: dict):
+    try:
+        return _expanded_search(natural_query, filters)
+    finally:
+        _expansion_slots.release()
+
+def _submit_expansion(natural_query: str, filters: dict):
+    """Agenda a busca expandida se houver vaga no pool; senão retorna None."""
+    if not _expansion_slots.acquire(blocking=False):
+        print("Pool de buscas expandidas cheio. Seguindo só com a busca bruta.")
+        return None
+    try:
+        return _EXPANSION_POOL.submit(_run_expansion, natural_query, filters)
+    except RuntimeError:
+        _expansion_slots.release()
+        raise
+
+def speculative_search(natural_query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                       offset: int = 0, is_open_access: bool = False, deadline: float = None):
+    """
+    Busca especulativa: dispara a busca com a query bruta do usuário enquanto o
+    Gemini expande a consulta; a busca expandida roda em seguida e os dois
+    resultados são mesclados sem duplicados. Se a busca expandida não terminar
+    em `deadline` segundos (contados do início), devolve só a busca bruta.
+    """
+    deadline = SPECULATIVE_SEARCH_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    filters = dict(sort_by=sort_by, year_from=year_from, year_to=year_to,
+                   offset=offset, is_open_access=is_open_access)
+
+    expanded_future = _submit_expansion(natural_query, filters)
+    raw = search_articles_from_api(natural_query, **filters)
+    if expanded_future is None:
+        return raw
+    if "error" in raw:
+        # Sem resultado bruto não há o que devolver antes: espera a expandida
+        return _pick_speculative_results(raw, expanded_future.result())
+    try:
+        expanded = expanded_future.result(timeout=max(0, deadline - (time.monotonic() - started)))
+    except FutureTimeoutError:
+        # A busca expandida segue em segundo plano e ao menos aquece o cache de keywords
+        print(f"Busca expandida passou do prazo de {deadline}s. Retornando apenas a busca bruta.")
+        expanded = None
+    return _pick_speculative_results(raw, expanded)
+
+async def _expanded_search_async(natural_query: str, filters: dict):
+    keywords = await extract_keywords_with_gemini_async(natural_query)
+    if normalize_query(keywords) == normalize_query(natural_query):
+        return None
+    return await search_articles_from_api_async(query=keywords, **filters)
+
+async def speculative_search_async(natural_query: str, sort_by: str, year_from: int = None, year_to: int = None,
+                                   offset: int = 0, is_open_access: bool = False, deadline: float = None):
+    """Versão assíncrona de speculative_search."""
+    deadline = SPECULATIVE_SEARCH_DEADLINE if deadline is None else deadline
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    filters = dict(sort_by=sort_by, year_from=year_from, year_to=year_to,
+                   offset=offset, is_open_access=is_open_access)
+
+    expanded_task = asyncio.create_task(_expanded_search_async(natural_query, filters))
+    raw = await search_articles_from_api_async(natural_query, **filters)
+    if "error" in raw:
+        return _pick_speculative_results(raw, await expanded_task)
+
+    done, _ = await asyncio.wait({expanded_task}, timeout=max(0, deadline - (loop.time() - started)))
+    if expanded_task not in done:
+        print(f"Busca expandida passou do prazo de {deadline}s. Retornando apenas a busca bruta.")
+        # Não cancela: a tarefa termina em segundo plano e aquece o cache de keywords
+        _background_tasks.add(expanded_task)
+        expanded_task.add_done_callback(_background_tasks.discard)
+        return _pick_speculative_results(raw, None)
+    return _pick_speculative_results(raw, expanded_task.result())
+
+def _fetch_search_block(state: dict, offset: int) -> dict:
+    """
+    Retorna um bloco de até SEARCH_BUFFER_SIZE resultados (já filtrados) a
+    partir de `offset`, usando o buffer do servidor quando disponível.
+    """
+    buffer_key = hashlib.sha256(json.dumps(
+        [state['q'], state['s'], state['yf'], state['yt'], state['oa'], offset]
+    ).encode('utf-8')).hexdigest()
+    block = SEARCH_BUFFERS.get(buffer_key)
+    if block is not None:
+        return block
+
+    api_key = os.getenv("SEMANTIC_API_KEY")
+    if not api_key:
+        return {"error": "Chave da API do Semantic Scholar não configurada."}
+
+    limit = min(SEARCH_BUFFER_SIZE, SEMANTIC_MAX_WINDOW - offset)
+    params = _build_search_params(state['q'], state['s'], state['yf'], state['yt'], offset, state['oa'], limit=limit)
+    try:
+        response = http_client.get(SEMANTIC_SEARCH_URL, params=params, headers={'x-api-key': api_key}, timeout=15)
+        response.raise_for_status()
+        data = response.json()
+    except requests.exceptions.RequestException as e:
+        print(f"Erro ao chamar a API do Semantic Scholar: {e}")
+        return {"error": "Falha ao se comunicar com a base de dados de artigos."}
+    except RateLimitExceeded as e:
+        print(f"Busca recusada pelo limitador de taxa: {e}")
+        return overloaded_error(e, SEARCH_OVERLOADED_MESSAGE)
+
+    next_offset = data.get('next')
+    if next_offset is not None and next_offset >= SEMANTIC_MAX_WINDOW:
+        next_offset = None
+    block = {'articles': _parse_search_results(data), 'next_offset': next_offset}
+    upsert_articles(block['articles'])
+    SEARCH_BUFFERS.set(buffer_key, block)
+    return block
+
+def search_articles_buffered(query: str = None, sort_by: str = 'default', year_from: int = None, year_to: int = None,
+                             is_open_access: bool = False, cursor: str = None, page_size: int = SEARCH_PAGE_SIZE) -> dict:
+    """
+    Paginação por cursor: busca blocos grandes no Semantic Scholar, guarda os
+    resultados filtrados no servidor e devolve páginas de tamanho fixo.
+
+    Sem `cursor`, começa uma nova busca com os filtros recebidos. Com `cursor`,
+    os filtros e a query são lidos do próprio cursor (os demais argumentos são
+    ignorados). Retorna {"articles": [...], "next_cursor": str | None}.
+    """
+    if cursor:
+        try:
+            state = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return {"error": "Cursor de paginação inválido."}
+    else:
+        state = {'q': query, 's': sort_by, 'yf': year_from, 'yt': year_to, 'oa': bool(is_open_access), 'o': 0, 'p': 0}
+
+    print(f"--- BUSCA COM BUFFER --- Query: '{state['q']}', Offset: {state['o']}, Posição: {state['p']}")
+    articles = []
+    offset, position = state['o'], state['p']
+    exhausted = False
+    while len(articles) < page_size:
+        block = _fetch_search_block(state, offset)
+        if "error" in block:
+            if not articles:
+                return block
+            break
+        page = block['articles'][position:position + page_size - len(articles)]
+        articles.extend(page)
+        position += len(page)
+        if position >= len(block['articles']):
+            if block['next_offset'] is None:
+                exhausted = True
+                break
+            offset, position = block['next_offset'], 0
+
+    next_cursor = None
+    if not exhausted:
+        next_cursor = signing.dumps({**state, 'o': offset, 'p': position}, salt=CURSOR_SALT, compress=True)
+    return {"articles": articles, "next_cursor": next_cursor}
+
+# --- Busca em lote ---
+
+# Um único pool para todos os lotes limita quantas buscas rodam ao mesmo tempo
+# no processo, não importa quantos lotes cheguem juntos.
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", 50))
+SEARCH_BATCH_QUERY_TIMEOUT = float(os.getenv("SEARCH_BATCH_QUERY_TIMEOUT", 30))
+_BATCH_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SEARCH_BATCH_CONCURRENCY", 8)),
+    thread_name_prefix="search-batch"
+)
+
+def batch_query_key(params: dict) -> str:
+    """Consultas com a mesma query normalizada e os mesmos filtros geram a mesma chave."""
+    normalized = {**params, 'query': normalize_query(params.get('query') or '')}
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+def run_search_batch(queries: List[dict], search_fn: Callable[[dict], Any],
+                     timeout: float = None) -> List[dict]:
+    """
+    Executa `search_fn` para cada consulta no pool compartilhado, uma única vez
+    por consulta distinta. Retorna, na ordem recebida, {"result": ...} ou
+    {"error": ..., "timeout": bool} para cada consulta: uma falha ou estouro de tempo afeta só
+    a própria consulta. O prazo conta a partir do início do lote.
+    """
+    timeout = SEARCH_BATCH_QUERY_TIMEOUT if timeout is None else timeout
+    keys = [batch_query_key(params) for params in queries]
+    futures = {}
+    for key, params in zip(keys, queries):
+        if key not in futures:
+            futures[key] = _BATCH_POOL.submit(search_fn, params)
+    print(f"--- BUSCA EM LOTE --- {len(queries)} consultas, {len(futures)} distintas")
+
+    deadline = time.monotonic() + timeout
+    outcomes = {}
+    for key, future in futures.items():
+        try:
+            outcomes[key] = {"result": future.result(timeout=max(0, deadline - time.monotonic()))}
+        except FutureTimeoutError:
+            future.cancel()
+            outcomes[key] = {"error": f"A consulta excedeu o tempo limite de {timeout:g}s.", "timeout": True}
+        except Exception as e:
+            print(f"Erro em consulta do lote: {e}")
+            outcomes[key] = {"error": str(e), "timeout": False}
+    return [outcomes[key] for key in keys]
@@ -1,3 +1,243 @@
-from django.test import TestCase
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core import signing
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from explorer import local_index, services
+from explorer.models import Article
+
+
+def use_temp_cache(testcase, cache):
+    """Aponta um SQLiteCache para um arquivo temporário durante o teste."""
+    tmp = tempfile.TemporaryDirectory()
+    testcase.addCleanup(tmp.cleanup)
+    for patcher in (mock.patch.object(cache, 'path', Path(tmp.name) / f"{cache.name}.sqlite3"),
+                    mock.patch.object(cache, '_ready', False)):
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+
+
+def api_block(start, count, next_offset, without_abstract=()):
+    """Resposta do /paper/search com `count` artigos a partir de `start`."""
+    return {
+        'data': [
+            {'paperId': f'p{i}', 'title': f'Artigo {i}', 'abstract': '' if i in without_abstract else 'resumo',
+             'authors': [], 'year': 2020}
+            for i in range(start, start + count)
+        ],
+        'next': next_offset,
+    }
+
+
+class BufferedSearchTests(SimpleTestCase):
+    """Paginação por cursor assinado sobre blocos guardados no servidor."""
+
+    def setUp(self):
+        use_temp_cache(self, services.SEARCH_BUFFERS)
+        for patcher in (
+            mock.patch.object(services, 'upsert_articles'),
+            mock.patch.dict(os.environ, {'SEMANTIC_API_KEY': 'teste'}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def mock_api(self, *blocks):
+        responses = []
+        for block in blocks:
+            resp = mock.Mock()
+            resp.json.return_value = block
+            responses.append(resp)
+        patcher = mock.patch.object(services.http_client, 'get', side_effect=responses)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def ids(self, result):
+        return [article['paperId'] for article in result['articles']]
+
+    def test_cursor_is_signed_and_carries_the_position(self):
+        self.mock_api(api_block(0, 5, next_offset=5))
+        first = services.search_articles_buffered('grafos', page_size=2)
+        self.assertEqual(self.ids(first), ['p0', 'p1'])
+
+        state = signing.loads(first['next_cursor'], salt=services.CURSOR_SALT)
+        self.assertEqual((state['q'], state['o'], state['p']), ('grafos', 0, 2))
+
+    def test_pages_come_from_the_buffer_without_calling_the_api_again(self):
+        api = self.mock_api(api_block(0, 5, next_offset=None))
+        first = services.search_articles_buffered('grafos', page_size=2)
+        second = services.search_articles_buffered(cursor=first['next_cursor'], page_size=2)
+        third = services.search_articles_buffered(cursor=second['next_cursor'], page_size=2)
+
+        self.assertEqual(self.ids(second), ['p2', 'p3'])
+        self.assertEqual(self.ids(third), ['p4'])
+        self.assertIsNone(third['next_cursor'])
+        self.assertEqual(api.call_count, 1)
+
+    def test_page_spanning_two_blocks_refills_from_the_next_offset(self):
+        # Artigos sem resumo são filtrados: o bloco rende menos do que o pedido
+        api = self.mock_api(api_block(0, 3, next_offset=3, without_abstract={1}),
+                            api_block(3, 3, next_offset=None))
+        result = services.search_articles_buffered('grafos', page_size=4)
+
+        self.assertEqual(self.ids(result), ['p0', 'p2', 'p3', 'p4'])
+        self.assertEqual(api.call_args.kwargs['params']['offset'], 3)
+        state = signing.loads(result['next_cursor'], salt=services.CURSOR_SALT)
+        self.assertEqual((state['o'], state['p']), (3, 2))
+
+    def test_tampered_cursor_is_rejected(self):
+        self.mock_api(api_block(0, 5, next_offset=5))
+        cursor = services.search_articles_buffered('grafos', page_size=2)['next_cursor']
+        self.assertEqual(services.search_articles_buffered(cursor=cursor[:-2] + 'xx'),
+                         {"error": "Cursor de paginação inválido."})
+
+
+def api_article(paper_id, title, abstract='resumo', year=2020, citations=0, open_access=True, authors=(), journal=None):
+    """Artigo no formato de `_parse_search_results`."""
+    return {'paperId': paper_id, 'title': title, 'abstract': abstract, 'authors': list(authors), 'year': year,
+            'url': f'https://exemplo.org/{paper_id}', 'citationCount': citations,
+            'journal': journal or 'N/A', 'isOpenAccess': open_access}
+
+
+def fts_rowids(term):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT rowid FROM explorer_article_fts WHERE explorer_article_fts MATCH %s", [term])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class LocalIndexTests(TestCase):
+    """Upsert no modelo Article e busca FTS5 do índice local."""
+
+    def ids(self, articles):
+        return [article['paperId'] for article in articles]
+
+    def test_upsert_updates_existing_articles_and_the_fts_index(self):
+        self.assertEqual(local_index.upsert_articles([api_article('p1', 'Redes neurais')]), 1)
+        local_index.upsert_articles([api_article('p1', 'Grafos de conhecimento', citations=7)])
+
+        article = Article.objects.get(paper_id='p1')
+        self.assertEqual((article.title, article.citation_count), ('Grafos de conhecimento', 7))
+        self.assertEqual(Article.objects.count(), 1)
+        # Trigger de update: o título antigo sai do índice e o novo entra
+        self.assertEqual(fts_rowids('neurais'), [])
+        self.assertEqual(fts_rowids('grafos'), [article.id])
+
+    def test_upsert_skips_invalid_articles_and_normalizes_fields(self):
+        written = local_index.upsert_articles([
+            api_article(None, 'Sem id'), api_article('p2', ''), api_article('p3', 'Válido', abstract=None),
+        ])
+        self.assertEqual(written, 1)
+        article = Article.objects.get(paper_id='p3')
+        self.assertEqual((article.abstract, article.journal), ('', ''))
+
+    def test_deleted_articles_leave_the_fts_index(self):
+        local_index.upsert_articles([api_article('p1', 'Grafos')])
+        Article.objects.all().delete()
+        self.assertEqual(fts_rowids('grafos'), [])
+
+    def test_search_matches_all_terms_without_accents_and_skips_empty_abstracts(self):
+        local_index.upsert_articles([
+            api_article('p1', 'Otimização de grafos'),
+            api_article('p2', 'Otimização convexa'),
+            api_article('p3', 'Grafos e otimização', abstract=''),
+        ])
+        self.assertEqual(self.ids(local_index.search_local('otimizacao grafos')), ['p1'])
+        self.assertEqual(local_index.search_local('de a o'), [])
+
+    def test_filters_by_year_and_open_access(self):
+        local_index.upsert_articles([
+            api_article('p1', 'Grafos', year=2010),
+            api_article('p2', 'Grafos', year=2020),
+            api_article('p3', 'Grafos', year=2021, open_access=False),
+        ])
+        self.assertEqual(set(self.ids(local_index.search_local('grafos', year_from=2015))), {'p2', 'p3'})
+        self.assertEqual(self.ids(local_index.search_local('grafos', year_to=2015)), ['p1'])
+        self.assertEqual(set(self.ids(local_index.search_local('grafos', is_open_access=True))), {'p1', 'p2'})
+
+    def test_default_order_is_bm25_with_title_weighted_over_abstract(self):
+        local_index.upsert_articles([
+            api_article('resumo', 'Estudo qualquer', abstract='Um estudo sobre grafos'),
+            api_article('titulo', 'Grafos', abstract='Um estudo qualquer'),
+        ])
+        self.assertEqual(self.ids(local_index.search_local('grafos')), ['titulo', 'resumo'])
+
+    def test_relevance_and_recency_orders_and_pagination(self):
+        local_index.upsert_articles([
+            api_article('p1', 'Grafos', year=2018, citations=50),
+            api_article('p2', 'Grafos', year=2022, citations=5),
+            api_article('p3', 'Grafos', year=2020, citations=10),
+        ])
+        self.assertEqual(self.ids(local_index.search_local('grafos', sort_by='relevance')), ['p1', 'p3', 'p2'])
+        self.assertEqual(self.ids(local_index.search_local('grafos', sort_by='recency')), ['p2', 'p3', 'p1'])
+        self.assertEqual(self.ids(local_index.search_local('grafos', sort_by='recency', offset=1, limit=1)), ['p3'])
+
+    def test_returned_articles_use_the_api_format(self):
+        original = api_article('p1', 'Grafos', authors=['Ana'], journal='Revista')
+        local_index.upsert_articles([original])
+        self.assertEqual(local_index.search_local('grafos'), [original])
+
+
+class FtsMigrationTests(TransactionTestCase):
+    """A migração cria (e o rollback remove) a tabela FTS5 e seus triggers."""
+
+    def fts_objects(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'explorer_article_%'")
+            return {row[0] for row in cursor.fetchall()}
+
+    def test_migration_creates_and_drops_the_fts_table_and_triggers(self):
+        expected = {'explorer_article_fts', 'explorer_article_ai', 'explorer_article_ad', 'explorer_article_au'}
+        self.assertTrue(expected <= self.fts_objects())
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([('explorer', None)])
+        try:
+            self.assertFalse(expected & self.fts_objects())
+        finally:
+            executor.loader.build_graph()
+            executor.migrate([('explorer', '0001_initial')])
+        self.assertTrue(expected <= self.fts_objects())
+
+
+class LocalFirstSourceTests(SimpleTestCase):
+    """A fonte (índice ou Semantic Scholar) escolhida na primeira página vale para a busca inteira."""
+
+    def setUp(self):
+        use_temp_cache(self, services.LOCAL_SEARCH_SOURCES)
+        self.patch('LOCAL_SEARCH_MIN_RESULTS', 2)
+        self.patch('extract_keywords_with_gemini', side_effect=lambda q: f'{q} expandida')
+        self.api = self.patch('search_articles_from_api', return_value=[{'paperId': 'api'}])
+
+    def patch(self, name, *args, **kwargs):
+        patcher = mock.patch.object(services, name, *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def search(self, offset):
+        return services.search_local_first('grafos', sort_by='default', offset=offset)
+
+    def test_local_session_keeps_using_the_index_on_short_pages(self):
+        pages = {0: [{'paperId': 'a'}, {'paperId': 'b'}], 2: [{'paperId': 'c'}]}
+        with mock.patch.object(services, 'search_local', side_effect=lambda q, **f: pages.get(f['offset'], [])):
+            self.assertEqual(len(self.search(0)), 2)
+            self.assertEqual(self.search(2), [{'paperId': 'c'}])
+            self.assertEqual(self.search(4), [])
+        self.api.assert_not_called()
+
+    def test_api_session_stays_on_the_api_when_the_index_grows(self):
+        local = self.patch('search_local', return_value=[{'paperId': 'a'}])
+        self.assertEqual(self.search(0), [{'paperId': 'api'}])
+        local.return_value = [{'paperId': 'a'}, {'paperId': 'b'}]
+        self.assertEqual(self.search(20), [{'paperId': 'api'}])
+        self.assertEqual(self.api.call_args.kwargs['offset'], 20)
+        self.assertEqual(self.api.call_args.kwargs['query'], 'grafos expandida')
+
+    def test_later_page_without_a_decision_decides_from_the_first_page(self):
+        pages = {0: [{'paperId': 'a'}, {'paperId': 'b'}], 20: []}
+        with mock.patch.object(services, 'search_local', side_effect=lambda q, **f: pages[f['offset']]):
+            self.assertEqual(self.search(20), [])
+        self.api.assert_not_called()
@@ -0,0 +1,160 @@
+"""
+Cache persistente compartilhado entre os processos do Django.
+
+Cada cache nomeado vive em um arquivo SQLite próprio dentro de CACHE_DIR, então
+todos os workers (runserver, gunicorn, uvicorn...) enxergam as mesmas entradas.
+Os valores são serializados em JSON (ou mantidos como bytes) e comprimidos com
+zlib. A expiração é por TTL e o despejo é LRU, limitado por número de entradas
+e/ou por tamanho total em bytes.
+"""
+import json
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Optional
+
+CACHE_DIR = Path(os.getenv(
+    "RESEARCHFLOW_CACHE_DIR",
+    Path(__file__).resolve().parent.parent / '.cache'
+))
+
+# Todos os caches criados no processo, para o endpoint de métricas.
+_registry = {}
+
+
+class SQLiteCache:
+    """
+    Cache chave/valor com TTL e despejo LRU, armazenado em SQLite.
+
+    Falhas do SQLite nunca quebram a requisição: `get` devolve o default e
+    `set` apenas registra o erro.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = CACHE_DIR / f"{name}.sqlite3"
+        self._ready = False
+        _registry[name] = self
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._ready:
+            return sqlite3.connect(self.path, timeout=30)
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, is_bytes INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        conn.commit()
+        self._ready = True
+        return conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT value, is_bytes, expires_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or (row[2] is not None and row[2] < now):
+                    self._incr(conn, 'misses')
+                    return default
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._incr(conn, 'hits')
+            raw = zlib.decompress(row[0])
+            return raw if row[1] else json.loads(raw.decode('utf-8'))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            print(f"Erro ao ler o cache '{self.name}': {e}")
+            return default
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        is_bytes = isinstance(value, (bytes, bytearray))
+        raw = bytes(value) if is_bytes else json.dumps(value, ensure_ascii=False).encode('utf-8')
+        blob = zlib.compress(raw)
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, is_bytes, size, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, blob, int(is_bytes), len(blob), now + ttl if ttl else None, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Erro ao gravar no cache '{self.name}': {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Erro ao remover do cache '{self.name}': {e}")
+
+    def incr(self, counter: str, amount: float = 1) -> None:
+        """Soma `amount` a um contador persistente (ex: segundos economizados)."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                self._incr(conn, counter, amount)
+        except sqlite3.Error as e:
+            print(f"Erro ao atualizar contador do cache '{self.name}': {e}")
+
+    def stats(self) -> dict:
+        try:
+            with closing(self._connect()) as conn:
+                counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+                entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        except sqlite3.Error as e:
+            print(f"Erro ao ler métricas do cache '{self.name}': {e}")
+            return {}
+        hits = int(counters.pop('hits', 0))
+        misses = int(counters.pop('misses', 0))
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+            **counters,
+        }
+
+    @staticmethod
+    def _incr(conn: sqlite3.Connection, counter: str, amount: float = 1) -> None:
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (counter, amount)
+        )
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        if self.max_bytes:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS running"
+                " FROM entries) WHERE running > ?)",
+                (self.max_bytes,)
+            )
+
+
+def all_cache_stats() -> dict:
+    """Métricas de todos os caches instanciados neste processo."""
+    return {name: cache.stats() for name, cache in _registry.items()}
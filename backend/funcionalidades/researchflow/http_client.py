@@ -0,0 +1,209 @@
+"""
+Cliente HTTP compartilhado para todas as chamadas externas do backend.
+
+Cada host ganha uma `requests.Session` própria, com pool de conexões keep-alive
+de até HTTP_POOL_MAXSIZE conexões. Assim as conexões TCP/TLS já abertas são
+reaproveitadas entre requisições do mesmo worker. O mesmo limite vale para as
+requisições simultâneas ao host: quem não consegue uma vaga em
+HTTP_POOL_TIMEOUT segundos recebe HostBusy em vez de esperar sem prazo. Respostas 429/5xx e falhas
+de conexão são repetidas com backoff exponencial com jitter. Hosts com
+orçamento em `researchflow.rate_limit` (ex: Semantic Scholar) esperam a vez no
+limitador antes de cada tentativa.
+
+As funções `async_*` oferecem o mesmo comportamento com httpx para as views
+assíncronas (ASGI), com um cliente por host em cada event loop.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from researchflow import rate_limit
+
+# Conexões simultâneas por host (em cada processo) e espera máxima por uma vaga
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 30))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 8))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# host -> vagas de conexão (BoundedSemaphore com HTTP_POOL_MAXSIZE vagas)
+_host_slots = {}
+# event loop -> {host: httpx.AsyncClient}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class HostBusy(requests.exceptions.ConnectionError):
+    """Todas as conexões do host ficaram ocupadas por mais de HTTP_POOL_TIMEOUT segundos."""
+
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc.lower()}"
+
+
+def get_session(url: str) -> requests.Session:
+    """Retorna (criando se preciso) a sessão com pool de conexões do host da URL."""
+    host = _host_key(url)
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            # O limite por host é aplicado pelas vagas de `request`, que têm prazo;
+            # o pool_block do urllib3 esperaria sem prazo por uma conexão livre.
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE, pool_block=False)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+    return session
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Espera antes da próxima tentativa: respeita Retry-After ou usa full jitter."""
+    if retry_after and retry_after.strip().isdigit():
+        return min(float(retry_after), HTTP_BACKOFF_MAX)
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def _connection_slots(host: str) -> threading.BoundedSemaphore:
+    slots = _host_slots.get(host)
+    if slots is None:
+        with _sessions_lock:
+            slots = _host_slots.setdefault(host, threading.BoundedSemaphore(HTTP_POOL_MAXSIZE))
+    return slots
+
+
+def _release_on_close(resp: requests.Response, slots: threading.BoundedSemaphore) -> None:
+    """Com stream=True a vaga do host só é devolvida quando a resposta é fechada."""
+    released = threading.Lock()
+
+    def release():
+        # Uma única vez, mesmo com close() repetido
+        if released.acquire(blocking=False):
+            slots.release()
+
+    close = resp.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            release()
+
+    resp.close = close_and_release
+    # Resposta esquecida sem close(): a vaga volta quando ela é coletada
+    weakref.finalize(resp, release)
+
+
+def request(method: str, url: str, retries: int = HTTP_MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    Igual a `requests.request`, mas usando a sessão do host e repetindo
+    respostas 429/5xx e falhas de conexão até `retries` vezes. As respostas
+    descartadas são fechadas aqui; com `stream=True`, quem chamou deve fechar a
+    resposta devolvida (ex: `with resp:`), inclusive em caso de erro: até lá
+    ela ocupa uma das HTTP_POOL_MAXSIZE vagas do host.
+    """
+    host = _host_key(url)
+    session = get_session(url)
+    slots = _connection_slots(host)
+    budget = rate_limit.budget_for_url(url)
+    for attempt in range(retries + 1):
+        rate_limit.acquire(budget)
+        if not slots.acquire(timeout=HTTP_POOL_TIMEOUT):
+            raise HostBusy(f"Nenhuma conexão livre para {host} em {HTTP_POOL_TIMEOUT:g}s.")
+        try:
+            resp = session.request(method, url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            slots.release()
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Falha de conexão com {url} ({e}). Nova tentativa em {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            slots.release()
+            raise
+
+        if resp.status_code in RETRY_STATUSES and attempt < retries:
+            # Libera a conexão antes de qualquer outra coisa: a resposta
+            # descartada nunca chega a quem chamou para ser fechada
+            resp.close()
+            slots.release()
+            delay = backoff_delay(attempt, resp.headers.get('Retry-After'))
+            print(f"{url} respondeu {resp.status_code}. Nova tentativa em {delay:.1f}s...")
+            time.sleep(delay)
+            continue
+        if kwargs.get('stream'):
+            _release_on_close(resp, slots)
+        else:
+            slots.release()
+        return resp
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request('POST', url, **kwargs)
+
+
+def get_async_client(url: str) -> httpx.AsyncClient:
+    """Cliente httpx com pool keep-alive do host da URL, no event loop atual."""
+    host = _host_key(url)
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(host)
+    if client is None:
+        # max_connections limita o host; o prazo para uma vaga é o timeout "pool" do httpx
+        limits = httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+        client = httpx.AsyncClient(limits=limits, follow_redirects=True)
+        clients[host] = client
+    return client
+
+
+async def async_request(method: str, url: str, retries: int = HTTP_MAX_RETRIES, **kwargs) -> httpx.Response:
+    """Versão assíncrona de `request`, com a mesma política de repetição."""
+    client = get_async_client(url)
+    budget = rate_limit.budget_for_url(url)
+    for attempt in range(retries + 1):
+        await rate_limit.acquire_async(budget)
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"Falha de conexão com {url} ({e}). Nova tentativa em {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+
+        if resp.status_code in RETRY_STATUSES and attempt < retries:
+            await resp.aclose()
+            delay = backoff_delay(attempt, resp.headers.get('Retry-After'))
+            print(f"{url} respondeu {resp.status_code}. Nova tentativa em {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+        return resp
+
+
+async def async_get(url: str, **kwargs) -> httpx.Response:
+    return await async_request('GET', url, **kwargs)
+
+
+async def async_post(url: str, **kwargs) -> httpx.Response:
+    return await async_request('POST', url, **kwargs)
@@ -0,0 +1,174 @@
+"""
+Extração de texto de PDFs compartilhada pelo analyzer e pelo writer.
+
+O texto de cada página fica em cache (comprimido em disco) indexado pelo
+SHA-256 dos bytes do PDF. Assim o mesmo artigo enviado para /extract/,
+/summarize/ e /format/ só passa pelo PyPDF2 uma vez.
+
+O `page.extract_text()` do PyPDF2 é Python puro e preso ao GIL, então
+documentos grandes (a partir de PDF_PARALLEL_MIN_PAGES páginas) são divididos
+em faixas de páginas processadas em paralelo por um pool de processos com
+PDF_EXTRACT_WORKERS workers. A ordem das páginas é preservada.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Tuple
+
+from PyPDF2 import PdfReader
+
+from researchflow.cache import SQLiteCache
+
+PDF_TEXT_CACHE = SQLiteCache(
+    "pdf_text",
+    max_bytes=int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+)
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", os.cpu_count() or 2))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 40))
+# No streaming, faixas menores fazem as primeiras páginas chegarem antes
+PDF_STREAM_RANGE_PAGES = int(os.getenv("PDF_STREAM_RANGE_PAGES", 8))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" evita herdar threads e conexões gRPC do Gemini via fork
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _extract_page_range(data: bytes, start: int, end: int) -> List[str]:
+    """Executado nos processos do pool: extrai as páginas [start, end)."""
+    reader = PdfReader(io.BytesIO(data))
+    return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+def _extract_all_pages(data: bytes) -> List[str]:
+    """Executado nos processos do pool: extrai todas as páginas do documento."""
+    reader = PdfReader(io.BytesIO(data))
+    return [page.extract_text() or '' for page in reader.pages]
+
+
+def page_ranges(total_pages: int, parts: int, max_size: int = None) -> List[Tuple[int, int]]:
+    """Divide `total_pages` em até `parts` faixas contíguas [início, fim) de no máximo `max_size` páginas."""
+    size = max(1, -(-total_pages // max(1, parts)))
+    if max_size:
+        size = min(size, max_size)
+    return [(start, min(start + size, total_pages)) for start in range(0, total_pages, size)]
+
+
+def _iter_parsed_pages(data: bytes, max_range_size: int = None) -> Iterator[Tuple[int, str]]:
+    """Gera (total_de_páginas, texto) página a página, na ordem do documento."""
+    reader = PdfReader(io.BytesIO(data))
+    total_pages = len(reader.pages)
+    if PDF_EXTRACT_WORKERS <= 1 or total_pages < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield total_pages, page.extract_text() or ''
+        return
+
+    print(f"Extraindo {total_pages} páginas em paralelo ({PDF_EXTRACT_WORKERS} processos)...")
+    done = 0
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(_extract_page_range, data, start, end)
+                   for start, end in page_ranges(total_pages, PDF_EXTRACT_WORKERS, max_range_size)]
+        for future in futures:
+            for text in future.result():
+                done += 1
+                yield total_pages, text
+    except BrokenProcessPool as e:
+        print(f"Pool de extração indisponível ({e}). Extraindo no processo atual.")
+        _reset_pool()
+        for page in reader.pages[done:]:
+            yield total_pages, page.extract_text() or ''
+
+
+def read_pdf_bytes(file_input) -> bytes:
+    """Lê todos os bytes de um caminho de arquivo ou de um objeto de arquivo/stream."""
+    if isinstance(file_input, (str, os.PathLike)):
+        with open(file_input, 'rb') as f:
+            return f.read()
+    if hasattr(file_input, 'seek'):
+        file_input.seek(0)
+    return file_input.read()
+
+
+def pdf_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def extract_pdf_pages(data: bytes) -> List[str]:
+    """
+    Retorna o texto de cada página do PDF (string vazia para páginas sem texto).
+    Exceções do PyPDF2 são propagadas para quem chamou.
+    """
+    digest = pdf_digest(data)
+    cached = PDF_TEXT_CACHE.get(digest)
+    if cached is not None:
+        print(f"Texto do PDF {digest[:12]} obtido do cache.")
+        return cached
+
+    pages = [text for _, text in _iter_parsed_pages(data)]
+    PDF_TEXT_CACHE.set(digest, pages)
+    return pages
+
+
+def iter_pdf_pages(data: bytes) -> Iterator[Tuple[int, int, str]]:
+    """
+    Gera (número_da_página, total_de_páginas, texto) assim que cada página é
+    extraída, para respostas em streaming. O resultado completo também vai para
+    o cache, desde que o documento seja consumido até o fim.
+    """
+    digest = pdf_digest(data)
+    cached = PDF_TEXT_CACHE.get(digest)
+    if cached is not None:
+        for number, text in enumerate(cached, start=1):
+            yield number, len(cached), text
+        return
+
+    pages = []
+    for total_pages, text in _iter_parsed_pages(data, max_range_size=PDF_STREAM_RANGE_PAGES):
+        pages.append(text)
+        yield len(pages), total_pages, text
+    PDF_TEXT_CACHE.set(digest, pages)
+
+
+def extract_pdf_pages_pooled(data: bytes) -> List[str]:
+    """
+    Igual a `extract_pdf_pages`, mas o documento inteiro é lido em um processo
+    do pool, qualquer que seja o tamanho. Feito para lotes: vários PDFs são
+    processados em paralelo, um por processo, sem disputar o GIL.
+    """
+    digest = pdf_digest(data)
+    cached = PDF_TEXT_CACHE.get(digest)
+    if cached is not None:
+        return cached
+
+    try:
+        pages = _get_pool().submit(_extract_all_pages, data).result()
+    except BrokenProcessPool as e:
+        print(f"Pool de extração indisponível ({e}). Extraindo no processo atual.")
+        _reset_pool()
+        pages = _extract_all_pages(data)
+    PDF_TEXT_CACHE.set(digest, pages)
+    return pages
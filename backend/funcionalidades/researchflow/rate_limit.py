@@ -0,0 +1,206 @@
+"""
+Limite de taxa das APIs externas, compartilhado entre os processos do Django.
+
+Cada upstream (Semantic Scholar, Gemini) tem um token bucket próprio guardado
+em SQLite dentro de CACHE_DIR, então todos os workers dividem o mesmo
+orçamento. Quem chega sem token disponível não falha: reserva o próximo token
+(o saldo do bucket fica negativo) e dorme até a vez dele, como em uma fila.
+A fila é limitada: se já houver RATE_LIMIT_MAX_QUEUE chamadas esperando, ou se
+a espera passar do prazo (RATE_LIMIT_MAX_WAIT segundos), a chamada é recusada
+com RateLimitExceeded sem consumir o orçamento.
+
+Falhas do próprio SQLite nunca bloqueiam a chamada: ela segue sem limite.
+"""
+import asyncio
+import math
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from researchflow.cache import CACHE_DIR
+
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 30))
+RATE_LIMIT_MAX_QUEUE = int(os.getenv("RATE_LIMIT_MAX_QUEUE", 50))
+
+# upstream -> (tokens por segundo, tamanho do bucket). Taxa 0 desativa o limite.
+BUDGETS: Dict[str, Tuple[float, float]] = {
+    "semantic_scholar": (
+        float(os.getenv("RATE_LIMIT_SEMANTIC_SCHOLAR_RPS", 1)),
+        float(os.getenv("RATE_LIMIT_SEMANTIC_SCHOLAR_BURST", 1)),
+    ),
+    "gemini": (
+        float(os.getenv("RATE_LIMIT_GEMINI_RPM", 60)) / 60,
+        float(os.getenv("RATE_LIMIT_GEMINI_BURST", 5)),
+    ),
+}
+# Chamadas HTTP (via researchflow.http_client) para estes hosts usam o bucket indicado
+HOST_BUDGETS = {
+    "api.semanticscholar.org": "semantic_scholar",
+}
+
+RATE_LIMIT_DB_PATH = CACHE_DIR / "rate_limits.sqlite3"
+
+# Mensagem devolvida ao cliente (com HTTP 503) quando o Gemini recusa a chamada
+GEMINI_OVERLOADED_MESSAGE = "Serviço de IA sobrecarregado. Tente novamente em instantes."
+
+_db_ready = False
+
+
+class RateLimitExceeded(Exception):
+    """A chamada não coube no orçamento do upstream dentro do prazo (ou a fila estava cheia)."""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _connect() -> sqlite3.Connection:
+    global _db_ready
+    if not _db_ready:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(RATE_LIMIT_DB_PATH, timeout=30, isolation_level=None)
+    if not _db_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            " bucket TEXT NOT NULL, name TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (bucket, name))"
+        )
+        _db_ready = True
+    return conn
+
+
+def _refill(row: Optional[tuple], rate: float, burst: float, now: float) -> float:
+    if row is None:
+        return burst
+    tokens, updated_at = row
+    return min(burst, tokens + (now - updated_at) * rate)
+
+
+def _queue_depth(tokens: float) -> int:
+    """Chamadas que reservaram um token e ainda esperam a vez."""
+    return math.ceil(-tokens) if tokens < 0 else 0
+
+
+def _count(conn: sqlite3.Connection, bucket: str, name: str, amount: float = 1) -> None:
+    conn.execute(
+        "INSERT INTO counters (bucket, name, value) VALUES (?, ?, ?)"
+        " ON CONFLICT(bucket, name) DO UPDATE SET value = value + excluded.value",
+        (bucket, name, amount)
+    )
+
+
+def _reserve(name: str, max_wait: float) -> float:
+    """Reserva um token e retorna quantos segundos esperar por ele (ou lança RateLimitExceeded)."""
+    rate, burst = BUDGETS[name]
+    now = time.time()
+    with closing(_connect()) as conn:
+        # BEGIN IMMEDIATE serializa as reservas de todos os processos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = _refill(row, rate, max(1.0, burst), now)
+            wait = max(0.0, (1 - tokens) / rate)
+            rejection = None
+            if wait > 0 and _queue_depth(tokens) >= RATE_LIMIT_MAX_QUEUE:
+                rejection = f"Fila de espera do {name} cheia ({RATE_LIMIT_MAX_QUEUE} chamadas)."
+            elif wait > max_wait:
+                rejection = f"Orçamento do {name} esgotado: a espera seria de {wait:.1f}s (limite {max_wait:g}s)."
+
+            if rejection:
+                _count(conn, name, 'rejected')
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (name, tokens - 1, now)
+                )
+                _count(conn, name, 'acquired')
+                if wait > 0:
+                    _count(conn, name, 'waited')
+                    _count(conn, name, 'wait_seconds', wait)
+                    conn.execute(
+                        "INSERT INTO counters (bucket, name, value) VALUES (?, 'max_wait_seconds', ?)"
+                        " ON CONFLICT(bucket, name) DO UPDATE SET value = MAX(value, excluded.value)",
+                        (name, wait)
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if rejection:
+        raise RateLimitExceeded(rejection, retry_after=wait)
+    return wait
+
+
+def _plan(name: Optional[str], timeout: Optional[float]) -> float:
+    if name is None or BUDGETS.get(name, (0, 0))[0] <= 0:
+        return 0.0
+    try:
+        return _reserve(name, RATE_LIMIT_MAX_WAIT if timeout is None else timeout)
+    except sqlite3.Error as e:
+        print(f"Erro no limitador de taxa '{name}': {e}. Seguindo sem limite.")
+        return 0.0
+
+
+def acquire(name: Optional[str], timeout: Optional[float] = None) -> float:
+    """
+    Espera a vez de fazer uma chamada ao upstream `name` e retorna os segundos
+    esperados. `timeout` (padrão RATE_LIMIT_MAX_WAIT) é o prazo máximo de espera.
+    """
+    wait = _plan(name, timeout)
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+
+async def acquire_async(name: Optional[str], timeout: Optional[float] = None) -> float:
+    """Versão assíncrona de `acquire`: espera sem bloquear o event loop."""
+    wait = await asyncio.to_thread(_plan, name, timeout)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return wait
+
+
+def overloaded_error(e: RateLimitExceeded, message: str = GEMINI_OVERLOADED_MESSAGE) -> dict:
+    """Dict de erro das chamadas recusadas: `retry_after` (segundos) vira o Retry-After do 503."""
+    return {"error": message, "retry_after": max(1, math.ceil(e.retry_after))}
+
+
+def budget_for_url(url: str) -> Optional[str]:
+    """Nome do bucket que limita chamadas para a URL, ou None."""
+    return HOST_BUDGETS.get(urlsplit(url).hostname or '')
+
+
+def rate_limit_stats() -> dict:
+    """Métricas de cada upstream: tokens, fila de espera atual e tempos de espera."""
+    now = time.time()
+    try:
+        with closing(_connect()) as conn:
+            buckets = {row[0]: row[1:] for row in conn.execute("SELECT name, tokens, updated_at FROM buckets")}
+            counters = conn.execute("SELECT bucket, name, value FROM counters").fetchall()
+    except sqlite3.Error as e:
+        print(f"Erro ao ler métricas do limitador de taxa: {e}")
+        return {}
+
+    stats = {}
+    for name, (rate, burst) in BUDGETS.items():
+        tokens = _refill(buckets.get(name), rate, max(1.0, burst), now) if rate > 0 else burst
+        stats[name] = {
+            'rate_per_second': rate,
+            'burst': burst,
+            'tokens': round(tokens, 3),
+            'queue_depth': _queue_depth(tokens),
+            'acquired': 0, 'waited': 0, 'rejected': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+        }
+    for bucket, counter, value in counters:
+        if bucket in stats:
+            stats[bucket][counter] = round(value, 3) if 'seconds' in counter else int(value)
+    for entry in stats.values():
+        entry['avg_wait_seconds'] = round(entry['wait_seconds'] / entry['waited'], 3) if entry['waited'] else 0.0
+    return stats
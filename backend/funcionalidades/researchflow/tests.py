@@ -0,0 +1,144 @@
+import gc
+import io
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from django.test import SimpleTestCase
+
+from researchflow import rate_limit
+from researchflow.rate_limit import RateLimitExceeded
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Reserva e recusa do token bucket, num SQLite temporário."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(rate_limit, 'RATE_LIMIT_DB_PATH', Path(tmp.name) / 'rate_limits.sqlite3'),
+            mock.patch.object(rate_limit, '_db_ready', False),
+            mock.patch.object(rate_limit, 'RATE_LIMIT_MAX_QUEUE', 50),
+            # 1 token por segundo, bucket de 2
+            mock.patch.dict(rate_limit.BUDGETS, {'teste': (1.0, 2.0)}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_burst_is_free_then_calls_reserve_the_next_token(self):
+        self.assertEqual(rate_limit._reserve('teste', max_wait=10), 0)
+        self.assertEqual(rate_limit._reserve('teste', max_wait=10), 0)
+        # Sem token: reserva o próximo e espera a vez (o saldo fica negativo)
+        self.assertAlmostEqual(rate_limit._reserve('teste', max_wait=10), 1.0, delta=0.1)
+        self.assertAlmostEqual(rate_limit._reserve('teste', max_wait=10), 2.0, delta=0.1)
+
+        stats = rate_limit.rate_limit_stats()['teste']
+        self.assertEqual(stats['queue_depth'], 2)
+        self.assertEqual(stats['acquired'], 4)
+        self.assertEqual(stats['waited'], 2)
+
+    def test_wait_over_the_deadline_is_rejected_without_spending_budget(self):
+        rate_limit._reserve('teste', max_wait=10)
+        rate_limit._reserve('teste', max_wait=10)
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            rate_limit._reserve('teste', max_wait=0.5)
+        self.assertAlmostEqual(ctx.exception.retry_after, 1.0, delta=0.1)
+
+        # A recusa não consumiu token: a próxima reserva ainda espera ~1s, não 2s
+        self.assertAlmostEqual(rate_limit._reserve('teste', max_wait=10), 1.0, delta=0.1)
+        self.assertEqual(rate_limit.rate_limit_stats()['teste']['rejected'], 1)
+
+    def test_full_queue_is_rejected(self):
+        with mock.patch.object(rate_limit, 'RATE_LIMIT_MAX_QUEUE', 1):
+            rate_limit._reserve('teste', max_wait=10)
+            rate_limit._reserve('teste', max_wait=10)
+            rate_limit._reserve('teste', max_wait=10)  # primeira da fila
+            with self.assertRaisesMessage(RateLimitExceeded, "Fila de espera"):
+                rate_limit._reserve('teste', max_wait=10)
+
+    def test_unknown_or_disabled_budget_never_waits(self):
+        with mock.patch.dict(rate_limit.BUDGETS, {'desligado': (0, 0)}):
+            self.assertEqual(rate_limit.acquire('desligado'), 0)
+        self.assertEqual(rate_limit.acquire('inexistente'), 0)
+        self.assertEqual(rate_limit.acquire(None), 0)
+
+    def test_overloaded_error_rounds_retry_after_up(self):
+        error = rate_limit.overloaded_error(RateLimitExceeded("recusada", retry_after=0.2))
+        self.assertEqual(error, {"error": rate_limit.GEMINI_OVERLOADED_MESSAGE, "retry_after": 1})
+
+
+class HttpClientRetryTests(SimpleTestCase):
+    """Respostas descartadas nas repetições são fechadas, senão a conexão não volta ao pool."""
+
+    def test_retried_responses_are_closed(self):
+        from researchflow import http_client
+
+        retried = [mock.Mock(status_code=503, headers={}) for _ in range(2)]
+        final = mock.Mock(status_code=200, headers={})
+        final_close = final.close
+        session = mock.Mock()
+        session.request.side_effect = [*retried, final]
+        with mock.patch.object(http_client, 'get_session', return_value=session), \
+                mock.patch.object(http_client.time, 'sleep'):
+            resp = http_client.get('https://exemplo.org/a', retries=2, stream=True)
+
+        self.assertIs(resp, final)
+        for discarded in retried:
+            discarded.close.assert_called_once()
+        final_close.assert_not_called()
+
+
+class HttpClientHostLimitTests(SimpleTestCase):
+    """Cada host tem no máximo HTTP_POOL_MAXSIZE requisições abertas; a espera por uma vaga tem prazo."""
+
+    host = 'https://limitado.exemplo'
+
+    def setUp(self):
+        from researchflow import http_client
+
+        self.http_client = http_client
+        self.session = mock.Mock()
+        self.session.request.side_effect = lambda *args, **kwargs: self.response()
+        for patcher in (
+            mock.patch.dict(http_client._sessions, {self.host: self.session}),
+            mock.patch.dict(http_client._host_slots, {self.host: threading.BoundedSemaphore(1)}),
+            mock.patch.object(http_client, 'HTTP_POOL_TIMEOUT', 0.05),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def response(self):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.raw = io.BytesIO(b'')
+        return resp
+
+    def get(self, **kwargs):
+        return self.http_client.get(f'{self.host}/arquivo.pdf', retries=0, **kwargs)
+
+    def test_streamed_response_holds_the_slot_until_closed(self):
+        resp = self.get(stream=True)
+        with self.assertRaises(self.http_client.HostBusy):
+            self.get()
+        resp.close()
+        resp.close()  # fechar de novo não devolve a vaga duas vezes
+        self.get()
+        self.assertEqual(self.session.request.call_count, 2)
+
+    def test_leaked_streamed_response_returns_the_slot_when_collected(self):
+        self.get(stream=True)
+        gc.collect()
+        self.get()
+
+    def test_plain_and_failed_requests_release_the_slot(self):
+        self.get()
+        self.session.request.side_effect = requests.exceptions.ConnectionError("recusada")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.get()
+        self.session.request.side_effect = None
+        self.session.request.return_value = self.response()
+        self.get()
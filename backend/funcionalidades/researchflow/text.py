@@ -0,0 +1,21 @@
+"""
+Tokenização compartilhada pela recuperação do chat (analyzer) e pelo índice
+local de artigos (explorer): sem acentos, sem maiúsculas e sem stopwords.
+"""
+import re
+import unicodedata
+from typing import List
+
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'no', 'na', 'nos', 'nas',
+    'um', 'uma', 'uns', 'umas', 'para', 'por', 'com', 'sem', 'que', 'se', 'ao', 'aos', 'como',
+    'mais', 'ou', 'qual', 'quais', 'sobre', 'este', 'esta', 'isso', 'artigo',
+    'the', 'of', 'and', 'to', 'in', 'on', 'for', 'is', 'are', 'with', 'by', 'an', 'be', 'this',
+    'that', 'it', 'as', 'at', 'from', 'or', 'what', 'which', 'paper',
+}
+
+
+def tokenize(text: str) -> List[str]:
+    folded = unicodedata.normalize('NFKD', text.casefold())
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return [t for t in re.findall(r'\w+', folded) if len(t) > 1 and t not in STOPWORDS]
@@ -1,6 +1,25 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def _serves_requests() -> bool:
+    """False para comandos de gerenciamento (migrate, test...) e para o processo que só recarrega o runserver."""
+    if os.path.basename(sys.argv[0]) != 'manage.py':
+        return True  # gunicorn, uvicorn, daphne...
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
 class WriterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'writer'
+
+    def ready(self):
+        # Jobs de formatação deixados na fila por um restart ou deploy voltam a andar
+        if _serves_requests():
+            from writer.jobs import resume_pending_jobs
+            resume_pending_jobs()
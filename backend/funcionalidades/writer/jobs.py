@@ -0,0 +1,252 @@
+"""
+Fila de jobs do formatador LaTeX.
+
+A formatação (extração, conversão para LaTeX pelo Gemini e compilação com
+pdflatex) demora mais do que um proxy costuma esperar, então ela pode rodar em
+segundo plano: `submit_job` grava o arquivo enviado em uma fila SQLite e
+retorna um job_id na hora. Um pool de FORMAT_JOB_WORKERS threads consome a
+fila e registra a etapa atual (extract, llm, compile). O pool é iniciado na
+primeira submissão, na consulta de um job pendente e, se a fila tiver jobs
+pendentes, na subida do servidor (WriterConfig.ready): jobs deixados por um
+restart ou deploy não dependem de uma nova submissão para andar.
+
+Como a fila fica em disco (em CACHE_DIR), jobs de qualquer processo do Django
+podem ser consultados por qualquer outro. Enquanto um job roda, o worker
+renova `updated_at` a cada FORMAT_JOB_HEARTBEAT_SECONDS (e a cada troca de
+etapa); jobs "running" sem sinal de vida há mais de FORMAT_JOB_STALE_SECONDS
+(ex: o processo morreu) voltam para a fila. Assim um job longo nunca é
+pego por outro worker enquanto o dono ainda está vivo.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Optional
+
+from django.core.files.base import ContentFile
+
+from researchflow.cache import CACHE_DIR
+from researchflow.rate_limit import GEMINI_OVERLOADED_MESSAGE, RateLimitExceeded
+from writer.services import extract_text_from_file, format_text_with_gemini
+
+FORMAT_JOB_WORKERS = int(os.getenv("FORMAT_JOB_WORKERS", 2))
+FORMAT_JOB_POLL_SECONDS = float(os.getenv("FORMAT_JOB_POLL_SECONDS", 2))
+FORMAT_JOB_HEARTBEAT_SECONDS = float(os.getenv("FORMAT_JOB_HEARTBEAT_SECONDS", 30))
+FORMAT_JOB_STALE_SECONDS = int(os.getenv("FORMAT_JOB_STALE_SECONDS", 5 * 60))
+FORMAT_JOB_TTL = int(os.getenv("FORMAT_JOB_TTL", 7 * 24 * 3600))
+
+JOBS_DB_PATH = CACHE_DIR / "format_jobs.sqlite3"
+
+_db_ready = False
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def _connect() -> sqlite3.Connection:
+    global _db_ready
+    if not _db_ready:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _db_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT,"
+            " upload_name TEXT NOT NULL, style TEXT, sectioned INTEGER NOT NULL DEFAULT 0, upload BLOB,"
+            " pdf BLOB, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        _db_ready = True
+    return conn
+
+
+def _update(job_id: str, **fields) -> None:
+    fields['updated_at'] = time.time()
+    columns = ', '.join(f"{name} = ?" for name in fields)
+    with closing(_connect()) as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _heartbeat(job_id: str, stop: threading.Event) -> None:
+    """Renova `updated_at` do job enquanto ele roda, para não ser tido como abandonado."""
+    while not stop.wait(FORMAT_JOB_HEARTBEAT_SECONDS):
+        try:
+            with closing(_connect()) as conn:
+                conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = 'running'",
+                    (time.time(), job_id)
+                )
+        except sqlite3.Error as e:
+            print(f"Erro ao renovar o job de formatação {job_id}: {e}")
+
+
+def _claim_next() -> Optional[sqlite3.Row]:
+    """Marca o job mais antigo da fila como "running" e o retorna (ou None)."""
+    now = time.time()
+    with closing(_connect()) as conn:
+        # BEGIN IMMEDIATE garante que dois workers (mesmo em processos
+        # diferentes) nunca peguem o mesmo job
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL"
+                " WHERE status = 'running' AND updated_at < ?",
+                (now - FORMAT_JOB_STALE_SECONDS,)
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', stage = 'extract', updated_at = ? WHERE id = ?",
+                    (now, row['id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return row
+
+
+def _purge_expired() -> None:
+    """Remove jobs concluídos há mais de FORMAT_JOB_TTL segundos (e seus PDFs)."""
+    cutoff = time.time() - FORMAT_JOB_TTL
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM jobs WHERE status IN ('done', 'error') AND updated_at < ?", (cutoff,))
+
+
+def _run_job(job: sqlite3.Row) -> None:
+    job_id = job['id']
+    print(f"Job de formatação {job_id} iniciado.")
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, stop), name=f"format-job-heartbeat-{job_id[:8]}",
+                     daemon=True).start()
+    try:
+        uploaded_file = ContentFile(job['upload'], name=job['upload_name'])
+        extracted_text = extract_text_from_file(uploaded_file)
+        if not extracted_text:
+            _update(job_id, status='error', error="Não foi possível extrair texto do arquivo.", upload=None)
+            return
+
+        pdf_bytes = format_text_with_gemini(
+            extracted_text, job['style'], job['upload_name'],
+            on_stage=lambda stage: _update(job_id, stage=stage),
+            sectioned=bool(job['sectioned'])
+        )
+        if pdf_bytes:
+            _update(job_id, status='done', stage=None, pdf=pdf_bytes, upload=None)
+            print(f"Job de formatação {job_id} concluído.")
+        else:
+            _update(job_id, status='error', error="Falha ao gerar o arquivo PDF.", upload=None)
+    except RateLimitExceeded as e:
+        print(f"Job de formatação {job_id} recusado pelo limitador de taxa: {e}")
+        _update(job_id, status='error', error=GEMINI_OVERLOADED_MESSAGE, upload=None)
+    except Exception as e:
+        print(f"Erro no job de formatação {job_id}: {e}")
+        _update(job_id, status='error', error=str(e), upload=None)
+    finally:
+        stop.set()
+
+
+def _process_next() -> bool:
+    """Roda o próximo job da fila. Retorna False se não havia job para rodar."""
+    try:
+        job = _claim_next()
+    except sqlite3.Error as e:
+        print(f"Erro ao ler a fila de formatação: {e}")
+        return False
+    if job is None:
+        return False
+    try:
+        _run_job(job)
+    except Exception as e:
+        # Ex: "database is locked" ao gravar o resultado. O worker continua
+        # vivo; o job, sem heartbeat, volta para a fila depois de
+        # FORMAT_JOB_STALE_SECONDS.
+        print(f"Erro inesperado no job de formatação {job['id']}: {e}")
+    return True
+
+
+def _worker_loop() -> None:
+    while True:
+        if not _process_next():
+            # Acorda na próxima submissão deste processo ou, no máximo, após o
+            # intervalo de polling (jobs enviados por outros processos)
+            _wakeup.wait(FORMAT_JOB_POLL_SECONDS)
+            _wakeup.clear()
+
+
+def _ensure_workers() -> None:
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(max(1, FORMAT_JOB_WORKERS)):
+            worker = threading.Thread(target=_worker_loop, name=f"format-job-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def resume_pending_jobs() -> None:
+    """Inicia os workers se a fila tiver jobs pendentes (ex: após um restart)."""
+    try:
+        with closing(_connect()) as conn:
+            pending = conn.execute(
+                "SELECT 1 FROM jobs WHERE status IN ('queued', 'running') LIMIT 1"
+            ).fetchone()
+    except sqlite3.Error as e:
+        print(f"Erro ao ler a fila de formatação: {e}")
+        return
+    if pending:
+        print("Jobs de formatação pendentes na fila. Iniciando os workers...")
+        _ensure_workers()
+
+
+def submit_job(uploaded_file, style: Optional[str], sectioned: bool = False) -> dict:
+    """Enfileira a formatação do arquivo enviado e retorna o job criado."""
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    uploaded_file.seek(0)
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, upload_name, style, sectioned, upload, created_at, updated_at)"
+            " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, uploaded_file.name, style, int(sectioned), uploaded_file.read(), now, now)
+        )
+    _purge_expired()
+    _ensure_workers()
+    _wakeup.set()
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Estado público do job (sem o arquivo enviado), ou None se não existir."""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id, status, stage, upload_name, error, created_at, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    if row['status'] in ('queued', 'running'):
+        # Quem acompanha um job pendente garante que a fila está sendo consumida
+        _ensure_workers()
+    return {
+        "job_id": row['id'],
+        "status": row['status'],
+        "stage": row['stage'],
+        "upload_name": row['upload_name'],
+        "error": row['error'],
+        "created_at": row['created_at'],
+        "updated_at": row['updated_at'],
+    }
+
+
+def get_job_pdf(job_id: str) -> Optional[bytes]:
+    """Bytes do PDF de um job concluído, ou None."""
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT pdf FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+    return row['pdf'] if row is not None else None
@@ -0,0 +1,27 @@
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+
+from writer.services import build_latex_format, LATEX_FORMAT_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-compila o preâmbulo padrão do formatador em um formato do pdflatex (.fmt). "
+        "Rode no deploy, com o mesmo pdflatex que vai compilar os documentos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir', default=None,
+            help=f"Pasta onde o .fmt será gerado (padrão: {LATEX_FORMAT_DIR})."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fmt_path = build_latex_format(options['output_dir'])
+        except FileNotFoundError:
+            raise CommandError("pdflatex não encontrado no PATH.")
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"Falha ao gerar o formato:\n{(e.stdout or b'').decode(errors='replace')[-2000:]}")
+        self.stdout.write(self.style.SUCCESS(f"Formato LaTeX gerado em {fmt_path}"))
@@ -0,0 +1,124 @@
+"""
+Sandboxes de compilação LaTeX.
+
+Cada compilação roda em um diretório temporário próprio, removido ao final, então
+requisições simultâneas (mesmo de arquivos com o mesmo nome) nunca se misturam.
+No máximo LATEX_MAX_CONCURRENT processos do pdflatex rodam ao mesmo tempo, e
+cada um tem limite de tempo de CPU (LATEX_CPU_SECONDS), de memória
+(LATEX_MEMORY_MB) e de tempo total (LATEX_COMPILE_TIMEOUT). O código vem da
+IA, então o pdflatex também roda sem shell-escape.
+"""
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: só o limite de tempo total é aplicado
+    resource = None
+
+LATEX_MAX_CONCURRENT = int(os.getenv("LATEX_MAX_CONCURRENT", os.cpu_count() or 2))
+LATEX_CPU_SECONDS = int(os.getenv("LATEX_CPU_SECONDS", 60))
+LATEX_MEMORY_MB = int(os.getenv("LATEX_MEMORY_MB", 1024))
+LATEX_COMPILE_TIMEOUT = int(os.getenv("LATEX_COMPILE_TIMEOUT", 120))
+# Pasta onde os sandboxes são criados (padrão: temp do sistema)
+LATEX_SANDBOX_DIR = os.getenv("LATEX_SANDBOX_DIR") or None
+
+_slots = threading.BoundedSemaphore(max(1, LATEX_MAX_CONCURRENT))
+
+
+class LatexCompileError(Exception):
+    """Falha do pdflatex; `log` traz o final do .log (ou da saída) para diagnóstico."""
+
+    def __init__(self, message: str, log: str = ""):
+        super().__init__(message)
+        self.log = log
+
+
+@contextmanager
+def compile_sandbox() -> Iterator[Path]:
+    """Diretório temporário exclusivo de uma compilação, apagado na saída."""
+    if LATEX_SANDBOX_DIR:
+        os.makedirs(LATEX_SANDBOX_DIR, exist_ok=True)
+    path = tempfile.mkdtemp(prefix='researchflow-latex-', dir=LATEX_SANDBOX_DIR)
+    try:
+        yield Path(path)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _limit_resources(pid: int) -> None:
+    if resource is None or not hasattr(resource, 'prlimit'):
+        return
+    # prlimit depois do spawn evita preexec_fn, que não é seguro com threads
+    resource.prlimit(pid, resource.RLIMIT_CPU, (LATEX_CPU_SECONDS, LATEX_CPU_SECONDS + 5))
+    memory = LATEX_MEMORY_MB * 1024 * 1024
+    resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+
+
+def run_pdflatex(args: List[str], cwd: Path, env: Optional[Dict[str, str]] = None) -> None:
+    """
+    Roda o pdflatex com os limites do sandbox, esperando uma vaga se já houver
+    LATEX_MAX_CONCURRENT compilações em andamento. Lança LatexCompileError.
+    """
+    command = ['pdflatex', '-no-shell-escape', '-interaction=nonstopmode', '-halt-on-error', *args]
+    with _slots:
+        try:
+            # Sessão própria para que o timeout mate também eventuais processos filhos
+            proc = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, start_new_session=(os.name == 'posix'))
+        except FileNotFoundError:
+            raise LatexCompileError("pdflatex não encontrado no PATH.")
+        try:
+            _limit_resources(proc.pid)
+        except (OSError, ValueError) as e:
+            print(f"Não foi possível limitar os recursos do pdflatex: {e}")
+        try:
+            output, _ = proc.communicate(timeout=LATEX_COMPILE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            if os.name == 'posix':
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+            output, _ = proc.communicate()
+            raise LatexCompileError(
+                f"pdflatex excedeu o tempo limite de {LATEX_COMPILE_TIMEOUT}s.",
+                output.decode(errors='replace')[-4000:]
+            )
+
+    if proc.returncode != 0:
+        raise LatexCompileError(
+            f"pdflatex terminou com código {proc.returncode}.",
+            output.decode(errors='replace')[-4000:]
+        )
+
+
+def compile_latex(tex_source: str, format_name: Optional[str] = None,
+                  format_dir: Optional[Path] = None) -> bytes:
+    """
+    Compila `tex_source` em um sandbox novo e retorna os bytes do PDF.
+    Com `format_name`, `tex_source` deve conter só o corpo do documento, que é
+    compilado sobre o formato pré-compilado guardado em `format_dir`.
+    """
+    with compile_sandbox() as workdir:
+        (workdir / 'document.tex').write_text(tex_source, encoding='utf-8')
+        args = ['document.tex']
+        env = None
+        if format_name:
+            args.insert(0, f'-fmt={format_name}')
+            # O separador no final mantém os caminhos padrão do TeX depois do nosso
+            env = {**os.environ, 'TEXFORMATS': f"{format_dir}{os.pathsep}"}
+        run_pdflatex(args, workdir, env=env)
+
+        pdf_path = workdir / 'document.pdf'
+        if not pdf_path.exists():
+            log_path = workdir / 'document.log'
+            log = log_path.read_text(errors='replace')[-4000:] if log_path.exists() else ""
+            raise LatexCompileError("pdflatex não gerou o PDF.", log)
+        return pdf_path.read_bytes()
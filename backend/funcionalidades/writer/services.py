@@ -1,10 +1,18 @@
 import os
 import re
+import hashlib
+import subprocess
 from dotenv import load_dotenv
 import google.generativeai as genai
 from pathlib import Path
-from typing import Optional
-from PyPDF2 import PdfReader
+from typing import Callable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from researchflow import rate_limit
+from researchflow.rate_limit import RateLimitExceeded
+from researchflow.cache import SQLiteCache
+from researchflow.pdf_text import extract_pdf_pages, read_pdf_bytes
+from writer.sandbox import LATEX_COMPILE_TIMEOUT, LatexCompileError, compile_latex
+from writer.styles import get_fewshot
 from pylatex import Document, Command, Package
 from pylatex.utils import NoEscape
 
@@ -33,19 +41,6 @@ def limpar_resposta_ia(texto: str) -> str:
     
     return texto.strip()
 
-def decide_fewshot(style: str) -> str:
-    """Gera um exemplo curto para guiar a IA."""
-    prompt = f"""
-        Descreva o estilo {style}. Forneça um exemplo de SEÇÃO e uma EQUAÇÃO matemática (usando \\begin{{equation}})
-        válidos para LaTeX. Não inclua cabeçalhos.
-    """
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt)
-        return response.text
-    except:
-        return ""
-
 def extract_text_from_file(uploaded_file):
     """Lógica unificada de extração."""
     try:
@@ -54,9 +49,8 @@ def extract_text_from_file(uploaded_file):
         text = ""
         
         if filename_lower.endswith('.pdf'):
-            reader = PdfReader(uploaded_file)
-            parts = [page.extract_text() for page in reader.pages if page.extract_text()]
-            text = '\n'.join(parts)
+            pages = extract_pdf_pages(read_pdf_bytes(uploaded_file))
+            text = '\n'.join(page for page in pages if page)
         elif filename_lower.endswith('.txt'):
             text = uploaded_file.read().decode('utf-8')
         
@@ -65,74 +59,172 @@ def extract_text_from_file(uploaded_file):
         print(f"Erro na extração: {e}")
         return None
 
-def convert_text_to_latex_file(conteudo_limpo: str, filename) -> str:
-    """Salva o conteúdo LIMPO em um arquivo .tex temporário."""
-    folder_path = './arquivos'
-    os.makedirs(folder_path, exist_ok=True)
+# --- Compilação LaTeX: cache de PDFs e formato pré-compilado ---
+
+# O PDF gerado fica em cache pelo hash do .tex final, então pedidos repetidos
+# não passam de novo pelo pdflatex.
+LATEX_PDF_CACHE = SQLiteCache(
+    "latex_pdf",
+    ttl=int(os.getenv("LATEX_PDF_CACHE_TTL", 30 * 24 * 3600)),
+    max_bytes=int(os.getenv("LATEX_PDF_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+
+# Formato do pdflatex com o preâmbulo fixo já carregado (amsmath, babel...).
+# É gerado no deploy com `python manage.py build_latex_format`; sem ele a
+# compilação continua funcionando, apenas mais devagar.
+LATEX_FORMAT_DIR = Path(os.getenv("LATEX_FORMAT_DIR", Path(__file__).resolve().parent / 'latex'))
+
+def build_latex_document(content: str) -> Document:
+    """Documento PyLaTeX com o preâmbulo padrão do formatador e o conteúdo da IA."""
+    # Configurações de Geometria e Documento
+    geometry_options = {"tmargin": "2.5cm", "lmargin": "3cm", "rmargin": "2cm", "bmargin": "2.5cm"}
+    doc = Document(geometry_options=geometry_options)
     
-    filename = filename.replace(' ', '_')
-    output_path = os.path.join(folder_path, f'{filename}_temp.tex')
+    # --- ADICIONANDO PACOTES CRÍTICOS ---
+    # Isso evita erros de "Undefined control sequence" em matemática
+    doc.packages.append(Package('amsmath'))
+    doc.packages.append(Package('amssymb'))
+    doc.packages.append(Package('amsfonts'))
+    doc.packages.append(Package('graphicx'))
+    doc.packages.append(Package('float'))
+    doc.packages.append(Package('inputenc', options=['utf8']))
+    doc.packages.append(Package('fontenc', options=['T1']))
+    doc.packages.append(Package('babel', options=['brazil'])) # Ajuste conforme idioma
     
-    try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(conteudo_limpo)
-        return output_path
-    except Exception as e:
-        print(f"Erro ao salvar temp tex: {e}")
-        return ""
+    # Adiciona o conteúdo ao documento
+    doc.append(NoEscape(content))
+    return doc
+
+def split_latex_preamble(tex_source: str) -> Tuple[str, str]:
+    """Separa o .tex em (preâmbulo, corpo a partir de \\begin{document})."""
+    index = tex_source.index('\\begin{document}')
+    return tex_source[:index], tex_source[index:]
+
+def latex_format_name(preamble: str) -> str:
+    # O hash do preâmbulo no nome descarta sozinho formatos desatualizados
+    return f"researchflow-{hashlib.sha256(preamble.encode('utf-8')).hexdigest()[:12]}"
+
+def build_latex_format(output_dir: Optional[Path] = None) -> Path:
+    """
+    Gera o arquivo .fmt com o preâmbulo padrão (`pdflatex -ini` + `\\dump`) e
+    retorna seu caminho. Lança CalledProcessError se o pdflatex falhar.
+    """
+    output_dir = Path(output_dir or LATEX_FORMAT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    preamble, _ = split_latex_preamble(build_latex_document('').dumps())
+    name = latex_format_name(preamble)
+    (output_dir / f"{name}.tex").write_text(preamble + "\n\\dump\n", encoding='utf-8')
+    subprocess.run(
+        ['pdflatex', '-ini', '-interaction=nonstopmode', '-halt-on-error', f'-jobname={name}', '&pdflatex', f'{name}.tex'],
+        cwd=output_dir, check=True, capture_output=True, timeout=LATEX_COMPILE_TIMEOUT
+    )
+    return output_dir / f"{name}.fmt"
 
-def convert_tex_file_to_pdf(tex_file_path: str) -> Optional[str]:
-    """Usa PyLaTeX para gerar o PDF final."""
+def compile_latex_to_pdf(content: str) -> Optional[bytes]:
+    """Compila o conteúdo gerado pela IA com o preâmbulo padrão e retorna os bytes do PDF."""
     try:
-        # Configurações de Geometria e Documento
-        geometry_options = {"tmargin": "2.5cm", "lmargin": "3cm", "rmargin": "2cm", "bmargin": "2.5cm"}
-        doc = Document(geometry_options=geometry_options)
-        
-        # --- ADICIONANDO PACOTES CRÍTICOS ---
-        # Isso evita erros de "Undefined control sequence" em matemática
-        doc.packages.append(Package('amsmath'))
-        doc.packages.append(Package('amssymb'))
-        doc.packages.append(Package('amsfonts'))
-        doc.packages.append(Package('graphicx'))
-        doc.packages.append(Package('float'))
-        doc.packages.append(Package('inputenc', options=['utf8']))
-        doc.packages.append(Package('fontenc', options=['T1']))
-        doc.packages.append(Package('babel', options=['brazil'])) # Ajuste conforme idioma
-        
-        # Lê o conteúdo gerado pela IA
-        with open(tex_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Adiciona o conteúdo ao documento
-        doc.append(NoEscape(content))
-        
-        # Define nome de saída
-        pdf_file_path = tex_file_path.replace('_temp.tex', '')
-        
-        print(f"Iniciando compilação do arquivo: {pdf_file_path}...")
+        tex_source = build_latex_document(content).dumps()
+
+        cache_key = hashlib.sha256(tex_source.encode('utf-8')).hexdigest()
+        cached_pdf = LATEX_PDF_CACHE.get(cache_key)
+        if cached_pdf is not None:
+            print("PDF obtido do cache de compilação.")
+            return cached_pdf
         
-        # Gera o PDF
-        # clean_tex=False permite que você veja o .tex gerado se der erro
-        doc.generate_pdf(pdf_file_path, clean_tex=False, compiler='pdflatex')
+        preamble, body = split_latex_preamble(tex_source)
+        format_name = latex_format_name(preamble)
+        pdf_bytes = None
+        if (LATEX_FORMAT_DIR / f"{format_name}.fmt").exists():
+            try:
+                pdf_bytes = compile_latex(body, format_name, LATEX_FORMAT_DIR)
+            except LatexCompileError as e:
+                # Formato de outra versão do TeX Live ou corrompido: tenta uma
+                # vez com o preâmbulo completo antes de desistir
+                print(f"Compilação com o formato '{format_name}' falhou ({e}). Tentando com o preâmbulo completo...")
+        if pdf_bytes is None:
+            pdf_bytes = compile_latex(tex_source)
         
-        full_path = pdf_file_path + ".pdf"
-        if os.path.exists(full_path):
-            print(f"PDF gerado com sucesso: {full_path}")
-            return full_path
-        return None
+        print(f"PDF gerado com sucesso ({len(pdf_bytes)} bytes).")
+        LATEX_PDF_CACHE.set(cache_key, pdf_bytes)
+        return pdf_bytes
         
-    except Exception as e:
+    except LatexCompileError as e:
         print("="*30)
         print(f"ERRO DE COMPILAÇÃO LATEX: {e}")
-        print("DICA: Abra o arquivo .log na pasta 'arquivos' para ver o erro detalhado.")
+        print(e.log)
         print("="*30)
         return None
+    except Exception as e:
+        print(f"Erro ao compilar LaTeX: {e}")
+        return None
 
-def format_text_with_gemini(input_text, style, filename) -> Optional[str]:
-    few_shot = decide_fewshot(style)
-    
-    prompt = f"""
+# --- Conversão por seções (documentos longos) ---
+
+FORMAT_MODEL_NAME = "gemini-2.5-pro"
+FORMAT_MAX_CHARS = 25000
+# Tamanho máximo de cada trecho convertido em paralelo e quantos vão ao mesmo tempo
+FORMAT_SECTION_CHARS = int(os.getenv("FORMAT_SECTION_CHARS", 12000))
+FORMAT_MAX_PARALLEL = int(os.getenv("FORMAT_MAX_PARALLEL", 4))
+
+# Linhas que parecem títulos de seção: "2.1 Métodos", "IV. RESULTS", "Resumo"...
+HEADING_RE = re.compile(
+    r'^\s*(?:(?:\d+(?:\.\d+)*|[IVXLC]+)\.?\s+\S[^\n]{0,80}'
+    r'|abstract|resumo|introdu[cç][aã]o|introduction|conclus[aã]o|conclusions?'
+    r'|refer[eê]ncias|references|agradecimentos|acknowledge?ments)\s*:?\s*$',
+    re.IGNORECASE
+)
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip()
+    return bool(stripped) and not stripped.endswith('.') and bool(HEADING_RE.match(stripped))
+
+def _pack(pieces: List[str], max_chars: int, sep: str) -> List[str]:
+    """Junta pedaços consecutivos em blocos de até `max_chars` caracteres."""
+    blocks, current = [], ''
+    for piece in pieces:
+        if current and len(current) + len(sep) + len(piece) > max_chars:
+            blocks.append(current)
+            current = ''
+        current = f"{current}{sep}{piece}" if current else piece
+    if current.strip():
+        blocks.append(current)
+    return blocks
+
+def _split_long_section(section: str, max_chars: int) -> List[str]:
+    """Quebra uma seção grande em parágrafos, depois em linhas e, em último caso, no meio."""
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n', section):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.split('\n'):
+            pieces.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+    return _pack(pieces, max_chars, '\n\n')
+
+def split_sections(text: str, max_chars: int = None) -> List[str]:
+    """
+    Divide o texto em trechos de até `max_chars` caracteres, cortando de
+    preferência antes de títulos de seção e em fim de parágrafo. A ordem é preservada.
+    """
+    max_chars = max_chars or FORMAT_SECTION_CHARS
+    sections, current = [], []
+    for line in text.splitlines():
+        if current and _is_heading(line):
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+
+    units = []
+    for section in sections:
+        units.extend([section] if len(section) <= max_chars else _split_long_section(section, max_chars))
+    return _pack(units, max_chars, '\n')
+
+def _build_format_prompt(input_text: str, style, few_shot_block: str, part_note: str = "") -> str:
+    return f"""
         Você é um formatador LaTeX especializado. Sua tarefa é converter o texto abaixo para LaTeX.
+        {part_note}
         
         REGRAS ESTRITAS (Para não quebrar o compilador):
         1. O código será injetado dentro de um arquivo que JÁ POSSUI \\documentclass e \\begin{{document}}.
@@ -145,29 +237,84 @@ def format_text_with_gemini(input_text, style, filename) -> Optional[str]:
         8. Para matemática, use APENAS comandos LaTeX ($\\alpha$, $\\beta$), NÃO use símbolos Unicode.
         9. Estilo desejado: {style}.
         
+        {few_shot_block}
         Texto Original:
-        {input_text[:25000]} 
+        {input_text} 
     """
+
+def _convert_to_latex(prompt: str) -> Optional[str]:
+    rate_limit.acquire("gemini")
+    model = genai.GenerativeModel(FORMAT_MODEL_NAME)
+    response = model.generate_content(prompt)
+    if not response.text:
+        return None
+    # Limpa a resposta (remove markdown, documentclass duplicado, etc)
+    return limpar_resposta_ia(response.text)
+
+def _convert_sections(input_text: str, style, few_shot_block: str) -> Optional[str]:
+    """Converte os trechos em paralelo (no máximo FORMAT_MAX_PARALLEL) e os junta na ordem original."""
+    parts = split_sections(input_text)
+    total = len(parts)
+    print(f"Convertendo {total} trechos em paralelo (até {FORMAT_MAX_PARALLEL} por vez)...")
+
+    def convert(numbered_part):
+        index, part = numbered_part
+        part_note = (
+            f"Este é o trecho {index} de {total} de um documento maior. Converta apenas este trecho, "
+            "sem criar título do documento, resumo ou conclusão que não estejam nele."
+        )
+        try:
+            return _convert_to_latex(_build_format_prompt(part, style, few_shot_block, part_note))
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Erro ao converter o trecho {index}/{total}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, FORMAT_MAX_PARALLEL)) as executor:
+        # map devolve os resultados na ordem dos trechos, não na ordem de conclusão
+        fragments = list(executor.map(convert, enumerate(parts, start=1)))
+
+    if any(fragment is None for fragment in fragments):
+        print("Falha em pelo menos um trecho; o documento não será compilado incompleto.")
+        return None
+    return '\n\n'.join(fragments)
+
+def format_text_with_gemini(input_text, style, filename: str = "documento",
+                            on_stage: Optional[Callable[[str], None]] = None,
+                            sectioned: bool = False) -> Optional[bytes]:
+    """
+    Converte o texto para LaTeX com o Gemini, compila em um sandbox e retorna
+    os bytes do PDF. `filename` só identifica o documento nos logs. `on_stage`,
+    se informado, é chamado com "llm" e "compile" no início de cada etapa.
+    Com `sectioned`, textos longos são convertidos por seções em paralelo, sem
+    o corte em FORMAT_MAX_CHARS caracteres. RateLimitExceeded propaga para
+    quem chamou responder "sobrecarregado" em vez de uma falha genérica.
+    """
+    if on_stage:
+        on_stage("llm")
+    # Exemplo do estilo vem da biblioteca de estilos (sem chamada extra à IA)
+    few_shot = get_fewshot(style)
+    few_shot_block = f"Exemplo de referência do estilo (siga a estrutura, não o conteúdo):\n{few_shot}\n" if few_shot else ""
     
     try:
-        model = genai.GenerativeModel("gemini-2.5-pro")
-        response = model.generate_content(prompt)
-        
-        if not response.text: return None
-        
-        print("IA gerou texto. Limpando e compilando...")
+        if sectioned and len(input_text) > FORMAT_SECTION_CHARS:
+            texto_limpo = _convert_sections(input_text, style, few_shot_block)
+        else:
+            texto_limpo = _convert_to_latex(_build_format_prompt(input_text[:FORMAT_MAX_CHARS], style, few_shot_block))
         
-        # 1. Limpa a resposta (remove markdown, documentclass duplicado, etc)
-        texto_limpo = limpar_resposta_ia(response.text)
+        if not texto_limpo: return None
         
-        # 2. Salva temp
-        caminho_temp = convert_text_to_latex_file(texto_limpo, filename)
+        print("IA gerou texto. Compilando...")
         
-        # 3. Compila
-        caminho_pdf = convert_tex_file_to_pdf(caminho_temp)
-        
-        return caminho_pdf
+        # Compila em um diretório temporário exclusivo
+        if on_stage:
+            on_stage("compile")
+        print(f"Iniciando compilação do documento: {filename}...")
+        return compile_latex_to_pdf(texto_limpo)
 
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         print(f"Erro no fluxo Gemini: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,119 @@
+"""
+Biblioteca de estilos do formatador LaTeX.
+
+Os exemplos few-shot dos estilos mais pedidos (ABNT, IEEE, AAAI...) são
+curados à mão em `styles.json`, versionado junto com o código. Estilos fora da
+lista são gerados pelo Gemini uma única vez, em segundo plano (um pool pequeno
+de STYLE_GENERATION_WORKERS threads, com no máximo STYLE_GENERATION_MAX_PENDING
+estilos na fila), e guardados no cache persistente. Assim a formatação nunca espera por uma chamada extra à IA:
+enquanto o exemplo de um estilo novo não fica pronto, o prompt segue sem ele.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+import google.generativeai as genai
+
+from researchflow import rate_limit
+from researchflow.cache import SQLiteCache
+
+STYLES_PATH = Path(__file__).resolve().parent / 'styles.json'
+
+FEWSHOT_PROMPT_TEMPLATE = """
+        Descreva o estilo {style}. Forneça um exemplo de SEÇÃO e uma EQUAÇÃO matemática (usando \\begin{equation})
+        válidos para LaTeX. Não inclua cabeçalhos.
+    """
+FEWSHOT_PROMPT_VERSION = hashlib.sha256(FEWSHOT_PROMPT_TEMPLATE.encode('utf-8')).hexdigest()[:12]
+
+STYLE_CACHE = SQLiteCache(
+    "latex_styles",
+    max_entries=int(os.getenv("STYLE_CACHE_MAX_ENTRIES", 1000)),
+)
+
+# Estilos novos sendo gerados (ou na fila). Um estilo pedido várias vezes é
+# gerado uma vez só; com a fila cheia, o pedido é ignorado e tentado de novo
+# na próxima formatação com esse estilo.
+STYLE_GENERATION_MAX_PENDING = int(os.getenv("STYLE_GENERATION_MAX_PENDING", 20))
+_STYLE_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STYLE_GENERATION_WORKERS", 2)),
+    thread_name_prefix="style-fewshot"
+)
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def normalize_style(style: Optional[str]) -> str:
+    folded = unicodedata.normalize('NFKD', (style or '').casefold())
+    folded = ''.join(ch for ch in folded if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', folded).strip()
+
+
+@lru_cache(maxsize=1)
+def load_curated_styles() -> Dict[str, str]:
+    """Mapa estilo normalizado (nome ou apelido) -> exemplo few-shot curado."""
+    with open(STYLES_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    styles = {}
+    for name, entry in data['styles'].items():
+        for alias in [name, *entry.get('aliases', [])]:
+            styles[normalize_style(alias)] = entry['fewshot']
+    return styles
+
+
+def decide_fewshot(style: str) -> str:
+    """Gera um exemplo curto para guiar a IA."""
+    prompt = FEWSHOT_PROMPT_TEMPLATE.replace('{style}', style)
+    try:
+        rate_limit.acquire("gemini")
+        model = genai.GenerativeModel("gemini-2.0-flash")
+        response = model.generate_content(prompt)
+        return response.text
+    except Exception as e:
+        print(f"Erro ao gerar exemplo do estilo '{style}': {e}")
+        return ""
+
+
+def _generate_and_store(style: str, key: str) -> None:
+    try:
+        few_shot = decide_fewshot(style)
+        if few_shot:
+            STYLE_CACHE.set(key, few_shot)
+            print(f"Exemplo do estilo '{style}' gerado e guardado.")
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def get_fewshot(style: Optional[str]) -> str:
+    """
+    Exemplo few-shot do estilo, sem chamar a IA no caminho da requisição.
+    Estilos desconhecidos disparam a geração em segundo plano e retornam "".
+    """
+    normalized = normalize_style(style)
+    if not normalized:
+        return ""
+    curated = load_curated_styles().get(normalized)
+    if curated is not None:
+        return curated
+
+    key = f"{FEWSHOT_PROMPT_VERSION}:{normalized}"
+    cached = STYLE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    with _pending_lock:
+        if key in _pending:
+            return ""
+        if len(_pending) >= STYLE_GENERATION_MAX_PENDING:
+            print(f"Fila de geração de estilos cheia. O estilo '{style.strip()}' fica sem exemplo por ora.")
+            return ""
+        _pending.add(key)
+    _STYLE_POOL.submit(_generate_and_store, style.strip(), key)
+    return ""
@@ -1,3 +1,184 @@
-from django.test import TestCase
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from writer import jobs, services, styles
+
+
+class FormatJobQueueTests(SimpleTestCase):
+    """Fila persistente dos jobs de formatação, num SQLite temporário e sem threads de worker."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(jobs, 'JOBS_DB_PATH', Path(tmp.name) / 'format_jobs.sqlite3'),
+            mock.patch.object(jobs, '_db_ready', False),
+            mock.patch.object(jobs, 'FORMAT_JOB_HEARTBEAT_SECONDS', 60),
+            mock.patch.object(jobs, 'extract_text_from_file', return_value='texto do artigo'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ensure_workers = self.patch('_ensure_workers')
+        self.format = self.patch('format_text_with_gemini', return_value=b'%PDF-1.4')
+
+    def patch(self, name, **kwargs):
+        patcher = mock.patch.object(jobs, name, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def submit(self, name='artigo.txt'):
+        return jobs.submit_job(SimpleUploadedFile(name, b'texto'), 'IEEE')['job_id']
+
+    def test_submit_then_worker_runs_the_job_to_done(self):
+        job_id = self.submit()
+        self.assertEqual(jobs.get_job(job_id)['status'], 'queued')
+        self.ensure_workers.assert_called()
+
+        self.assertTrue(jobs._process_next())
+        job = jobs.get_job(job_id)
+        self.assertEqual((job['status'], job['stage'], job['error']), ('done', None, None))
+        self.assertEqual(jobs.get_job_pdf(job_id), b'%PDF-1.4')
+        self.assertEqual(self.format.call_args.args[1], 'IEEE')
+        self.assertFalse(jobs._process_next())
+
+    def test_jobs_are_claimed_in_submission_order_and_only_once(self):
+        first, second = self.submit('a.txt'), self.submit('b.txt')
+        self.assertEqual(jobs._claim_next()['id'], first)
+        self.assertEqual(jobs._claim_next()['id'], second)
+        self.assertIsNone(jobs._claim_next())
+        self.assertEqual(jobs.get_job(first)['status'], 'running')
+
+    def test_stale_running_job_is_requeued_but_a_live_one_is_not(self):
+        job_id = self.submit()
+        jobs._claim_next()
+        self.assertIsNone(jobs._claim_next())
+
+        later = time.time() + jobs.FORMAT_JOB_STALE_SECONDS + 1
+        with mock.patch('writer.jobs.time.time', return_value=later):
+            self.assertEqual(jobs._claim_next()['id'], job_id)
+
+    def test_failed_format_marks_the_job_as_error(self):
+        self.format.return_value = None
+        job_id = self.submit()
+        jobs._process_next()
+        self.assertEqual(jobs.get_job(job_id)['status'], 'error')
+        self.assertIsNone(jobs.get_job_pdf(job_id))
+
+    def test_worker_survives_a_database_error_while_recording_the_result(self):
+        job_id = self.submit()
+        self.patch('_update', side_effect=sqlite3.OperationalError("database is locked"))
+        self.assertTrue(jobs._process_next())
+        # Sem heartbeat, o job fica "running" até ser tido como abandonado
+        self.assertEqual(jobs.get_job(job_id)['status'], 'running')
+
+    def test_polling_a_pending_job_starts_the_workers(self):
+        job_id = self.submit()
+        self.ensure_workers.reset_mock()
+        jobs.get_job(job_id)
+        self.ensure_workers.assert_called_once()
+
+    def test_resume_starts_workers_only_with_pending_jobs(self):
+        jobs.resume_pending_jobs()
+        self.ensure_workers.assert_not_called()
+        self.submit()
+        self.ensure_workers.reset_mock()
+        jobs.resume_pending_jobs()
+        self.ensure_workers.assert_called_once()
+
+
+class StyleFewshotTests(SimpleTestCase):
+    """Estilos novos são gerados uma vez só, num pool compartilhado e com fila limitada."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.pool = mock.Mock()
+        for patcher in (
+            mock.patch.object(styles.STYLE_CACHE, 'path', Path(tmp.name) / 'latex_styles.sqlite3'),
+            mock.patch.object(styles.STYLE_CACHE, '_ready', False),
+            mock.patch.object(styles, '_STYLE_POOL', self.pool),
+            mock.patch.object(styles, '_pending', set()),
+            mock.patch.object(styles, 'STYLE_GENERATION_MAX_PENDING', 2),
+            mock.patch.object(styles, 'decide_fewshot', return_value='\\section{Exemplo}'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_submitted(self):
+        for call in self.pool.submit.call_args_list:
+            call.args[0](*call.args[1:])
+
+    def test_curated_style_never_calls_the_model(self):
+        self.assertTrue(styles.get_fewshot('ieee'))
+        self.pool.submit.assert_not_called()
+
+    def test_unknown_style_is_generated_once_then_served_from_cache(self):
+        self.assertEqual(styles.get_fewshot('Estilo Novo'), '')
+        self.assertEqual(styles.get_fewshot('estilo  novo'), '')
+        self.assertEqual(self.pool.submit.call_count, 1)
+
+        self.run_submitted()
+        self.assertEqual(styles.get_fewshot('Estilo Novo'), '\\section{Exemplo}')
+        self.assertEqual(styles._pending, set())
+
+    def test_full_queue_drops_new_styles_until_a_slot_frees(self):
+        styles.get_fewshot('Estilo A')
+        styles.get_fewshot('Estilo B')
+        styles.get_fewshot('Estilo C')
+        self.assertEqual(self.pool.submit.call_count, 2)
+
+        self.run_submitted()
+        styles.get_fewshot('Estilo C')
+        self.assertEqual(self.pool.submit.call_count, 3)
+
+
+def section(number, title, body_chars=200):
+    return f"{number} {title}\n" + f"Texto da parte {number}. " * (body_chars // 20)
+
+
+class SectionedConversionTests(SimpleTestCase):
+    """Documentos longos: corte em títulos de seção e remontagem na ordem original."""
+
+    def test_split_cuts_before_headings_and_keeps_the_text(self):
+        text = '\n'.join(section(i, title) for i, title in enumerate(['Introdução', 'Métodos', 'Resultados'], 1))
+        parts = services.split_sections(text, max_chars=300)
+        self.assertEqual([part.split('\n', 1)[0] for part in parts], ['1 Introdução', '2 Métodos', '3 Resultados'])
+        self.assertEqual('\n'.join(parts), text)
+
+    def test_split_without_headings_falls_back_to_paragraphs(self):
+        paragraphs = [f"Parágrafo {i} sem título, com texto corrido." * 3 for i in range(6)]
+        text = '\n\n'.join(paragraphs)
+        parts = services.split_sections(text, max_chars=300)
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(len(part) <= 300 for part in parts))
+        self.assertEqual(re.findall(r'Parágrafo (\d)', ''.join(parts))[::3], [str(i) for i in range(6)])
+
+    def convert(self, prompt):
+        # Termina fora de ordem: os trechos mais adiantados respondem primeiro
+        time.sleep(random.uniform(0, 0.03))
+        numbers = re.findall(r'Texto da parte (\d+)\.', prompt.split('Texto Original:')[-1])
+        return f"\\section{{Parte {numbers[0]}}}"
+
+    def test_parallel_conversion_reassembles_in_document_order(self):
+        text = '\n'.join(section(i, f'Seção {i}') for i in range(1, 9))
+        with mock.patch.object(services, 'FORMAT_SECTION_CHARS', 300), \
+                mock.patch.object(services, 'FORMAT_MAX_PARALLEL', 4), \
+                mock.patch.object(services, '_convert_to_latex', side_effect=self.convert):
+            latex = services._convert_sections(text, 'IEEE', '')
+        self.assertEqual(latex.split('\n\n'), [f"\\section{{Parte {i}}}" for i in range(1, 9)])
+
+    def test_failed_section_aborts_instead_of_dropping_it(self):
+        text = '\n'.join(section(i, f'Seção {i}') for i in range(1, 5))
+        results = iter([r'\section{1}', None, r'\section{3}', r'\section{4}'])
+        with mock.patch.object(services, 'FORMAT_SECTION_CHARS', 300), \
+                mock.patch.object(services, 'FORMAT_MAX_PARALLEL', 1), \
+                mock.patch.object(services, '_convert_to_latex', side_effect=lambda prompt: next(results)):
+            self.assertIsNone(services._convert_sections(text, 'IEEE', ''))